@@ -1,5 +1,14 @@
-from begin.registry import Registry  # noqa: F401
+from typing import Any
 
 
 __version__ = '0.4.0'
 VERSION = __version__
+
+
+def __getattr__(name: str) -> Any:
+    """ `Registry` is imported on first use, so that light entry points (like the
+    daemon client) do not pay for importing the registry machinery. """
+    if name == 'Registry':
+        from begin.registry import Registry
+        return Registry
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
@@ -0,0 +1,78 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import (
+    Any,
+    Optional,
+)
+
+
+CACHE_DIR_ENV_VAR = 'BEGIN_CACHE_DIR'
+
+# Modification times this close to the time they were observed cannot be trusted:
+# the file may change again within the same timestamp tick after it was read.
+RACY_WINDOW_NS = 2 * 10**9
+
+
+def get_cache_dir() -> Path:
+    """ The root directory for everything `begin` persists between invocations.
+    Resolved from `$BEGIN_CACHE_DIR`, then `$XDG_CACHE_HOME/begin`, and finally
+    `~/.cache/begin`. The directory is not created here. """
+    cache_dir = os.environ.get(CACHE_DIR_ENV_VAR)
+    if cache_dir:
+        return Path(cache_dir).expanduser()
+
+    xdg_cache_home = os.environ.get('XDG_CACHE_HOME')
+    if xdg_cache_home:
+        return Path(xdg_cache_home).expanduser().joinpath('begin')
+
+    return Path.home().joinpath('.cache', 'begin')
+
+
+def make_cache_key(*parts: Any) -> str:
+    """ A stable, filename-safe digest of `parts`, which must be JSON serialisable. """
+    serialised = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(serialised.encode()).hexdigest()[:32]
+
+
+def trusted_mtime(mtime_ns: int, observed_ns: int) -> Optional[int]:
+    """ Returns `None` in place of an mtime which is too recent to be trusted, so
+    that whatever it was recorded against is always revalidated. """
+    if observed_ns - mtime_ns < RACY_WINDOW_NS:
+        return None
+    return mtime_ns
+
+
+def read_json(path: Path) -> Optional[Any]:
+    """ Returns `None` if the file is missing or unreadable. A corrupt cache
+    file is treated exactly like a missing one. """
+    try:
+        with open(path, encoding='utf-8') as cache_file:
+            return json.load(cache_file)
+    except (OSError, ValueError):
+        return None
+
+
+def write_json(path: Path, data: Any) -> None:
+    """ Writes `data` to `path` atomically, so that concurrent `begin` processes
+    never observe a partially written file. Failures are swallowed: a cache which
+    cannot be written simply stays cold. """
+    # Imported here, since most runs only read from the cache
+    import tempfile
+
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        file_descriptor, tmp_path = tempfile.mkstemp(dir=str(path.parent), prefix=f'.{path.name}.')
+    except OSError:
+        return
+
+    try:
+        with os.fdopen(file_descriptor, 'w', encoding='utf-8') as tmp_file:
+            json.dump(data, tmp_file)
+        os.replace(tmp_path, str(path))
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
@@ -0,0 +1,286 @@
+import ast
+import logging
+import sys
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from begin.cli.manifest import (
+    ManifestTarget,
+    ModuleManifest,
+    TargetIdentifier,
+)
+from begin.constants import DEFAULT_REGISTRY_NAME
+from begin.converters import (
+    OptionSchema,
+    Parameter,
+    converter_for,
+)
+from begin.registry import split_target_identifier
+
+
+logger = logging.getLogger(__name__)
+
+# String literals are parsed to `ast.Str` on python 3.7, and to `ast.Constant` afterwards
+_STRING_NODE_TYPES = (ast.Str,) if sys.version_info < (3, 8) else (ast.Constant,)
+
+_REGISTER_TARGET = 'register_target'
+_REGISTRY = 'Registry'
+
+
+def _string_value(node: ast.AST) -> Optional[str]:
+    if not isinstance(node, _STRING_NODE_TYPES):
+        return None
+    value = node.s if sys.version_info < (3, 8) else node.value  # type: ignore
+    return value if isinstance(value, str) else None
+
+
+class InconclusiveAnalysis(Exception):
+    """ Raised while analysing a targets file which does something the static
+    analysis cannot follow. Such files are always executed. """
+
+
+def _string_values(node: ast.AST) -> List[str]:
+    """ The value of a string literal, or of a list or tuple of string literals. """
+    value = _string_value(node)
+    if value is not None:
+        return [value]
+    if not isinstance(node, (ast.List, ast.Tuple)):
+        raise InconclusiveAnalysis('depends_on is not a literal')
+
+    values = []
+    for element in node.elts:
+        value = _string_value(element)
+        if value is None:
+            raise InconclusiveAnalysis('depends_on holds something other than string literals')
+        values.append(value)
+    return values
+
+
+def _format_signature(arguments: ast.arguments) -> str:
+    unparse = getattr(ast, 'unparse', None)
+    if unparse is not None:
+        return f'({unparse(arguments)})'
+
+    # ast.unparse is unavailable before python 3.9, so fall back to parameter names
+    names = [arg.arg for arg in getattr(arguments, 'posonlyargs', []) + arguments.args]
+    if arguments.vararg:
+        names.append(f'*{arguments.vararg.arg}')
+    names.extend(arg.arg for arg in arguments.kwonlyargs)
+    if arguments.kwarg:
+        names.append(f'**{arguments.kwarg.arg}')
+    return f'({", ".join(names)})'
+
+
+def _annotation_source(node: Optional[ast.AST]) -> Optional[str]:
+    if node is None:
+        return None
+    # A quoted annotation
+    value = _string_value(node)
+    if value is not None:
+        return value
+    unparse = getattr(ast, 'unparse', None)
+    if unparse is not None:
+        return unparse(node)
+    # Before python 3.9, only plain names are recognised; anything else converts nothing
+    if isinstance(node, ast.Name):
+        return node.id
+    if isinstance(node, ast.Attribute):
+        return node.attr
+    return ''
+
+
+def _literal_value(node: ast.AST) -> Any:
+    """ `None` for defaults which are not literals, whose type cannot be told. """
+    try:
+        return ast.literal_eval(node)
+    except ValueError:
+        return None
+
+
+def _parameter(arg: ast.arg, default: Optional[ast.AST]) -> Parameter:
+    default_value = None if default is None else _literal_value(default)
+    return Parameter(
+        name=arg.arg,
+        converter=converter_for(_annotation_source(arg.annotation), default_value),
+        required=default is None,
+    )
+
+
+def _option_schema(arguments: ast.arguments) -> OptionSchema:
+    """ Mirrors `OptionSchema.from_function`. Where the source does not tell how an option
+    is converted, it is assumed to be a string, so that the schema is never stricter than
+    the one the target is executed with. """
+    positional_only = getattr(arguments, 'posonlyargs', [])
+    positional = positional_only + arguments.args
+    defaults = [None] * (len(positional) - len(arguments.defaults)) + list(arguments.defaults)
+
+    schema = OptionSchema(accepts_any=arguments.kwarg is not None)
+    for arg, default in list(zip(positional, defaults))[len(positional_only):]:
+        schema.parameters.append(_parameter(arg, default))
+    for arg, default in zip(arguments.kwonlyargs, arguments.kw_defaults):
+        schema.parameters.append(_parameter(arg, default))
+    return schema
+
+
+def _is_register_target(decorator: ast.AST) -> bool:
+    attribute = decorator.func if isinstance(decorator, ast.Call) else decorator
+    return isinstance(attribute, ast.Attribute) and attribute.attr == _REGISTER_TARGET
+
+
+class _TargetsFileAnalyser:
+    """ Recognises the idioms used to declare targets:
+
+        registry = Registry()
+        other_registry = begin.Registry(name='other')
+
+        @registry.register_target
+        @other_registry.register_target(name_override='other_name', depends_on=['dependency'])
+        def target():
+            ...
+
+    Any `Registry` construction or `register_target` reference which does not fit
+    those idioms (a registry built in a loop, a dynamic `name_override` or `depends_on`,
+    a decorator applied by hand...) makes the whole file inconclusive. """
+
+    def __init__(self, tree: ast.Module) -> None:
+        self._tree = tree
+        self._registry_aliases = {_REGISTRY}
+        self._registries: Dict[str, str] = {}
+        self._targets: Dict[TargetIdentifier, ManifestTarget] = {}
+        self._recognised_nodes: Set[int] = set()
+
+    def analyse(self) -> Tuple[Set[str], List[ManifestTarget]]:
+        for node in self._tree.body:
+            if isinstance(node, ast.ImportFrom):
+                self._visit_import_from(node)
+            elif isinstance(node, (ast.Assign, ast.AnnAssign)):
+                self._visit_assignment(node)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                self._visit_function(node)
+
+        # Every Registry(...) call and register_target reference must have been
+        # accounted for by one of the idioms above
+        for node in ast.walk(self._tree):
+            if id(node) in self._recognised_nodes:
+                continue
+            if isinstance(node, ast.Call) and self._is_registry_constructor(node.func):
+                raise InconclusiveAnalysis('Registry constructed outside a module-level assignment')
+            if isinstance(node, ast.Attribute) and node.attr == _REGISTER_TARGET:
+                raise InconclusiveAnalysis('register_target used outside a decorator')
+
+        return set(self._registries.values()), list(self._targets.values())
+
+    def _is_registry_constructor(self, node: ast.AST) -> bool:
+        if isinstance(node, ast.Name):
+            return node.id in self._registry_aliases
+        return isinstance(node, ast.Attribute) and node.attr == _REGISTRY
+
+    def _visit_import_from(self, node: ast.ImportFrom) -> None:
+        for alias in node.names:
+            if alias.name == _REGISTRY and alias.asname:
+                self._registry_aliases.add(alias.asname)
+
+    def _visit_assignment(self, node: ast.AST) -> None:
+        value = node.value  # type: ignore
+        if not (isinstance(value, ast.Call) and self._is_registry_constructor(value.func)):
+            return
+
+        targets = node.targets if isinstance(node, ast.Assign) else [node.target]  # type: ignore
+        if len(targets) != 1 or not isinstance(targets[0], ast.Name):
+            raise InconclusiveAnalysis('Registry assigned to something other than a single name')
+
+        self._registries[targets[0].id] = self._registry_namespace(value)
+        self._recognised_nodes.add(id(value))
+
+    @staticmethod
+    def _registry_namespace(call: ast.Call) -> str:
+        name_node: Optional[ast.AST] = None
+        if call.args:
+            name_node = call.args[0]
+        for keyword in call.keywords:
+            if keyword.arg == 'name':
+                name_node = keyword.value
+            elif keyword.arg is None:
+                raise InconclusiveAnalysis('Registry constructed with **kwargs')
+
+        if name_node is None:
+            return DEFAULT_REGISTRY_NAME
+        namespace = _string_value(name_node)
+        if namespace is None:
+            raise InconclusiveAnalysis('Registry name is not a string literal')
+        return namespace
+
+    def _visit_function(self, node: ast.AST) -> None:
+        function_name = node.name  # type: ignore
+        decorators = node.decorator_list  # type: ignore
+        # Any other decorator may change the signature the target is called with
+        schema = _option_schema(node.args) if all(map(_is_register_target, decorators)) else None  # type: ignore
+        for decorator in decorators:
+            if not _is_register_target(decorator):
+                continue
+            attribute = decorator.func if isinstance(decorator, ast.Call) else decorator
+            if not isinstance(attribute.value, ast.Name) or attribute.value.id not in self._registries:
+                raise InconclusiveAnalysis('register_target called on an unknown registry')
+
+            namespace = self._registries[attribute.value.id]
+            target_name = function_name
+            depends_on: List[TargetIdentifier] = []
+            if isinstance(decorator, ast.Call):
+                target_name, depends_on = self._target_options(decorator, function_name, namespace)
+
+            self._targets[(target_name, namespace)] = ManifestTarget(
+                name=target_name,
+                namespace=namespace,
+                qualname=function_name,
+                signature=_format_signature(node.args),  # type: ignore
+                depends_on=depends_on,
+                schema=schema,
+            )
+            self._recognised_nodes.add(id(attribute))
+
+    @staticmethod
+    def _target_options(
+        call: ast.Call,
+        function_name: str,
+        namespace: str,
+    ) -> Tuple[str, List[TargetIdentifier]]:
+        if call.args:
+            raise InconclusiveAnalysis('register_target called with positional arguments')
+
+        target_name = function_name
+        depends_on: List[TargetIdentifier] = []
+        for keyword in call.keywords:
+            if keyword.arg is None:
+                raise InconclusiveAnalysis('register_target called with **kwargs')
+            if keyword.arg == 'name_override':
+                name_override = _string_value(keyword.value)
+                if name_override is None:
+                    raise InconclusiveAnalysis('name_override is not a string literal')
+                target_name = name_override
+            elif keyword.arg == 'depends_on':
+                depends_on = [
+                    split_target_identifier(identifier, default_namespace=namespace)
+                    for identifier in _string_values(keyword.value)
+                ]
+        return target_name, depends_on
+
+
+def analyse_source(path: Path, source: bytes) -> ModuleManifest:
+    """ Statically extracts the registries and targets defined in `source`, the
+    contents of the targets file at `path`. Syntax errors and unrecognised constructs
+    result in an inconclusive manifest, so the file will be executed as usual. """
+    try:
+        tree = ast.parse(source, filename=str(path))
+        namespaces, targets = _TargetsFileAnalyser(tree).analyse()
+    except (SyntaxError, ValueError, InconclusiveAnalysis) as ex:
+        logger.debug(f'Static analysis of {path} was inconclusive: {ex}')
+        return ModuleManifest(path=path, conclusive=False)
+
+    return ModuleManifest(path=path, namespaces=namespaces, targets=targets)
@@ -1,35 +1,101 @@
+from __future__ import annotations
+
 import importlib.util
 import logging
 import sys
+from collections import defaultdict
+from contextlib import (
+    contextmanager,
+    nullcontext,
+)
+from fnmatch import fnmatch
 from importlib.machinery import ModuleSpec
+from itertools import chain
 from pathlib import Path
 from types import ModuleType
 from typing import (
+    TYPE_CHECKING,
+    Awaitable,
+    Any,
+    Callable,
+    ContextManager,
+    Dict,
+    Iterable,
     Iterator,
     List,
+    Mapping,
     NoReturn,
+    Optional,
+    Set,
+    Tuple,
 )
 
-from begin.cli.parser import (
-    ParsedCommand,
-    parse_command,
+from begin.cli.completion import TargetIndex
+from begin.cli.discovery import (
+    DiscoveryOptions,
+    TargetFileWalker,
+    Walker,
+    find_nearest_scope,
+    find_target_files_concurrently,
 )
-from begin.exceptions import BeginError
-from begin.registry import (
-    Registry,
-    RegistryManager,
+from begin.cli.index import DiscoveryIndex
+from begin.cli.manifest import TargetManifest
+from begin.exceptions import (
+    BeginError,
+    InvalidOptionsError,
+    RegistryNameCollisionError,
+    TargetFailureError,
+    UnknownTargetError,
 )
 
+# Shell completion imports this module on every keypress, and needs none of the modules
+# which running targets does, so they are imported where they are used
+if TYPE_CHECKING:
+    from begin.cli.parser import Request
+    from begin.registry import (
+        Registry,
+        RegistryManager,
+        Target,
+    )
+    from begin.stamps import TargetStamp
+
 
 logger = logging.getLogger(__name__)
 
 
-def collect_target_file_paths() -> Iterator[Path]:
-    cwd = Path.cwd()
-    yield from cwd.rglob('*targets.py')
-    global_targets_dir = Path.home().joinpath('.begin')
-    if global_targets_dir.exists():
-        yield from global_targets_dir.rglob('*targets.py')
+def _make_walker(root: Path, options: DiscoveryOptions, max_depth: Optional[int]) -> Walker:
+    if not options.use_cache:
+        return TargetFileWalker(root, options.extension, max_depth=max_depth)
+    return DiscoveryIndex.load(root, options.extension, max_depth=max_depth, rebuild=options.rebuild_index)
+
+
+def _find_target_files(walkers: List[Walker], workers: int) -> Iterator[Path]:
+    if workers > 1:
+        return find_target_files_concurrently(walkers, workers)
+    return chain.from_iterable(walker.find_target_files() for walker in walkers)
+
+
+def collect_target_file_paths(options: Optional[DiscoveryOptions] = None) -> Iterator[Path]:
+    options = options or DiscoveryOptions()
+
+    walkers = []
+    local_root: Optional[Path] = Path.cwd()
+    if options.nearest:
+        local_root = find_nearest_scope(local_root, options.extension)
+    if local_root is not None:
+        walkers.append(_make_walker(local_root, options, options.local_max_depth))
+
+    global_targets_dir = Path(options.global_dir).expanduser()
+    if global_targets_dir.is_dir():
+        walkers.append(_make_walker(global_targets_dir, options, options.max_depth))
+
+    # The global directory may live below cwd (or vice versa), in which
+    # case the same file would otherwise be yielded twice
+    seen = set()
+    for path in _find_target_files(walkers, options.workers):
+        if path not in seen:
+            seen.add(path)
+            yield path
 
 
 def load_module_from_path(path: Path) -> ModuleType:
@@ -45,6 +111,8 @@ def load_module_from_path(path: Path) -> ModuleType:
 
 
 def get_registries_for_module(module: ModuleType) -> List[Registry]:
+    from begin.registry import Registry
+
     registries_in_module = []
     for attribute_name in dir(module):
         attribute = getattr(module, attribute_name)
@@ -53,28 +121,591 @@ def get_registries_for_module(module: ModuleType) -> List[Registry]:
     return registries_in_module
 
 
-def load_registries() -> List[Registry]:
+def load_manifest(paths: List[Path], use_cache: bool = True) -> TargetManifest:
+    if use_cache:
+        return TargetManifest.load(paths, Path.cwd())
+    return TargetManifest.create(paths)
+
+
+def check_options_statically(manifest: TargetManifest, requests: List[Request]) -> None:
+    """ Checks the options of the requests for targets whose options the manifest
+    knows, before any targets file is executed. Raises `InvalidOptionsError`. """
+    problems = []
+    for request in requests:
+        target = manifest.get_target((request.target_name, request.registry_namespace))
+        if target is not None and target.schema is not None:
+            problems.extend((request.identifier, problem) for problem in target.schema.problems(request.options))
+    if problems:
+        raise InvalidOptionsError(problems)
+
+
+def select_target_file_paths(paths: List[Path], requests: List[Request], use_cache: bool = True) -> List[Path]:
+    """ Narrows `paths` down to the targets files which need to be executed to serve
+    `requests`, using a static analysis of each file. All of `paths` are returned if
+    the analysis is inconclusive. Options which the analysis can tell are invalid are
+    reported straight away. """
+    manifest = load_manifest(paths, use_cache)
+    check_options_statically(manifest, requests)
+    selected_paths = manifest.select_paths(
+        (request.target_name, request.registry_namespace) for request in requests
+    )
+    if selected_paths is None:
+        logger.debug('Falling back to executing every targets file')
+        return paths
+    return selected_paths
+
+
+def load_registries(
+    options: Optional[DiscoveryOptions] = None,
+    requests: Optional[List[Request]] = None,
+) -> List[Registry]:
+    options = options or DiscoveryOptions()
+    paths = list(collect_target_file_paths(options))
+    if requests:
+        paths = select_target_file_paths(paths, requests, options.use_cache)
+    return load_registries_from_paths(paths)
+
+
+def load_registries_from_paths(paths: List[Path]) -> List[Registry]:
     registries = []
-    for path in collect_target_file_paths():
+    for path in paths:
         module = load_module_from_path(path)
         registries_for_module = get_registries_for_module(module)
         registries.extend(registries_for_module)
     return registries
 
 
-def _main():
-    parsed_command: ParsedCommand = parse_command()
-    registries = load_registries()
+def load_target_index(options: DiscoveryOptions) -> TargetIndex:
+    """ Served from the target manifest, without executing any targets file, unless
+    the manifest is inconclusive. """
+    paths = list(collect_target_file_paths(options))
+    manifest = load_manifest(paths, options.use_cache)
+    if manifest.conclusive:
+        return TargetIndex.from_manifest(manifest)
+
+    from begin.registry import RegistryManager
+
+    registries = load_registries_from_paths(paths)
     manager = RegistryManager.create(registries)
-    for request in parsed_command.requests:
-        target = manager.get_target(
-            request.target_name,
-            request.registry_namespace,
+    return TargetIndex.from_registry_manager(manager)
+
+
+def list_targets(options: DiscoveryOptions, pattern: str) -> None:
+    for target in load_target_index(options).list_targets(pattern):
+        print(f'{target.qualified_name}{target.signature}')
+
+
+def complete(options: DiscoveryOptions, word: str) -> None:
+    """ Errors are swallowed, since anything printed would be offered as a completion. """
+    try:
+        completions = load_target_index(options).complete(word)
+    except Exception:
+        logger.debug('Failed to complete targets', exc_info=True)
+        return
+    for completion in completions:
+        print(completion)
+
+
+def manage_result_cache(action: str) -> None:
+    # Imported here, since it is only needed by targets which opted into caching
+    from begin.results import ResultCache
+
+    cache = ResultCache()
+    if action == 'stats':
+        stats = cache.stats()
+        print(f'Location: {cache.root}')
+        print(f'Entries: {stats.entries}')
+        print(f'Objects: {stats.objects}')
+        print(f'Size: {stats.size} of {stats.max_size} bytes')
+    elif action == 'prune':
+        print(f'Evicted {cache.prune()} entries')
+    elif action == 'clear':
+        print(f'Evicted {cache.clear()} entries')
+
+
+def _is_up_to_date(target: Target, stamp: Optional[TargetStamp], force: bool) -> bool:
+    if stamp is not None and not force and stamp.is_up_to_date():
+        logger.info(f'{target.identifier} is up to date')
+        return True
+    return False
+
+
+@contextmanager
+def _recording_stamp(stamp: Optional[TargetStamp]) -> Iterator[None]:
+    """ Records `stamp` if the target executed in the block succeeds, which for
+    recipes means exiting with a zero exit status. """
+    try:
+        yield
+    except SystemExit as ex:
+        if stamp is not None and ex.code in (None, 0):
+            stamp.record()
+        raise
+    if stamp is not None:
+        stamp.record()
+
+
+def execute_target(target: Target, options: Mapping[str, str], force: bool = False) -> None:
+    """ Executes `target` with `options`, unless it declares inputs and it is up to date
+    (see `TargetStamp`). Targets which opted into caching are served from the
+    `ResultCache` where possible. `force` executes the target regardless. """
+    from begin.stamps import TargetStamp
+
+    stamp = TargetStamp.for_target(target, options)
+    if _is_up_to_date(target, stamp, force):
+        return
+
+    with _recording_stamp(stamp):
+        if target.cache:
+            # Imported here, since it is only needed by targets which opted into caching
+            from begin.results import execute_cached
+            execute_cached(target, options, refresh=force)
+        else:
+            target.execute(**options)
+
+
+async def execute_target_async(target: Target, options: Mapping[str, str], force: bool = False) -> None:
+    """ As `execute_target`, for targets which run together on one event loop. The
+    result cache captures the output of the whole process, which concurrent targets
+    would interleave, so it is not used here. """
+    from begin.stamps import TargetStamp
+
+    stamp = TargetStamp.for_target(target, options)
+    if _is_up_to_date(target, stamp, force):
+        return
+
+    with _recording_stamp(stamp):
+        await target.execute_async(**options)
+
+
+def _failure_status(identifier: str, ex: BaseException) -> int:
+    """ The exit status of a target which raised `ex`. Must be called while `ex` is handled. """
+    from begin.utils import exit_status
+
+    if isinstance(ex, SystemExit):
+        return exit_status(ex.code)
+    if isinstance(ex, BeginError):
+        logger.error(ex.message)
+        return ex.exit_code
+    logger.exception(f'{identifier} raised an exception')
+    return 1
+
+
+def execute_request(paths: List[Path], request: Request, force: bool = False) -> int:
+    """ Loads the registries defined in `paths` and executes the target requested by
+    `request`, returning its exit status rather than exiting. Runs in a worker process
+    when requests are executed concurrently, so it must not rely on state set up by
+    the parent process. """
+    from begin.registry import RegistryManager
+
+    try:
+        manager = RegistryManager.create(load_registries_from_paths(paths))
+        target = manager.get_target(request.target_name, request.registry_namespace)
+        execute_target(target, request.options, force)
+    except (SystemExit, Exception) as ex:
+        return _failure_status(request.identifier, ex)
+    return 0
+
+
+def execute_request_with_output(output_path: str, paths: List[Path], request: Request, force: bool = False) -> int:
+    """ As `execute_request`, with everything the target writes to its standard output and
+    error sent to `output_path`, a pipe read by the parent's `OutputMultiplexer`. """
+    from begin.cli.multiplex import redirect_output
+
+    with redirect_output(output_path):
+        return execute_request(paths, request, force)
+
+
+async def execute_request_async(target: Target, options: Mapping[str, str], force: bool = False) -> int:
+    """ As `execute_request`, for a target which is already loaded, on the running event loop. """
+    try:
+        await execute_target_async(target, options, force)
+    except (SystemExit, Exception) as ex:
+        return _failure_status(target.identifier, ex)
+    return 0
+
+
+def get_requested_target(manager: RegistryManager, request: Request) -> Target:
+    try:
+        return manager.get_target(request.target_name, request.registry_namespace)
+    except KeyError:
+        raise UnknownTargetError(request.identifier) from None
+
+
+def resolve_requests(manager: RegistryManager, requests: List[Request]) -> Dict[Target, Request]:
+    """ Maps each requested target to its request. A target which is requested more than
+    once still only runs once, with the options of its last request. """
+    requests_by_target: Dict[Target, Request] = {}
+    for request in requests:
+        requests_by_target[get_requested_target(manager, request)] = request
+    return requests_by_target
+
+
+def validate_requests(manager: RegistryManager, requests: List[Request]) -> None:
+    """ Checks that every request names a known target, that its options fit the target's
+    signature, and that every target they depend on, which runs without options, needs
+    none. Every problem is reported at once, before anything runs, so that a long chain
+    of targets does not fail part way through over a mistyped option. Raises
+    `UnknownTargetError`, `DependencyCycleError` or `InvalidOptionsError`. """
+    requested = [(get_requested_target(manager, request), request.options) for request in requests]
+    requested_targets = {target for target, _ in requested}
+    dependencies = [
+        (target, {}) for target in manager.dependency_graph(requested_targets) if target not in requested_targets
+    ]
+
+    problems = [
+        (target.identifier, problem)
+        for target, options in requested + dependencies
+        for problem in target.schema.problems(options)
+    ]
+    if problems:
+        raise InvalidOptionsError(problems)
+
+
+def execute_dependency(target: Target, force: bool = False) -> None:
+    """ Executes a target which another target depends on. Recipes call `sys.exit` even
+    when they succeed, which would end the process before the dependent target could run,
+    so a zero exit status is swallowed. Any other exit status still exits immediately. """
+    try:
+        execute_target(target, {}, force)
+    except SystemExit as ex:
+        if ex.code not in (None, 0):
+            raise
+
+
+def _group_requests(manager: RegistryManager, requests: List[Request]) -> Iterator[List[Tuple[Request, Target]]]:
+    """ Splits `requests` into runs of consecutive requests for coroutine targets, and
+    single requests for any other target, pairing each request with its target. """
+    group: List[Tuple[Request, Target]] = []
+    for request in requests:
+        target = get_requested_target(manager, request)
+        if target.is_coroutine:
+            group.append((request, target))
+            continue
+        if group:
+            yield group
+            group = []
+        yield [(request, target)]
+    if group:
+        yield group
+
+
+def execute_coroutine_requests(
+    manager: RegistryManager,
+    requests_by_target: Dict[Target, Request],
+    executed: Set[Target],
+    force: bool = False,
+) -> Dict[Target, Optional[int]]:
+    """ Executes the requested targets, and the targets they depend on which are not in
+    `executed`, as tasks on one event loop, so that coroutine targets overlap. Like with
+    `-j`, each target runs at most once, with the options of its last request, and
+    targets whose dependencies failed are skipped. Returns the exit status of each
+    target, or `None` if it was skipped. """
+    import asyncio
+
+    from begin.scheduler import Scheduler
+
+    graph = {
+        target: [dependency for dependency in dependencies if dependency not in executed]
+        for target, dependencies in manager.dependency_graph(requests_by_target).items()
+        if target in requests_by_target or target not in executed
+    }
+
+    def run(target: Target) -> Awaitable[int]:
+        request = requests_by_target.get(target)
+        return execute_request_async(target, request.options if request else {}, force)
+
+    return asyncio.run(Scheduler(graph).run_asynchronously(run))
+
+
+def execute_requests(manager: RegistryManager, requests: List[Request], force: bool = False) -> None:
+    """ Executes each request in turn, in this process. Before a requested target runs,
+    every target it depends on which has not already run during this invocation is
+    executed, dependencies first. Requested targets themselves are executed exactly as
+    they always were: each request runs, and an exit from a target ends the process.
+    Targets which are up to date are skipped, unless `force` is set. Consecutive requests
+    for coroutine targets are the exception: they run concurrently on one event loop
+    (see `execute_coroutine_requests`), and fail together at the end. Every request is
+    validated before anything runs (see `validate_requests`). """
+    validate_requests(manager, requests)
+    executed: Set[Target] = set()
+    for group in _group_requests(manager, requests):
+        if len(group) > 1:
+            requests_by_target = {target: request for request, target in group}
+            statuses = execute_coroutine_requests(manager, requests_by_target, executed, force)
+            executed.update(target for target, status in statuses.items() if status is not None)
+            _raise_for_failures(statuses)
+            continue
+
+        (request, target), = group
+        # The graph lists the requested target last, after everything it depends on
+        dependencies = list(manager.dependency_graph([target]))[:-1]
+        for dependency in dependencies:
+            if dependency not in executed:
+                execute_dependency(dependency, force)
+                executed.add(dependency)
+        executed.add(target)
+        execute_target(target, request.options, force)
+
+
+def execute_requests_concurrently(
+    options: DiscoveryOptions,
+    requests: List[Request],
+    jobs: int,
+    force: bool = False,
+    output_mode: Optional[str] = None,
+) -> Dict[Target, Optional[int]]:
+    """ Executes the requested targets, along with every target they depend on, in up to
+    `jobs` worker processes. Returns the exit status of each target, or `None` for targets
+    which never ran because a dependency failed. Targets are functions defined in targets
+    files, which cannot be pickled, so each worker loads the targets files it needs itself.
+    The manifest keeps that to the files defining the target the worker executes. With an
+    `output_mode`, the output of each target is prefixed with its identifier, and shown
+    as it is written (`live`) or once the target finishes (`grouped`); otherwise workers
+    write straight to the terminal. """
+    # Importing the process pool pulls in multiprocessing, which would slow down
+    # every other command, including shell completion
+    from concurrent.futures import (
+        Future,
+        ProcessPoolExecutor,
+    )
+
+    from begin.cli.parser import Request
+    from begin.registry import RegistryManager
+    from begin.scheduler import Scheduler
+
+    paths = list(collect_target_file_paths(options))
+    manifest = load_manifest(paths, options.use_cache)
+
+    def select_paths(requests_to_serve: List[Request]) -> List[Path]:
+        selected_paths = manifest.select_paths(
+            (request.target_name, request.registry_namespace) for request in requests_to_serve
+        )
+        return paths if selected_paths is None else selected_paths
+
+    manager = RegistryManager.create(load_registries_from_paths(select_paths(requests)))
+    validate_requests(manager, requests)
+    requests_by_target = resolve_requests(manager, requests)
+    graph = manager.dependency_graph(requests_by_target)
+
+    with _output_multiplexer(output_mode) as multiplexer, ProcessPoolExecutor(max_workers=jobs) as executor:
+        def submit(target: Target) -> 'Future[int]':
+            request = requests_by_target.get(target) or Request(target.identifier)
+            if multiplexer is None:
+                return executor.submit(execute_request, select_paths([request]), request, force)
+
+            output_path = multiplexer.add(target.identifier)
+            future = executor.submit(execute_request_with_output, output_path, select_paths([request]), request, force)
+            # The scheduler only learns that the target finished once its output is written
+            # out, so that the output of a target always precedes that of its dependents
+            written: 'Future[int]' = Future()
+
+            def finish(_: 'Future[int]') -> None:
+                multiplexer.finish(target.identifier)
+                exception = future.exception()
+                if exception is None:
+                    written.set_result(future.result())
+                else:
+                    written.set_exception(exception)
+
+            future.add_done_callback(finish)
+            return written
+
+        return Scheduler(graph).run_concurrently(submit)
+
+
+def _output_multiplexer(output_mode: Optional[str]) -> ContextManager[Any]:
+    """ An `OutputMultiplexer`, or `None` where targets should write straight to the terminal. """
+    if output_mode is None:
+        return nullcontext()
+
+    from begin.cli.multiplex import (
+        OutputMultiplexer,
+        is_supported,
+    )
+
+    if not is_supported():
+        logger.warning('Prefixed output is not supported on this platform; targets write straight to the terminal')
+        return nullcontext()
+    return OutputMultiplexer(output_mode)
+
+
+def _raise_for_failures(statuses: Dict[Target, Optional[int]]) -> None:
+    skipped = [target.identifier for target, status in statuses.items() if status is None]
+    if skipped:
+        logger.warning(f'Skipped because a dependency failed: {", ".join(skipped)}')
+
+    failures = [(target.identifier, status) for target, status in statuses.items() if status]
+    if failures:
+        raise TargetFailureError(failures)
+
+
+def _reload_targets_file(
+    manager: RegistryManager,
+    path: Path,
+    old_registries: List[Registry],
+) -> Optional[RegistryNameCollisionError]:
+    registries = []
+    if path.is_file():
+        try:
+            registries = get_registries_for_module(load_module_from_path(path))
+        except Exception:
+            logger.exception(f'Failed to reload {path}')
+            return None
+
+    colliding_namespaces: Dict[str, List[Path]] = {}
+    for registry in registries:
+        try:
+            manager.replace_registry(registry)
+        except RegistryNameCollisionError as ex:
+            logger.error(ex.message)
+            colliding_namespaces.update(ex.colliding_namespaces)
+    names = {registry.name for registry in registries}
+    for registry in old_registries:
+        if registry.name not in names:
+            manager.remove_registry(registry.name)
+    logger.info(f'Reloaded {path}')
+    return RegistryNameCollisionError(colliding_namespaces) if colliding_namespaces else None
+
+
+def reload_targets_files(
+    manager: RegistryManager,
+    changed_paths: Iterable[Path],
+    extension: str,
+) -> Dict[Path, RegistryNameCollisionError]:
+    """ Re-executes each of `changed_paths` which is, or now looks like, a targets file,
+    and swaps the registries it defines into `manager`. Registries which a file no
+    longer defines (or which were defined in a deleted file) are removed. A file which
+    fails to execute leaves its registries as they were. A registry whose name is taken
+    by another file's is left out, and the collision is returned, by the path of the
+    file which defines it, so that the caller can report it. """
+    registries_by_path: Dict[Path, List[Registry]] = defaultdict(list)
+    for registry in manager.registries:
+        registries_by_path[registry.path].append(registry)
+
+    collisions = {}
+    for path in changed_paths:
+        if path in registries_by_path or fnmatch(path.name, extension):
+            collision = _reload_targets_file(manager, path, registries_by_path[path])
+            if collision is not None:
+                collisions[path] = collision
+    return collisions
+
+
+def execute_watched_requests(manager: RegistryManager, requests: List[Request], force: bool = False) -> int:
+    """ Executes `requests` as usual, but returns the exit status rather than exiting,
+    so that the watch can carry on. """
+    try:
+        execute_requests(manager, requests, force)
+    except (SystemExit, Exception) as ex:
+        return _failure_status(', '.join(request.identifier for request in requests), ex)
+    return 0
+
+
+def watch_requests(options: DiscoveryOptions, requests: List[Request], force: bool = False) -> None:
+    """ Executes `requests`, then executes them again whenever a file below the working
+    directory (or the global targets directory) changes, until interrupted. Everything
+    runs in this process, so recipes reuse the tools they already imported. Modules
+    imported from the watched directories are purged before each run, so that e.g.
+    pytest collects the edited tests rather than the ones it imported last time.
+    Changes made while the targets run are ignored, since they are often made by the
+    targets themselves. """
+    # Imported here, since it is only needed while watching
+    from begin.cli.watch import (
+        create_watcher,
+        purge_project_modules,
+    )
+    from begin.registry import RegistryManager
+
+    manager = RegistryManager.create(load_registries(options, requests))
+    roots = [Path.cwd()]
+    global_targets_dir = Path(options.global_dir).expanduser()
+    if global_targets_dir.is_dir():
+        roots.append(global_targets_dir)
+
+    watcher = create_watcher(roots)
+    try:
+        while True:
+            status = execute_watched_requests(manager, requests, force)
+            watcher.discard_changes()
+            print(f'Finished with exit status {status}. Watching for changes...', file=sys.stderr)
+
+            changes = watcher.wait_for_changes()
+            logger.info(f'Changed: {", ".join(sorted(str(path) for path in changes))}')
+            reload_targets_files(manager, changes, options.extension)
+            purge_project_modules(roots)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        watcher.close()
+
+
+def _main(registry_loader: Optional[Callable[[DiscoveryOptions, List[Request]], List[Registry]]] = None) -> None:
+    """ `registry_loader` replaces `load_registries`, letting the daemon serve registries
+    it already loaded. """
+    from begin.cli.completion import completion_script
+    from begin.cli.parser import parse_command
+    from begin.registry import RegistryManager
+
+    parsed_command = parse_command()
+    if parsed_command.completion_shell is not None:
+        print(completion_script(parsed_command.completion_shell), end='')
+        return
+    if parsed_command.complete is not None:
+        complete(parsed_command.discovery_options, parsed_command.complete)
+        return
+    if parsed_command.list_pattern is not None:
+        list_targets(parsed_command.discovery_options, parsed_command.list_pattern)
+        return
+    if parsed_command.cache_action is not None:
+        manage_result_cache(parsed_command.cache_action)
+        return
+    if parsed_command.daemon:
+        from begin.cli.daemon import serve
+        serve(parsed_command.discovery_options)
+        return
+
+    if parsed_command.watch:
+        if parsed_command.jobs is not None:
+            logger.warning('-j is ignored with --watch, which runs targets in this process')
+        watch_requests(parsed_command.discovery_options, parsed_command.requests, parsed_command.force)
+        return
+
+    if parsed_command.jobs is not None:
+        statuses = execute_requests_concurrently(
+            parsed_command.discovery_options,
+            parsed_command.requests,
+            parsed_command.jobs,
+            parsed_command.force,
+            parsed_command.output_mode,
         )
-        target.execute(**request.options)
+        _raise_for_failures(statuses)
+        return
+
+    registry_loader = registry_loader or load_registries
+    registries = registry_loader(parsed_command.discovery_options, parsed_command.requests)
+    manager = RegistryManager.create(registries)
+    execute_requests(manager, parsed_command.requests, parsed_command.force)
+
+
+def _completion_word(args: List[str]) -> Optional[str]:
+    """ The word to complete, if `args` is exactly the command the completion scripts
+    run (`--complete WORD`). """
+    if len(args) == 2 and args[0] == '--complete':
+        return args[1]
+    return None
 
 
 def main() -> NoReturn:
+    # Shell completion runs on every keypress, so the command the completion scripts run
+    # is answered here, before the parser and everything a command could need is imported.
+    # Any other use of `--complete` (e.g. with discovery options) goes through `_main`
+    word = _completion_word(sys.argv[1:])
+    if word is not None:
+        # Once the discovery index is warm, a walk is a `stat` per directory, which a
+        # thread pool (and importing it) only slows down
+        complete(DiscoveryOptions(workers=1), word)
+        sys.exit(0)
+
     try:
         _main()
     except BeginError as ex:
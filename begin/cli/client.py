@@ -0,0 +1,85 @@
+import array
+import json
+import os
+import socket
+import sys
+from pathlib import Path
+from typing import (
+    List,
+    Mapping,
+    NoReturn,
+    Optional,
+)
+
+from begin.cache import (
+    get_cache_dir,
+    make_cache_key,
+)
+
+
+# The standard streams are passed to the daemon, which writes to them directly
+FORWARDED_FILE_DESCRIPTORS = (0, 1, 2)
+
+
+def get_socket_path(root: Path) -> Path:
+    """ Where the daemon serving `root` listens. Socket paths are limited to around 100
+    bytes, so the name is kept short. """
+    return get_cache_dir().joinpath('daemon', f'{make_cache_key(str(root))[:16]}.sock')
+
+
+def find_socket(cwd: Path) -> Optional[Path]:
+    """ The socket of the daemon serving `cwd`, or its nearest ancestor, if any. """
+    for directory in (cwd, *cwd.parents):
+        socket_path = get_socket_path(directory)
+        if socket_path.exists():
+            return socket_path
+    return None
+
+
+def _read_line(connection: socket.socket) -> bytes:
+    data = b''
+    while not data.endswith(b'\n'):
+        chunk = connection.recv(4096)
+        if not chunk:
+            break
+        data += chunk
+    return data
+
+
+def forward(socket_path: Path, argv: List[str], cwd: Path, env: Mapping[str, str]) -> Optional[int]:
+    """ Runs `begin` in the daemon listening on `socket_path`, and returns its exit
+    status, or `None` if the daemon could not be reached (in which case nothing ran). """
+    header = json.dumps({'argv': argv, 'cwd': str(cwd), 'env': dict(env)}).encode() + b'\n'
+    file_descriptors = array.array('i', FORWARDED_FILE_DESCRIPTORS)
+
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        try:
+            connection.connect(str(socket_path))
+        except OSError:
+            # A daemon which exited without cleaning up leaves its socket behind
+            return None
+        sent = connection.sendmsg([header], [(socket.SOL_SOCKET, socket.SCM_RIGHTS, file_descriptors)])
+        if sent < len(header):
+            connection.sendall(header[sent:])
+
+        status = _read_line(connection)
+    if not status:
+        print('begin: the daemon exited before the command finished', file=sys.stderr)
+        return 1
+    return int(status)
+
+
+def main() -> NoReturn:
+    """ A thin entry point, which forwards the command line, working directory,
+    environment and standard streams to a `begin --daemon` serving the working
+    directory, and exits with its exit status. Without a daemon, the command runs
+    in this process, exactly like `begin`. """
+    cwd = Path.cwd()
+    socket_path = find_socket(cwd)
+    if socket_path is not None:
+        status = forward(socket_path, sys.argv, cwd, os.environ)
+        if status is not None:
+            sys.exit(status)
+
+    from begin.cli.cli import main as begin_main
+    begin_main()
@@ -0,0 +1,116 @@
+from bisect import bisect_left
+from dataclasses import dataclass
+from typing import (
+    TYPE_CHECKING,
+    Iterable,
+    List,
+    Optional,
+)
+
+from begin.cli.manifest import TargetManifest
+from begin.constants import DEFAULT_REGISTRY_NAME
+
+# Only needed where the manifest is inconclusive, and slow to import
+if TYPE_CHECKING:
+    from begin.registry import RegistryManager
+
+
+@dataclass(frozen=True)
+class IndexedTarget:
+    name: str
+    namespace: str
+    signature: str
+
+    @property
+    def qualified_name(self) -> str:
+        return f'{self.name}@{self.namespace}'
+
+    @property
+    def short_name(self) -> str:
+        """ The shortest identifier which can be used to request this target. """
+        if self.namespace == DEFAULT_REGISTRY_NAME:
+            return self.name
+        return self.qualified_name
+
+
+def _prefix_slice(sorted_values: List[str], prefix: str) -> range:
+    """ The range of indices of `sorted_values` which start with `prefix`. """
+    start = bisect_left(sorted_values, prefix)
+    stop = start
+    while stop < len(sorted_values) and sorted_values[stop].startswith(prefix):
+        stop += 1
+    return range(start, stop)
+
+
+class TargetIndex:
+    """ Sorted views over every available target, so that listing and completing
+    targets by prefix costs a binary search rather than a scan. It can be built from
+    a `TargetManifest`, which avoids executing any targets file, or from a
+    `RegistryManager` when the manifest is inconclusive. """
+
+    def __init__(self, targets: Iterable[IndexedTarget]) -> None:
+        self._targets = sorted(set(targets), key=lambda target: (target.name, target.namespace))
+        self._names = [target.name for target in self._targets]
+        self._short_names = sorted({target.short_name for target in self._targets})
+        self._qualified_names = sorted(target.qualified_name for target in self._targets)
+
+    @classmethod
+    def from_manifest(cls, manifest: TargetManifest) -> 'TargetIndex':
+        return cls(
+            IndexedTarget(name=target.name, namespace=target.namespace, signature=target.signature)
+            for target in manifest.targets()
+        )
+
+    @classmethod
+    def from_registry_manager(cls, manager: 'RegistryManager') -> 'TargetIndex':
+        return cls(
+            IndexedTarget(name=target.function_name, namespace=target.registry_namespace, signature=target.signature)
+            for target in manager.targets()
+        )
+
+    def list_targets(self, pattern: str = '') -> List[IndexedTarget]:
+        """ `pattern` takes the form `<prefix>@<namespace>`. Targets whose name starts
+        with `prefix` are returned, filtered to `namespace` if one is given. """
+        prefix, _, namespace = pattern.partition('@')
+        matches = (self._targets[i] for i in _prefix_slice(self._names, prefix))
+        return [target for target in matches if not namespace or target.namespace == namespace]
+
+    def complete(self, word: str) -> List[str]:
+        """ Targets in the default namespace are offered by name alone, unless the
+        word being completed already contains an `@`. """
+        candidates = self._qualified_names if '@' in word else self._short_names
+        return [candidates[i] for i in _prefix_slice(candidates, word)]
+
+
+_BASH_SCRIPT = """\
+_begin_complete() {
+    local cur="${COMP_WORDS[COMP_CWORD]}"
+    COMPREPLY=( $(compgen -W "$(begin --complete "$cur" 2>/dev/null)" -- "$cur") )
+}
+complete -o default -F _begin_complete begin
+"""
+
+_ZSH_SCRIPT = """\
+#compdef begin
+_begin() {
+    local -a targets
+    targets=(${(f)"$(begin --complete "${words[CURRENT]}" 2>/dev/null)"})
+    compadd -a targets
+}
+compdef _begin begin
+"""
+
+_FISH_SCRIPT = """\
+complete --command begin --no-files --arguments '(begin --complete (commandline --current-token) 2>/dev/null)'
+"""
+
+_COMPLETION_SCRIPTS = {
+    'bash': _BASH_SCRIPT,
+    'zsh': _ZSH_SCRIPT,
+    'fish': _FISH_SCRIPT,
+}
+
+
+def completion_script(shell: str) -> Optional[str]:
+    """ A script which, when sourced by `shell`, completes target names for `begin`. """
+    return _COMPLETION_SCRIPTS.get(shell)
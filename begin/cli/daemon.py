@@ -0,0 +1,235 @@
+import array
+import importlib
+import json
+import logging
+import os
+import signal
+import socket
+import sys
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    List,
+    Optional,
+    Tuple,
+)
+
+from begin.cli.client import (
+    FORWARDED_FILE_DESCRIPTORS,
+    get_socket_path,
+)
+from begin.cli.discovery import DiscoveryOptions
+from begin.cli.parser import Request
+from begin.constants import WARM_MODULES
+from begin.exceptions import (
+    DaemonError,
+    RegistryNameCollisionError,
+)
+from begin.registry import (
+    Registry,
+    RegistryManager,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def warm_up(module_names: Tuple[str, ...] = WARM_MODULES) -> List[str]:
+    """ Imports each of `module_names` which is installed, returning their names. """
+    imported = []
+    for module_name in module_names:
+        try:
+            importlib.import_module(module_name)
+        except Exception:
+            continue
+        imported.append(module_name)
+    return imported
+
+
+def _mtime(path: Path) -> Optional[int]:
+    try:
+        return os.stat(str(path)).st_mtime_ns
+    except OSError:
+        return None
+
+
+class WarmRegistries:
+    """ The registries of every targets file discovered from `root`, kept loaded between
+    requests. Before each request, targets files which were added, edited or deleted are
+    reloaded, and their registries swapped into the `RegistryManager`. A targets file
+    whose registries collide with another's is reloaded before every request until it
+    loads, and until then, requests fail just as they would without the daemon. """
+
+    def __init__(self, root: Path, options: DiscoveryOptions) -> None:
+        self.root = root
+        self.options = options
+        self.manager = RegistryManager([])
+        self._mtimes: Dict[Path, Optional[int]] = {}
+        self._collisions: Dict[Path, RegistryNameCollisionError] = {}
+
+    def refresh(self) -> None:
+        from begin.cli.cli import (
+            collect_target_file_paths,
+            reload_targets_files,
+        )
+
+        paths = set(collect_target_file_paths(self.options))
+        mtimes = {path: _mtime(path) for path in paths}
+        changed = [
+            path for path in mtimes.keys() | self._mtimes.keys()
+            if mtimes.get(path) != self._mtimes.get(path)
+        ]
+        # Retried after the changed files, which may have released the names they collided on
+        retried = [path for path in self._collisions if path not in changed]
+        self._collisions = reload_targets_files(self.manager, changed + retried, self.options.extension)
+        self._mtimes = mtimes
+
+    def load_registries(self, options: DiscoveryOptions, requests: List[Request]) -> List[Registry]:
+        """ A drop-in for `cli.load_registries`, which only uses the warm registries for
+        commands discovering targets files exactly as the daemon does. """
+        from begin.cli.cli import load_registries
+
+        if options != self.options or Path.cwd() != self.root:
+            return load_registries(options, requests)
+        if self._collisions:
+            colliding_namespaces: Dict[str, List[Path]] = {}
+            for collision in self._collisions.values():
+                colliding_namespaces.update(collision.colliding_namespaces)
+            raise RegistryNameCollisionError(colliding_namespaces)
+        return self.manager.registries
+
+
+def _receive_request(connection: socket.socket) -> Tuple[Dict[str, Any], List[int]]:
+    """ Reads the JSON header sent by `client.forward`, along with the file descriptors
+    of the client's standard streams. """
+    file_descriptors = array.array('i')
+    ancillary_size = socket.CMSG_SPACE(len(FORWARDED_FILE_DESCRIPTORS) * file_descriptors.itemsize)
+    data, ancillary_data, _, _ = connection.recvmsg(1 << 16, ancillary_size)
+    for level, message_type, message_data in ancillary_data:
+        if level == socket.SOL_SOCKET and message_type == socket.SCM_RIGHTS:
+            usable_length = len(message_data) - len(message_data) % file_descriptors.itemsize
+            file_descriptors.frombytes(message_data[:usable_length])
+
+    while not data.endswith(b'\n'):
+        chunk = connection.recv(1 << 16)
+        if not chunk:
+            raise DaemonError('The client disconnected before sending its request')
+        data += chunk
+    return json.loads(data), list(file_descriptors)
+
+
+def handle_request(connection: socket.socket, warm_registries: WarmRegistries) -> int:
+    """ Runs in a process forked for the request. Takes on the client's working directory,
+    environment, command line and standard streams, then runs `begin` as usual, and
+    returns its exit status. """
+    from begin.cli import cli
+
+    header, file_descriptors = _receive_request(connection)
+    if len(file_descriptors) != len(FORWARDED_FILE_DESCRIPTORS):
+        raise DaemonError('The client did not send its standard streams')
+    for file_descriptor, standard_file_descriptor in zip(file_descriptors, FORWARDED_FILE_DESCRIPTORS):
+        os.dup2(file_descriptor, standard_file_descriptor)
+        os.close(file_descriptor)
+
+    os.chdir(header['cwd'])
+    os.environ.clear()
+    os.environ.update(header['env'])
+    sys.argv = header['argv']
+    try:
+        cli._main(registry_loader=warm_registries.load_registries)
+    except (SystemExit, Exception) as ex:
+        return cli._failure_status('begin', ex)
+    return 0
+
+
+def _reap_children() -> None:
+    while True:
+        try:
+            pid, _ = os.waitpid(-1, os.WNOHANG)
+        except ChildProcessError:
+            return
+        if pid == 0:
+            return
+
+
+def _serve_connection(connection: socket.socket, warm_registries: WarmRegistries) -> None:
+    """ Runs in the forked process, and never returns. """
+    status = 1
+    try:
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        status = handle_request(connection, warm_registries)
+    except BaseException:
+        logger.exception('The daemon failed to handle a request')
+    finally:
+        try:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            connection.sendall(f'{status}\n'.encode())
+        finally:
+            os._exit(status)
+
+
+def _bind(socket_path: Path) -> socket.socket:
+    socket_path.parent.mkdir(mode=0o700, parents=True, exist_ok=True)
+    if socket_path.exists():
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as probe:
+            try:
+                probe.connect(str(socket_path))
+            except OSError:
+                # Left behind by a daemon which did not exit cleanly
+                socket_path.unlink()
+            else:
+                raise DaemonError(f'A daemon is already listening on {socket_path}')
+
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        server.bind(str(socket_path))
+        os.chmod(str(socket_path), 0o600)
+        server.listen()
+    except OSError as ex:
+        server.close()
+        raise DaemonError(f'Could not listen on {socket_path}: {ex}') from None
+    return server
+
+
+def _exit_on_sigterm(signal_number: int, frame: Any) -> None:
+    sys.exit(0)
+
+
+def serve(options: DiscoveryOptions) -> None:
+    """ Serves requests from `begin-client` for the working directory, until interrupted.
+    Each request runs in a process forked from this one, so it starts with the targets
+    files already executed and recipe tools already imported, and cannot disturb the
+    state of the daemon (or of other requests). """
+    if not hasattr(os, 'fork') or not hasattr(socket, 'AF_UNIX'):
+        raise DaemonError('--daemon is only supported on Unix-like systems')
+
+    root = Path.cwd()
+    socket_path = get_socket_path(root)
+    server = _bind(socket_path)
+    signal.signal(signal.SIGTERM, _exit_on_sigterm)
+    try:
+        warm_registries = WarmRegistries(root, options)
+        warm_registries.refresh()
+        warm_up()
+        print(f'Serving {root} on {socket_path}', file=sys.stderr)
+
+        while True:
+            connection, _ = server.accept()
+            _reap_children()
+            warm_registries.refresh()
+            sys.stdout.flush()
+            sys.stderr.flush()
+            if os.fork() == 0:
+                server.close()
+                _serve_connection(connection, warm_registries)
+            connection.close()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
+        try:
+            socket_path.unlink()
+        except OSError:
+            pass
@@ -0,0 +1,425 @@
+import os
+import re
+from abc import (
+    ABC,
+    abstractmethod,
+)
+from dataclasses import (
+    dataclass,
+    field,
+)
+from fnmatch import fnmatchcase
+from pathlib import Path
+from typing import (
+    Any,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+    Set,
+    Tuple,
+)
+
+from begin.constants import (
+    DEFAULT_DISCOVERY_WORKERS,
+    DEFAULT_EXCLUDED_DIRS,
+    DEFAULT_GLOBAL_DIR,
+    DEFAULT_TARGETS_EXTENSION,
+    FILE_IGNORE_FILE_NAMES,
+    IGNORE_FILE_NAMES,
+    PROJECT_ROOT_MARKERS,
+)
+
+
+def _translate(pattern: str) -> Pattern:
+    """ Translate a gitignore-style glob into a regular expression. Unlike
+    `fnmatch.translate`, `*` and `?` never match a path separator, while `**`
+    matches any number of directories. """
+    parts = []
+    i, n = 0, len(pattern)
+    while i < n:
+        char = pattern[i]
+        if pattern.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 3
+            continue
+        if pattern.startswith('**', i):
+            parts.append('.*')
+            i += 2
+            continue
+        if char == '*':
+            parts.append('[^/]*')
+        elif char == '?':
+            parts.append('[^/]')
+        elif char == '[':
+            end = pattern.find(']', i + 1)
+            if end == -1:
+                parts.append(re.escape(char))
+            else:
+                body = pattern[i + 1:end]
+                if body.startswith('!'):
+                    body = '^' + body[1:]
+                parts.append(f'[{body}]')
+                i = end + 1
+                continue
+        elif char == '\\' and i + 1 < n:
+            parts.append(re.escape(pattern[i + 1]))
+            i += 2
+            continue
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    return re.compile(''.join(parts) + r'\Z')
+
+
+class IgnoreRule:
+    """ A single pattern from a `.gitignore` or `.beginignore` file. A useful subset
+    of the gitignore syntax is supported: negation with a leading `!`, directory-only
+    patterns with a trailing `/`, patterns anchored to the directory of the ignore file
+    with a leading or embedded `/`, and `**` wildcards. Unless `applies_to_files` is
+    set, the rule only ever matches directories. """
+
+    def __init__(self, pattern: str, base_dir: str, applies_to_files: bool = True) -> None:
+        self.applies_to_files = applies_to_files
+        self.negated = pattern.startswith('!')
+        if self.negated:
+            pattern = pattern[1:]
+
+        self.directory_only = pattern.endswith('/')
+        pattern = pattern.rstrip('/')
+
+        # A pattern without a separator matches at any depth below base_dir
+        if '/' not in pattern:
+            pattern = '**/' + pattern
+
+        self._regex = _translate(pattern.lstrip('/'))
+        self._base_dir = os.path.join(base_dir, '')
+
+    def matches(self, path: str, is_dir: bool) -> bool:
+        if (self.directory_only or not self.applies_to_files) and not is_dir:
+            return False
+        if not path.startswith(self._base_dir):
+            return False
+        relative_path = path[len(self._base_dir):].replace(os.sep, '/')
+        return self._regex.match(relative_path) is not None
+
+
+IgnoreRules = Tuple[IgnoreRule, ...]
+
+
+def parse_ignore_file(path: str, applies_to_files: Optional[bool] = None) -> List[IgnoreRule]:
+    """ By default, the rules only apply to files if `path` is one of `FILE_IGNORE_FILE_NAMES`. """
+    base_dir = os.path.dirname(path)
+    if applies_to_files is None:
+        applies_to_files = os.path.basename(path) in FILE_IGNORE_FILE_NAMES
+    rules = []
+    try:
+        with open(path, encoding='utf-8', errors='replace') as ignore_file:
+            lines = ignore_file.read().splitlines()
+    except OSError:
+        return rules
+
+    for line in lines:
+        line = line.rstrip()
+        if not line or line.startswith('#'):
+            continue
+        rules.append(IgnoreRule(line, base_dir, applies_to_files))
+    return rules
+
+
+def is_ignored(rules: Iterable[IgnoreRule], path: str, is_dir: bool) -> bool:
+    """ As with git, the last matching rule wins, so a negated rule in a
+    nested ignore file can re-include a path excluded further up the tree. """
+    ignored = False
+    for rule in rules:
+        if rule.matches(path, is_dir):
+            ignored = not rule.negated
+    return ignored
+
+
+def is_excluded_dir(name: str, excluded_dirs: Iterable[str] = DEFAULT_EXCLUDED_DIRS) -> bool:
+    return any(fnmatchcase(name, pattern) for pattern in excluded_dirs)
+
+
+def _entry_is_dir(entry: os.DirEntry) -> bool:
+    try:
+        return entry.is_dir()
+    except OSError:
+        return False
+
+
+@dataclass
+class DirectoryScan:
+    """ The result of listing a single directory: the targets files it holds,
+    the sub-directories which should be descended into, the ignore files it
+    holds, and the ignore rules which apply to its descendants. """
+    path: str
+    target_files: List[str] = field(default_factory=list)
+    sub_dirs: List[str] = field(default_factory=list)
+    ignore_files: List[str] = field(default_factory=list)
+    rules: IgnoreRules = ()
+
+
+def scan_directory(
+    dir_path: str,
+    inherited_rules: IgnoreRules = (),
+    extension: str = DEFAULT_TARGETS_EXTENSION,
+    excluded_dirs: Iterable[str] = DEFAULT_EXCLUDED_DIRS,
+) -> Optional[DirectoryScan]:
+    """ Lists `dir_path` exactly once with `os.scandir`. Returns `None` if the
+    directory cannot be read. Entries are sorted by name so that discovery order
+    is deterministic. """
+    try:
+        with os.scandir(dir_path) as iterator:
+            entries = sorted(iterator, key=lambda entry: entry.name)
+    except OSError:
+        return None
+
+    rules = list(inherited_rules)
+    ignore_files = []
+    for entry in entries:
+        if entry.name in IGNORE_FILE_NAMES:
+            ignore_files.append(entry.path)
+            rules.extend(parse_ignore_file(entry.path))
+
+    scan = DirectoryScan(path=dir_path, ignore_files=ignore_files, rules=tuple(rules))
+    for entry in entries:
+        if _entry_is_dir(entry):
+            if is_excluded_dir(entry.name, excluded_dirs) or is_ignored(rules, entry.path, is_dir=True):
+                continue
+            scan.sub_dirs.append(entry.path)
+        elif fnmatchcase(entry.name, extension) and not is_ignored(rules, entry.path, is_dir=False):
+            scan.target_files.append(entry.path)
+    return scan
+
+
+DirIdentity = Tuple[int, int]
+
+# An opaque description of a directory still to be visited by a `Walker`
+PendingDir = Tuple[Any, ...]
+
+# The identity of a visited directory, the targets files it holds, and its
+# sub-directories still to be visited
+VisitResult = Tuple[DirIdentity, List[str], List[PendingDir]]
+
+
+def _dir_identity(dir_path: str) -> Optional[DirIdentity]:
+    try:
+        stat_result = os.stat(dir_path)
+    except OSError:
+        return None
+    return stat_result.st_dev, stat_result.st_ino
+
+
+class Walker(ABC):
+    """ Walks the tree below `root` depth-first, yielding every targets file. A walk is
+    split into a visit of `root` itself, which returns the sub-directories still to be
+    visited, and walks of those sub-directories, which are independent of one another
+    and so can be run concurrently (see `find_target_files_concurrently`). Subclasses
+    implement `_root_item` and `_visit`, which lists a single directory. """
+
+    def __init__(self, root: Path, max_depth: Optional[int] = None) -> None:
+        self.root = root
+        self.max_depth = max_depth
+        self._root_visited: Set[DirIdentity] = set()
+
+    @abstractmethod
+    def _root_item(self) -> PendingDir:
+        """ The item from which a walk of `root` starts. """
+
+    @abstractmethod
+    def _visit(self, item: PendingDir, visited: Set[DirIdentity]) -> Optional[VisitResult]:
+        """ Lists the directory described by `item`, returning its identity, the targets
+        files it holds and the sub-directories which still need visiting, or `None` if it
+        cannot be listed or was already in `visited`. """
+
+    def _descend(self, depth: int) -> bool:
+        return self.max_depth is None or depth < self.max_depth
+
+    def split(self) -> Tuple[List[Path], List[PendingDir]]:
+        self._root_visited = set()
+        result = self._visit(self._root_item(), self._root_visited)
+        if result is None:
+            return [], []
+        _, target_files, pending = result
+        return [Path(target_file) for target_file in target_files], pending
+
+    @property
+    def root_visited(self) -> Set[DirIdentity]:
+        return set(self._root_visited)
+
+    def walk_directories(self, pending: List[PendingDir]) -> Iterator[Tuple[DirIdentity, List[Path]]]:
+        """ Yields the identity of each directory visited below `pending`, along with
+        the targets files it holds. Each walk has its own record of visited directories,
+        so that walks can run concurrently. The root is always considered visited. """
+        visited = self.root_visited
+
+        # Reversed, so that sub-directories are popped in alphabetical order
+        stack = list(reversed(pending))
+        while stack:
+            result = self._visit(stack.pop(), visited)
+            if result is None:
+                continue
+            identity, target_files, children = result
+            yield identity, [Path(target_file) for target_file in target_files]
+            stack.extend(reversed(children))
+
+    def walk(self, pending: List[PendingDir]) -> Iterator[Path]:
+        for _, target_files in self.walk_directories(pending):
+            yield from target_files
+
+    def finish(self) -> None:
+        """ Called once every sub-directory returned by `split` has been walked. """
+
+    def find_target_files(self) -> Iterator[Path]:
+        target_files, pending = self.split()
+        yield from target_files
+        yield from self.walk(pending)
+        self.finish()
+
+
+class TargetFileWalker(Walker):
+
+    def __init__(
+        self,
+        root: Path,
+        extension: str = DEFAULT_TARGETS_EXTENSION,
+        excluded_dirs: Iterable[str] = DEFAULT_EXCLUDED_DIRS,
+        max_depth: Optional[int] = None,
+    ) -> None:
+        super().__init__(root, max_depth)
+        self.extension = extension
+        self.excluded_dirs = tuple(excluded_dirs)
+
+    def _root_item(self) -> PendingDir:
+        return str(self.root), (), 0
+
+    def _visit(self, item: PendingDir, visited: Set[DirIdentity]) -> Optional[VisitResult]:
+        dir_path, inherited_rules, depth = item
+
+        identity = _dir_identity(dir_path)
+        if identity is None or identity in visited:
+            return None
+        visited.add(identity)
+
+        scan = scan_directory(dir_path, inherited_rules, self.extension, self.excluded_dirs)
+        if scan is None:
+            return None
+
+        pending: List[PendingDir] = []
+        if self._descend(depth):
+            pending = [(sub_dir, scan.rules, depth + 1) for sub_dir in scan.sub_dirs]
+        return identity, scan.target_files, pending
+
+
+def find_target_files(
+    root: Path,
+    extension: str = DEFAULT_TARGETS_EXTENSION,
+    excluded_dirs: Iterable[str] = DEFAULT_EXCLUDED_DIRS,
+    max_depth: Optional[int] = None,
+) -> Iterator[Path]:
+    """ Walks the tree below `root` depth-first, yielding every file whose name matches
+    `extension`. Directories matching `excluded_dirs`, or ignored by a `.gitignore` or
+    `.beginignore` file, are pruned rather than filtered, so their contents are never
+    listed. Symlinked directories are followed, but each physical directory is visited at
+    most once, which also guards against symlink loops. If `max_depth` is given, the walk
+    does not descend more than `max_depth` directories below `root`. """
+    walker = TargetFileWalker(root, extension, excluded_dirs, max_depth)
+    return walker.find_target_files()
+
+
+def _walk_to_list(walker: Walker, item: PendingDir) -> List[Tuple[DirIdentity, List[Path]]]:
+    return list(walker.walk_directories([item]))
+
+
+def find_target_files_concurrently(walkers: Sequence[Walker], max_workers: int) -> Iterator[Path]:
+    """ Yields the same paths, in the same order, as running each of `walkers` in turn,
+    but fans the work out over a pool of at most `max_workers` threads: every root is
+    listed concurrently, then every top-level sub-directory of every root is walked
+    concurrently. Paths are yielded as soon as all of the work which precedes them in
+    the serial order has completed, so consumers can start before the walk finishes.
+    Sub-directories are walked independently, so a directory reachable from two of them
+    (e.g. through a symlink) is listed by both, but only yielded for the first, just as
+    a serial walk would only visit it once. Threads help even though the walk is in
+    python, since the GIL is released while waiting on `stat` and `scandir`, which
+    dominate on network-backed storage. """
+    # concurrent.futures (and the logging it imports) is only needed with several workers,
+    # and would slow down shell completion, which never has them
+    from concurrent.futures import (
+        Future,
+        ThreadPoolExecutor,
+    )
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        split_futures = [executor.submit(walker.split) for walker in walkers]
+        plans: List[Tuple[Walker, List[Path], List[Future]]] = []
+        try:
+            for walker, split_future in zip(walkers, split_futures):
+                target_files, pending = split_future.result()
+                sub_dir_futures = [executor.submit(_walk_to_list, walker, item) for item in pending]
+                plans.append((walker, target_files, sub_dir_futures))
+
+            for walker, target_files, sub_dir_futures in plans:
+                yield from target_files
+                seen = walker.root_visited
+                for future in sub_dir_futures:
+                    for identity, dir_target_files in future.result():
+                        if identity not in seen:
+                            seen.add(identity)
+                            yield from dir_target_files
+                walker.finish()
+        finally:
+            # If the consumer stops early, don't keep walking on its behalf
+            for _, _, sub_dir_futures in plans:
+                for future in sub_dir_futures:
+                    future.cancel()
+
+
+def find_project_root(start: Path, markers: Iterable[str] = PROJECT_ROOT_MARKERS) -> Optional[Path]:
+    """ Returns the closest of `start` and its ancestors which holds one of `markers`,
+    or `None` if `start` is not inside a project. """
+    for directory in (start, *start.parents):
+        if any(directory.joinpath(marker).exists() for marker in markers):
+            return directory
+    return None
+
+
+def find_nearest_scope(
+    start: Path,
+    extension: str = DEFAULT_TARGETS_EXTENSION,
+    markers: Iterable[str] = PROJECT_ROOT_MARKERS,
+) -> Optional[Path]:
+    """ Searches `start`, then each of its ancestors up to and including the project
+    root, for the nearest directory which directly holds targets files. Only `start`
+    itself is searched if it is not inside a project. Returns `None` if no targets files
+    were found. """
+    project_root = find_project_root(start, markers) or start
+    for directory in (start, *start.parents):
+        scan = scan_directory(str(directory), extension=extension)
+        if scan is not None and scan.target_files:
+            return directory
+        if directory == project_root:
+            break
+    return None
+
+
+@dataclass
+class DiscoveryOptions:
+    """ Everything which controls where, and how, targets files are searched for. """
+    extension: str = DEFAULT_TARGETS_EXTENSION
+    global_dir: str = DEFAULT_GLOBAL_DIR
+    use_cache: bool = True
+    rebuild_index: bool = False
+    nearest: bool = False
+    max_depth: Optional[int] = None
+    workers: int = DEFAULT_DISCOVERY_WORKERS
+
+    @property
+    def local_max_depth(self) -> Optional[int]:
+        """ When only the nearest scope is searched, its sub-directories are not
+        searched unless a maximum depth was requested explicitly. """
+        if self.nearest and self.max_depth is None:
+            return 0
+        return self.max_depth
@@ -0,0 +1,205 @@
+import os
+import time
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from begin.cache import (
+    get_cache_dir,
+    make_cache_key,
+    read_json,
+    trusted_mtime,
+    write_json,
+)
+from begin.cli.discovery import (
+    DirIdentity,
+    IgnoreRule,
+    PendingDir,
+    VisitResult,
+    Walker,
+    parse_ignore_file,
+    scan_directory,
+)
+from begin.constants import (
+    DEFAULT_EXCLUDED_DIRS,
+    DEFAULT_TARGETS_EXTENSION,
+)
+
+
+IndexEntry = Dict[str, Any]
+
+
+def _stat_mtime(path: str) -> Optional[int]:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return None
+
+
+class DiscoveryIndex(Walker):
+    """ A persistent record of every directory visited while searching `root` for
+    targets files, along with the mtimes of those directories and of the ignore
+    files they hold. Adding, removing or renaming an entry updates the mtime of the
+    directory which holds it, so on a warm run an unchanged directory costs a single
+    `stat`, and only directories whose mtime has moved are listed again. If an ignore
+    file changes, the whole sub-tree below it is re-listed, since the set of pruned
+    paths may have changed. Walks yield the same paths, in the same order, as
+    `discovery.find_target_files`, and the refreshed index is saved on completion. """
+
+    VERSION = 2
+
+    def __init__(
+        self,
+        path: Path,
+        root: Path,
+        extension: str = DEFAULT_TARGETS_EXTENSION,
+        excluded_dirs: Iterable[str] = DEFAULT_EXCLUDED_DIRS,
+        max_depth: Optional[int] = None,
+        entries: Optional[Dict[str, IndexEntry]] = None,
+    ) -> None:
+        super().__init__(root, max_depth)
+        self.path = path
+        self.extension = extension
+        self.excluded_dirs = tuple(sorted(excluded_dirs))
+        self._entries: Dict[str, IndexEntry] = entries or {}
+        self._new_entries: Dict[str, IndexEntry] = {}
+        self._parsed_ignore_files: Dict[str, List[IgnoreRule]] = {}
+        self._scan_started_ns = 0
+        self._dirty = False
+
+    @classmethod
+    def load(
+        cls,
+        root: Path,
+        extension: str = DEFAULT_TARGETS_EXTENSION,
+        excluded_dirs: Iterable[str] = DEFAULT_EXCLUDED_DIRS,
+        max_depth: Optional[int] = None,
+        rebuild: bool = False,
+    ) -> 'DiscoveryIndex':
+        """ Loads the index for `root` from the cache directory. Indices are keyed on
+        the discovery configuration as well as the root, so changing `--extension` or
+        `--max-depth` never returns stale results. If `rebuild` is set, or the cached
+        index is missing, corrupt or from another version of `begin`, an empty index is
+        returned and the next walk is cold. """
+        excluded_dirs = tuple(sorted(excluded_dirs))
+        key = make_cache_key(cls.VERSION, str(root), extension, excluded_dirs, max_depth)
+        path = get_cache_dir().joinpath('index', f'{key}.json')
+
+        entries = None
+        data = None if rebuild else read_json(path)
+        if isinstance(data, dict) and data.get('version') == cls.VERSION:
+            entries = data.get('entries')
+
+        return cls(path, root, extension, excluded_dirs, max_depth, entries)
+
+    def save(self) -> None:
+        write_json(self.path, {
+            'version': self.VERSION,
+            'root': str(self.root),
+            'entries': self._entries,
+        })
+
+    def _rules_for(self, ignore_files: Iterable[str]) -> Tuple[IgnoreRule, ...]:
+        rules: List[IgnoreRule] = []
+        for ignore_file in ignore_files:
+            if ignore_file not in self._parsed_ignore_files:
+                self._parsed_ignore_files[ignore_file] = parse_ignore_file(ignore_file)
+            rules.extend(self._parsed_ignore_files[ignore_file])
+        return tuple(rules)
+
+    @staticmethod
+    def _is_fresh(entry: IndexEntry, mtime_ns: int) -> bool:
+        if entry.get('mtime_ns') != mtime_ns:
+            return False
+        for ignore_file, ignore_mtime_ns in entry['ignore_files'].items():
+            if ignore_mtime_ns is None or _stat_mtime(ignore_file) != ignore_mtime_ns:
+                return False
+        return True
+
+    def _rescan(
+        self,
+        dir_path: str,
+        mtime_ns: int,
+        inherited_ignore_files: Tuple[str, ...],
+        scan_started_ns: int,
+    ) -> Optional[IndexEntry]:
+        inherited_rules = self._rules_for(inherited_ignore_files)
+        scan = scan_directory(dir_path, inherited_rules, self.extension, self.excluded_dirs)
+        if scan is None:
+            return None
+
+        ignore_files = {}
+        for ignore_file in scan.ignore_files:
+            ignore_mtime_ns = _stat_mtime(ignore_file)
+            if ignore_mtime_ns is not None:
+                ignore_mtime_ns = trusted_mtime(ignore_mtime_ns, scan_started_ns)
+            ignore_files[ignore_file] = ignore_mtime_ns
+
+        return {
+            'mtime_ns': trusted_mtime(mtime_ns, scan_started_ns),
+            'ignore_files': ignore_files,
+            'target_files': scan.target_files,
+            'sub_dirs': scan.sub_dirs,
+        }
+
+    def _root_item(self) -> PendingDir:
+        # The directory, the ignore files which apply to it, whether cached
+        # entries in its sub-tree must be disregarded, and its depth
+        return str(self.root), (), False, 0
+
+    def split(self) -> Tuple[List[Path], List[PendingDir]]:
+        self._scan_started_ns = time.time_ns()
+        self._new_entries = {}
+        self._dirty = False
+        return super().split()
+
+    def _visit(self, item: PendingDir, visited: Set[DirIdentity]) -> Optional[VisitResult]:
+        dir_path, inherited_ignore_files, force, depth = item
+
+        try:
+            stat_result = os.stat(dir_path)
+        except OSError:
+            return None
+        identity = (stat_result.st_dev, stat_result.st_ino)
+        if identity in visited:
+            return None
+        visited.add(identity)
+
+        cached_entry = self._entries.get(dir_path)
+        if not force and cached_entry is not None and self._is_fresh(cached_entry, stat_result.st_mtime_ns):
+            entry = cached_entry
+        else:
+            entry = self._rescan(dir_path, stat_result.st_mtime_ns, inherited_ignore_files, self._scan_started_ns)
+            if entry is None:
+                return None
+            # If the ignore files held by this directory changed, so might
+            # have the set of pruned paths anywhere beneath it
+            previous_ignore_files = cached_entry['ignore_files'] if cached_entry else {}
+            force = force or entry['ignore_files'] != previous_ignore_files
+            if entry != cached_entry:
+                self._dirty = True
+
+        self._new_entries[dir_path] = entry
+
+        pending: List[PendingDir] = []
+        if self._descend(depth):
+            ignore_files = inherited_ignore_files + tuple(entry['ignore_files'])
+            pending = [(sub_dir, ignore_files, force, depth + 1) for sub_dir in entry['sub_dirs']]
+        return identity, entry['target_files'], pending
+
+    def finish(self) -> None:
+        """ Replaces the loaded entries with those visited by the walk, dropping
+        directories which no longer exist. The index is only saved if an entry was
+        added, refreshed or dropped, so a warm run over an unchanged tree writes
+        nothing. """
+        changed = self._dirty or self._new_entries.keys() != self._entries.keys()
+        self._entries = self._new_entries
+        if changed:
+            self.save()
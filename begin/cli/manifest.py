@@ -0,0 +1,249 @@
+import hashlib
+import logging
+import os
+import time
+from dataclasses import (
+    asdict,
+    dataclass,
+    field,
+)
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from begin.cache import (
+    get_cache_dir,
+    make_cache_key,
+    read_json,
+    trusted_mtime,
+    write_json,
+)
+from begin.converters import OptionSchema
+
+
+logger = logging.getLogger(__name__)
+
+# (target_name, registry_namespace)
+TargetIdentifier = Tuple[str, str]
+
+
+@dataclass
+class ManifestTarget:
+    name: str
+    namespace: str
+    qualname: str
+    signature: str
+    depends_on: List[TargetIdentifier] = field(default_factory=list)
+    # `None` if the options cannot be told from the source, e.g. if other decorators may
+    # have changed the signature
+    schema: Optional[OptionSchema] = None
+
+    @property
+    def identifier(self) -> TargetIdentifier:
+        return self.name, self.namespace
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'ManifestTarget':
+        # Identifiers are stored as JSON arrays
+        depends_on = [(name, namespace) for name, namespace in data.pop('depends_on')]
+        schema = data.pop('schema')
+        return cls(depends_on=depends_on, schema=None if schema is None else OptionSchema.from_dict(schema), **data)
+
+
+@dataclass
+class ModuleManifest:
+    """ The registries and targets a targets file defines, as far as can be told
+    without executing it. If `conclusive` is `False`, nothing is known about
+    the file. """
+    path: Path
+    namespaces: Set[str] = field(default_factory=set)
+    targets: List[ManifestTarget] = field(default_factory=list)
+    conclusive: bool = True
+
+    @property
+    def identifiers(self) -> Set[TargetIdentifier]:
+        return {target.identifier for target in self.targets}
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'namespaces': sorted(self.namespaces),
+            'targets': [asdict(target) for target in self.targets],
+            'conclusive': self.conclusive,
+        }
+
+    @classmethod
+    def from_dict(cls, path: Path, data: Dict[str, Any]) -> 'ModuleManifest':
+        return cls(
+            path=path,
+            namespaces=set(data['namespaces']),
+            targets=[ManifestTarget.from_dict(dict(target)) for target in data['targets']],
+            conclusive=data['conclusive'],
+        )
+
+
+def analyse_source(path: Path, source: bytes) -> ModuleManifest:
+    # The analysis needs `ast`, which is slow enough to import that it would dominate
+    # shell completion, so it is only imported when a targets file must be parsed
+    from begin.cli.analysis import analyse_source as _analyse_source
+    return _analyse_source(path, source)
+
+
+def analyse_targets_file(path: Path) -> ModuleManifest:
+    try:
+        source = path.read_bytes()
+    except OSError:
+        return ModuleManifest(path=path, conclusive=False)
+    return analyse_source(path, source)
+
+
+class ManifestCache:
+    """ Persists the `ModuleManifest` of each targets file between invocations, keyed
+    on the file's size, mtime and content hash. A file whose size and mtime are
+    unchanged is neither read nor parsed. A file whose mtime moved but whose content
+    hash did not (e.g. after a `git checkout`) is read and hashed, but not parsed.
+    One cache is kept per working directory, holding only the files discovered there
+    on the last run. """
+
+    VERSION = 3
+
+    def __init__(self, path: Path, entries: Optional[Dict[str, Dict[str, Any]]] = None) -> None:
+        self.path = path
+        self._entries: Dict[str, Dict[str, Any]] = entries or {}
+        self._new_entries: Dict[str, Dict[str, Any]] = {}
+        self._dirty = False
+
+    @classmethod
+    def load(cls, cwd: Path) -> 'ManifestCache':
+        key = make_cache_key(cls.VERSION, str(cwd))
+        path = get_cache_dir().joinpath('manifest', f'{key}.json')
+
+        entries = None
+        data = read_json(path)
+        if isinstance(data, dict) and data.get('version') == cls.VERSION:
+            entries = data.get('entries')
+        return cls(path, entries)
+
+    def get(self, path: Path) -> ModuleManifest:
+        key = str(path)
+        try:
+            stat_result = os.stat(key)
+        except OSError:
+            return ModuleManifest(path=path, conclusive=False)
+
+        cached_entry = self._entries.get(key)
+        if (
+            cached_entry is not None
+            and cached_entry['size'] == stat_result.st_size
+            and cached_entry['mtime_ns'] == stat_result.st_mtime_ns
+        ):
+            self._new_entries[key] = cached_entry
+            return ModuleManifest.from_dict(path, cached_entry['manifest'])
+
+        try:
+            source = path.read_bytes()
+        except OSError:
+            return ModuleManifest(path=path, conclusive=False)
+        content_hash = hashlib.sha256(source).hexdigest()
+
+        if cached_entry is not None and cached_entry['sha256'] == content_hash:
+            module_manifest = ModuleManifest.from_dict(path, cached_entry['manifest'])
+        else:
+            module_manifest = analyse_source(path, source)
+
+        self._new_entries[key] = {
+            'size': stat_result.st_size,
+            'mtime_ns': trusted_mtime(stat_result.st_mtime_ns, time.time_ns()),
+            'sha256': content_hash,
+            'manifest': module_manifest.to_dict(),
+        }
+        self._dirty = True
+        return module_manifest
+
+    def save(self) -> None:
+        """ Only writes if an entry was added, refreshed or dropped since loading. """
+        if not self._dirty and self._new_entries.keys() == self._entries.keys():
+            return
+        write_json(self.path, {
+            'version': self.VERSION,
+            'entries': self._new_entries,
+        })
+
+
+class TargetManifest:
+    """ A static map of which targets files define which targets, used to avoid
+    executing targets files which cannot be relevant to a command. """
+
+    def __init__(self, modules: List[ModuleManifest]) -> None:
+        self._modules = modules
+
+    @classmethod
+    def create(cls, paths: Iterable[Path]) -> 'TargetManifest':
+        return cls([analyse_targets_file(path) for path in paths])
+
+    @classmethod
+    def load(cls, paths: Iterable[Path], cwd: Path) -> 'TargetManifest':
+        """ As `TargetManifest.create`, but served from (and saved to) the
+        `ManifestCache` for `cwd`. """
+        cache = ManifestCache.load(cwd)
+        target_manifest = cls([cache.get(path) for path in paths])
+        cache.save()
+        return target_manifest
+
+    @property
+    def conclusive(self) -> bool:
+        return all(module.conclusive for module in self._modules)
+
+    def targets(self) -> Iterator[ManifestTarget]:
+        for module in self._modules:
+            yield from module.targets
+
+    def get_target(self, identifier: TargetIdentifier) -> Optional[ManifestTarget]:
+        return next((target for target in self.targets() if target.identifier == identifier), None)
+
+    def _with_dependencies(self, requested: Iterable[TargetIdentifier]) -> Set[TargetIdentifier]:
+        targets_by_identifier = {target.identifier: target for target in self.targets()}
+        identifiers = set(requested)
+        unvisited = list(identifiers)
+        while unvisited:
+            target = targets_by_identifier.get(unvisited.pop())
+            if target is None:
+                continue
+            for dependency in target.depends_on:
+                if dependency not in identifiers:
+                    identifiers.add(dependency)
+                    unvisited.append(dependency)
+        return identifiers
+
+    def select_paths(self, requested: Iterable[TargetIdentifier]) -> Optional[List[Path]]:
+        """ Returns the paths which must be executed to serve the `requested` targets,
+        and every target they depend on, in discovery order, or `None` if every targets
+        file must be executed. A file is selected if it defines a registry with a requested
+        namespace (so that a namespace collision is still reported), or if nothing is
+        known about it. """
+        requested = self._with_dependencies(requested)
+        requested_namespaces = {namespace for _, namespace in requested}
+
+        selected = []
+        found: Set[TargetIdentifier] = set()
+        for module in self._modules:
+            if not module.conclusive:
+                selected.append(module.path)
+            elif module.namespaces & requested_namespaces:
+                selected.append(module.path)
+                found |= module.identifiers & requested
+
+        # If a target could not be located statically, it may be defined somewhere
+        # the analysis cannot see, so fall back to executing everything
+        missing = requested - found
+        if missing:
+            logger.debug(f'Targets not found by static analysis: {sorted(missing)}')
+            return None
+        return selected
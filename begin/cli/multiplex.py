@@ -0,0 +1,261 @@
+import os
+import selectors
+import shutil
+import sys
+import tempfile
+import threading
+from contextlib import contextmanager
+from queue import (
+    Empty,
+    SimpleQueue,
+)
+from typing import (
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Set,
+)
+
+from begin.constants import (
+    DEFAULT_OUTPUT_SPILL_SIZE,
+    OUTPUT_MODES,
+)
+
+# Reads are at most this large, and a line which grows longer than this before it ends
+# is written out in pieces, so that live output never holds more than this per child
+_CHUNK_SIZE = 64 * 1024
+
+# The descriptors every multiplexer in this process holds open. Forked children (e.g. the
+# workers of a process pool) close them, so that they never hold another child's pipe open
+_OPEN_FDS: Set[int] = set()
+
+
+def _close_inherited_fds() -> None:
+    for fd in _OPEN_FDS:
+        try:
+            os.close(fd)
+        except OSError:
+            pass
+    _OPEN_FDS.clear()
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_close_inherited_fds)
+
+
+def _open(path: str, flags: int) -> int:
+    fd = os.open(path, flags)
+    _OPEN_FDS.add(fd)
+    return fd
+
+
+def _close(fd: int) -> None:
+    _OPEN_FDS.discard(fd)
+    os.close(fd)
+
+
+def is_supported() -> bool:
+    """ Children write to named pipes, which Windows does not have. """
+    return hasattr(os, 'mkfifo')
+
+
+@contextmanager
+def redirect_output(path: str) -> Iterator[None]:
+    """ Points the standard output and error file descriptors of this process at `path`
+    (a pipe created by `OutputMultiplexer.add`), so that subprocesses and extension
+    modules are captured as well as `print`. Restores them on exit. """
+    sys.stdout.flush()
+    sys.stderr.flush()
+    saved = [os.dup(1), os.dup(2)]
+    fd = os.open(path, os.O_WRONLY)
+    try:
+        os.dup2(fd, 1)
+        os.dup2(fd, 2)
+        os.close(fd)
+        yield
+    finally:
+        sys.stdout.flush()
+        sys.stderr.flush()
+        for target_fd, saved_fd in enumerate(saved, start=1):
+            os.dup2(saved_fd, target_fd)
+            os.close(saved_fd)
+
+
+class _Channel:
+    """ The output of one child: a named pipe, the line it is part way through, and in
+    grouped mode, everything it wrote so far, which moves from memory to a temporary
+    file once it outgrows `spill_size`. """
+
+    def __init__(self, name: str, path: str, grouped: bool, spill_size: int) -> None:
+        os.mkfifo(path)
+        self.path = path
+        self.prefix = f'{name} | '.encode()
+        self.fd = _open(path, os.O_RDONLY | os.O_NONBLOCK)
+        # Held until the channel is closed, so that reads never find the end of the
+        # output, even before the child has opened the pipe or after it closed it
+        self._writer_fd = _open(path, os.O_WRONLY | os.O_NONBLOCK)
+        self.group: Optional[BinaryIO] = tempfile.SpooledTemporaryFile(max_size=spill_size) if grouped else None
+        self.partial = b''
+        self.done = threading.Event()
+
+    def close(self) -> None:
+        _close(self.fd)
+        _close(self._writer_fd)
+        self.done.set()
+
+    def lines(self, data: bytes) -> List[bytes]:
+        """ The prefixed lines which `data` completes. """
+        *complete, self.partial = (self.partial + data).split(b'\n')
+        while len(self.partial) > _CHUNK_SIZE:
+            complete.append(self.partial[:_CHUNK_SIZE])
+            self.partial = self.partial[_CHUNK_SIZE:]
+        return [self.prefix + line + b'\n' for line in complete]
+
+    def last_line(self) -> List[bytes]:
+        """ The line the child was part way through when it finished, however it ends. """
+        pending, self.partial = self.partial, b''
+        return [self.prefix + pending + b'\n'] if pending else []
+
+
+class OutputMultiplexer:
+    """ Collects the output of concurrently running children, each of which writes to a
+    named pipe (see `add`), and writes it to `output` (the standard output by default)
+    with every line prefixed by the child's name. A single thread reads every pipe
+    without blocking as soon as there is anything to read, so a child never stalls on
+    a full pipe however much it writes. A child's output ends when it is marked as
+    finished (see `finish`), not when its pipe is closed, since processes forked
+    meanwhile may hold any pipe open.
+
+    In `live` mode, lines are written as soon as they are complete, interleaved with
+    those of the other children. In `grouped` mode, each child's output is written in
+    one piece once it finishes, and is kept in a temporary file rather than in memory
+    once it grows beyond `spill_size` bytes. """
+
+    def __init__(
+        self,
+        mode: str = 'live',
+        output: Optional[BinaryIO] = None,
+        spill_size: int = DEFAULT_OUTPUT_SPILL_SIZE,
+    ) -> None:
+        if mode not in OUTPUT_MODES:
+            raise ValueError(f'Unknown output mode `{mode}`; expected one of {OUTPUT_MODES}')
+        self._grouped = mode == 'grouped'
+        self._output = output or sys.stdout.buffer
+        self._spill_size = spill_size
+        self._dir = tempfile.mkdtemp(prefix='begin-output-')
+        self._channels: Dict[str, _Channel] = {}
+        self._added: 'SimpleQueue[_Channel]' = SimpleQueue()
+        self._finished: 'SimpleQueue[_Channel]' = SimpleQueue()
+        self._selector = selectors.DefaultSelector()
+        self._wake_reader, self._wake_writer = os.pipe()
+        _OPEN_FDS.update((self._wake_reader, self._wake_writer))
+        os.set_blocking(self._wake_reader, False)
+        self._selector.register(self._wake_reader, selectors.EVENT_READ)
+        self._closing = False
+        self._thread = threading.Thread(target=self._read, name='begin-output', daemon=True)
+
+    def add(self, name: str) -> str:
+        """ Starts reading the output of a child called `name`, and returns the path of
+        the pipe it should write to (see `redirect_output`). """
+        path = os.path.join(self._dir, str(len(self._channels)))
+        channel = self._channels[name] = _Channel(name, path, self._grouped, self._spill_size)
+        self._added.put(channel)
+        self._wake()
+        return path
+
+    def finish(self, name: str) -> None:
+        """ Marks the child called `name` as finished, and waits until everything it
+        wrote has been written out. Anything written to its pipe afterwards (e.g. by
+        subprocesses it left running) is lost. """
+        channel = self._channels[name]
+        self._finished.put(channel)
+        self._wake()
+        channel.done.wait()
+
+    def _wake(self) -> None:
+        os.write(self._wake_writer, b'\0')
+
+    def _register_added(self) -> None:
+        while True:
+            try:
+                channel = self._added.get_nowait()
+            except Empty:
+                return
+            self._selector.register(channel.fd, selectors.EVENT_READ, channel)
+
+    def _close_finished(self) -> None:
+        while True:
+            try:
+                channel = self._finished.get_nowait()
+            except Empty:
+                return
+            if not channel.done.is_set():
+                self._close_channel(channel)
+
+    def _read(self) -> None:
+        while not self._closing or any(not channel.done.is_set() for channel in list(self._channels.values())):
+            for key, _ in self._selector.select():
+                if key.data is not None:
+                    # The channel may have been closed by an earlier event of this batch
+                    if not key.data.done.is_set():
+                        self._read_channel(key.data)
+                    continue
+                try:
+                    os.read(self._wake_reader, _CHUNK_SIZE)
+                except BlockingIOError:
+                    pass
+                # Channels are registered first, since one may finish as soon as it is added
+                self._register_added()
+                self._close_finished()
+
+    def _read_channel(self, channel: _Channel) -> bool:
+        """ Reads what `channel` holds, if anything, and returns whether there was any. """
+        try:
+            data = os.read(channel.fd, _CHUNK_SIZE)
+        except BlockingIOError:
+            return False
+        self._write(channel, channel.lines(data))
+        return bool(data)
+
+    def _close_channel(self, channel: _Channel) -> None:
+        """ Writes out what is left of the output of a finished child, which has written
+        all of it to the pipe by now. """
+        while self._read_channel(channel):
+            pass
+        self._write(channel, channel.last_line())
+        self._selector.unregister(channel.fd)
+        if channel.group is not None:
+            channel.group.seek(0)
+            shutil.copyfileobj(channel.group, self._output)
+            self._output.flush()
+            channel.group.close()
+        channel.close()
+
+    def _write(self, channel: _Channel, lines: List[bytes]) -> None:
+        if not lines:
+            return
+        if channel.group is not None:
+            channel.group.writelines(lines)
+            return
+        self._output.writelines(lines)
+        self._output.flush()
+
+    def __enter__(self) -> 'OutputMultiplexer':
+        sys.stdout.flush()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info: object) -> None:
+        """ Writes out the output of every child, which must have finished. """
+        for name, channel in self._channels.items():
+            if not channel.done.is_set():
+                self.finish(name)
+        self._closing = True
+        self._wake()
+        self._thread.join()
+        self._selector.close()
+        _close(self._wake_reader)
+        _close(self._wake_writer)
+        shutil.rmtree(self._dir, ignore_errors=True)
@@ -1,11 +1,27 @@
-from argparse import ArgumentParser
+from argparse import (
+    ArgumentParser,
+    ArgumentTypeError,
+)
 from dataclasses import dataclass
 from typing import (
+    Any,
+    Callable,
     Dict,
     List,
+    Optional,
 )
 
-from begin.constants import DEFAULT_REGISTRY_NAME
+from begin.cli.discovery import DiscoveryOptions
+from begin.constants import (
+    COMPLETION_SHELLS,
+    DEFAULT_DISCOVERY_WORKERS,
+    DEFAULT_GLOBAL_DIR,
+    DEFAULT_OUTPUT_MODE,
+    DEFAULT_REGISTRY_NAME,
+    DEFAULT_TARGETS_EXTENSION,
+    OUTPUT_MODES,
+    RESULT_CACHE_ACTIONS,
+)
 
 
 class Request:
@@ -31,28 +47,196 @@ class Request:
     def options(self) -> Dict[str, str]:
         return self._options
 
+    @property
+    def identifier(self) -> str:
+        return f'{self._target_name}@{self._registry_namespace}'
+
+
+def _non_negative_int(arg: str) -> int:
+    value = int(arg)
+    if value < 0:
+        raise ArgumentTypeError(f'expected a non-negative integer, got {value}')
+    return value
+
+
+def _positive_int(arg: str) -> int:
+    value = int(arg)
+    if value < 1:
+        raise ArgumentTypeError(f'expected a positive integer, got {value}')
+    return value
+
 
 @dataclass
 class OptionalArg:
-    short: str
+    short: Optional[str]
     long: str
-    default: str
+    default: Any
     help: str
+    action: Optional[str] = None
+    type: Optional[Callable] = None
+    nargs: Optional[str] = None
+    const: Any = None
+    choices: Optional[List[str]] = None
+    metavar: Optional[str] = None
+
+    @property
+    def flags(self) -> List[str]:
+        return [flag for flag in (self.short, self.long) if flag is not None]
+
+    @property
+    def kwargs(self) -> Dict[str, Any]:
+        kwargs = {
+            'default': self.default,
+            'help': self.help,
+        }
+        for name in ('action', 'type', 'nargs', 'const', 'choices', 'metavar'):
+            value = getattr(self, name)
+            if value is not None:
+                kwargs[name] = value
+        return kwargs
 
 
 OPTIONAL_ARGS = [
         OptionalArg(
             short='-e',
             long='--extension',
-            default='*targets.py',  # TODO get this from settings
+            default=DEFAULT_TARGETS_EXTENSION,  # TODO get this from settings
             help='The suffix to match target file patterns against.',
         ),
         OptionalArg(
             short='-g',
             long='--global-dir',
-            default='~/.begin',  # TODO get this from settings
+            default=DEFAULT_GLOBAL_DIR,  # TODO get this from settings
             help='The location of the directory holding global targets files.',
         ),
+        OptionalArg(
+            short=None,
+            long='--no-cache',
+            default=False,
+            action='store_true',
+            help=(
+                'Neither read nor update the discovery index, nor the cached manifest of the '
+                'targets each targets file defines.'
+            ),
+        ),
+        OptionalArg(
+            short=None,
+            long='--rebuild-index',
+            default=False,
+            action='store_true',
+            help='Discard the discovery index and rebuild it from a full search.',
+        ),
+        OptionalArg(
+            short=None,
+            long='--nearest',
+            default=False,
+            action='store_true',
+            help=(
+                'Only load the targets files in the nearest directory which holds any, searching '
+                'upwards from the working directory as far as the project root.'
+            ),
+        ),
+        OptionalArg(
+            short=None,
+            long='--max-depth',
+            default=None,
+            type=_non_negative_int,
+            help=(
+                'The maximum number of directories to descend when searching for targets files. '
+                'Unlimited by default, or 0 when combined with --nearest.'
+            ),
+        ),
+        OptionalArg(
+            short=None,
+            long='--discovery-workers',
+            default=DEFAULT_DISCOVERY_WORKERS,
+            type=_positive_int,
+            help='The maximum number of threads used to search for targets files. 1 disables concurrency.',
+        ),
+        OptionalArg(
+            short='-l',
+            long='--list',
+            default=None,
+            nargs='?',
+            const='',
+            metavar='PATTERN',
+            help=(
+                'List the available targets and exit. PATTERN takes the form <prefix>@<namespace>, '
+                'where both parts are optional; e.g. `te`, `te@ci` or `@ci`.'
+            ),
+        ),
+        OptionalArg(
+            short=None,
+            long='--complete',
+            default=None,
+            metavar='WORD',
+            help='Print the targets which complete WORD, one per line, and exit. Used by shell completion.',
+        ),
+        OptionalArg(
+            short=None,
+            long='--completion',
+            default=None,
+            choices=list(COMPLETION_SHELLS),
+            help='Print a completion script for the given shell and exit.',
+        ),
+        OptionalArg(
+            short='-j',
+            long='--jobs',
+            default=None,
+            type=_positive_int,
+            metavar='N',
+            help=(
+                'Run the requested targets concurrently in up to N worker processes. Every target '
+                'runs to completion, and begin fails if any of them does.'
+            ),
+        ),
+        OptionalArg(
+            short=None,
+            long='--output',
+            default=DEFAULT_OUTPUT_MODE,
+            choices=list(OUTPUT_MODES),
+            help=(
+                'With -j, how the output of each target is shown, prefixed with the target: as it is '
+                'written (live), or in one piece once the target finishes (grouped).'
+            ),
+        ),
+        OptionalArg(
+            short='-B',
+            long='--force',
+            default=False,
+            action='store_true',
+            help='Execute targets which declare inputs even if they are up to date.',
+        ),
+        OptionalArg(
+            short='-w',
+            long='--watch',
+            default=False,
+            action='store_true',
+            help=(
+                'Run the requested targets, then keep running them again whenever a file below the '
+                'working directory changes, until interrupted.'
+            ),
+        ),
+        OptionalArg(
+            short=None,
+            long='--daemon',
+            default=False,
+            action='store_true',
+            help=(
+                'Keep the targets files of the working directory loaded, and serve commands run '
+                'with `begin-client` from it until interrupted.'
+            ),
+        ),
+        OptionalArg(
+            short=None,
+            long='--cache',
+            default=None,
+            choices=list(RESULT_CACHE_ACTIONS),
+            help=(
+                'Print statistics about the result cache, prune it to its size limit, or clear it, '
+                'and exit.'
+            ),
+        ),
     ]
 
 
@@ -61,6 +245,32 @@ class ParsedCommand:
     extension: str
     global_dir: str
     requests: List[Request]
+    use_cache: bool = True
+    rebuild_index: bool = False
+    nearest: bool = False
+    max_depth: Optional[int] = None
+    discovery_workers: int = DEFAULT_DISCOVERY_WORKERS
+    list_pattern: Optional[str] = None
+    complete: Optional[str] = None
+    completion_shell: Optional[str] = None
+    jobs: Optional[int] = None
+    output_mode: str = DEFAULT_OUTPUT_MODE
+    force: bool = False
+    cache_action: Optional[str] = None
+    watch: bool = False
+    daemon: bool = False
+
+    @property
+    def discovery_options(self) -> DiscoveryOptions:
+        return DiscoveryOptions(
+            extension=self.extension,
+            global_dir=self.global_dir,
+            use_cache=self.use_cache,
+            rebuild_index=self.rebuild_index,
+            nearest=self.nearest,
+            max_depth=self.max_depth,
+            workers=self.discovery_workers,
+        )
 
 
 def _parse_requests(args: List[str]) -> List[Request]:
@@ -74,7 +284,8 @@ def _parse_requests(args: List[str]) -> List[Request]:
             request = Request(arg)
         else:
             request.add_option(arg)
-    requests.append(request)
+    if request is not None:
+        requests.append(request)
     return requests
 
 
@@ -82,12 +293,7 @@ def parse_command():
     parser = ArgumentParser(description='A utility for running targets in a targets.py file.')
 
     for optional_arg in OPTIONAL_ARGS:
-        parser.add_argument(
-            optional_arg.short,
-            optional_arg.long,
-            default=optional_arg.default,
-            help=optional_arg.help,
-        )
+        parser.add_argument(*optional_arg.flags, **optional_arg.kwargs)
 
     optional_args, request_args = parser.parse_known_args()
     requests = _parse_requests(request_args)
@@ -95,4 +301,18 @@ def parse_command():
             extension=optional_args.extension,
             global_dir=optional_args.global_dir,
             requests=requests,
+            use_cache=not optional_args.no_cache,
+            rebuild_index=optional_args.rebuild_index,
+            nearest=optional_args.nearest,
+            max_depth=optional_args.max_depth,
+            discovery_workers=optional_args.discovery_workers,
+            list_pattern=optional_args.list,
+            complete=optional_args.complete,
+            completion_shell=optional_args.completion,
+            jobs=optional_args.jobs,
+            output_mode=optional_args.output,
+            force=optional_args.force,
+            cache_action=optional_args.cache,
+            watch=optional_args.watch,
+            daemon=optional_args.daemon,
         )
@@ -0,0 +1,290 @@
+import errno
+import logging
+import os
+import struct
+import sys
+import time
+from abc import (
+    ABC,
+    abstractmethod,
+)
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from begin.constants import (
+    DEFAULT_EXCLUDED_DIRS,
+    DEFAULT_WATCH_DEBOUNCE,
+    DEFAULT_WATCH_POLL_INTERVAL,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+def _is_excluded(name: str, excluded_dirs: Iterable[str]) -> bool:
+    return any(fnmatch(name, pattern) for pattern in excluded_dirs)
+
+
+def _walk_dirs(root: Path, excluded_dirs: Iterable[str]) -> Iterator[Path]:
+    """ `root`, and every directory below it which is not excluded. Symlinked
+    directories are not followed. """
+    for dir_path, dir_names, _ in os.walk(str(root)):
+        dir_names[:] = [name for name in dir_names if not _is_excluded(name, excluded_dirs)]
+        yield Path(dir_path)
+
+
+class Watcher(ABC):
+    """ Reports changes to the files below `roots`. After the first change, changes
+    are collected until none has been seen for `debounce` seconds, so that a burst of
+    changes (e.g. a `git checkout`, or an editor writing a swap file) is reported once. """
+
+    def __init__(
+        self,
+        roots: Iterable[Path],
+        excluded_dirs: Iterable[str] = DEFAULT_EXCLUDED_DIRS,
+        debounce: float = DEFAULT_WATCH_DEBOUNCE,
+    ) -> None:
+        self.roots = list(roots)
+        self.excluded_dirs = tuple(excluded_dirs)
+        self.debounce = debounce
+
+    @abstractmethod
+    def _read_changes(self, timeout: Optional[float]) -> Set[Path]:
+        """ The paths which changed within `timeout` seconds, or as soon as any change
+        if `timeout` is `None`. """
+
+    def wait_for_changes(self) -> Set[Path]:
+        changes: Set[Path] = set()
+        while not changes:
+            changes = self._read_changes(timeout=None)
+        while True:
+            more_changes = self._read_changes(timeout=self.debounce)
+            if not more_changes:
+                return changes
+            changes |= more_changes
+
+    def discard_changes(self) -> None:
+        """ Forgets changes which have not been reported yet, e.g. those made by the
+        targets themselves, which would otherwise trigger another run. """
+        while self._read_changes(timeout=0):
+            pass
+
+    def close(self) -> None:
+        pass
+
+
+class PollingWatcher(Watcher):
+    """ Compares the size and mtime of every file below the roots every `interval`
+    seconds. Used wherever inotify is not available. """
+
+    def __init__(
+        self,
+        roots: Iterable[Path],
+        excluded_dirs: Iterable[str] = DEFAULT_EXCLUDED_DIRS,
+        debounce: float = DEFAULT_WATCH_DEBOUNCE,
+        interval: float = DEFAULT_WATCH_POLL_INTERVAL,
+    ) -> None:
+        super().__init__(roots, excluded_dirs, debounce)
+        self.interval = interval
+        self._snapshot = self._take_snapshot()
+
+    def _take_snapshot(self) -> Dict[Path, Tuple[int, int]]:
+        """ Directories are included, so that creating an empty one is a change, as it is
+        for inotify. """
+        snapshot = {}
+        for root in self.roots:
+            for dir_path in _walk_dirs(root, self.excluded_dirs):
+                try:
+                    entries = list(os.scandir(str(dir_path)))
+                except OSError:
+                    continue
+                for entry in entries:
+                    try:
+                        if entry.is_dir(follow_symlinks=False) and _is_excluded(entry.name, self.excluded_dirs):
+                            continue
+                        stat_result = entry.stat()
+                    except OSError:
+                        continue
+                    snapshot[Path(entry.path)] = (stat_result.st_mtime_ns, stat_result.st_size)
+        return snapshot
+
+    def _diff(self) -> Set[Path]:
+        snapshot = self._take_snapshot()
+        changes = {
+            path for path in snapshot.keys() | self._snapshot.keys()
+            if snapshot.get(path) != self._snapshot.get(path)
+        }
+        self._snapshot = snapshot
+        return changes
+
+    def _read_changes(self, timeout: Optional[float]) -> Set[Path]:
+        if timeout is not None:
+            time.sleep(timeout)
+            return self._diff()
+        while True:
+            time.sleep(self.interval)
+            changes = self._diff()
+            if changes:
+                return changes
+
+
+# See inotify(7)
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF
+)
+_EVENT_HEADER = struct.Struct('iIII')
+
+
+class InotifyWatcher(Watcher):
+    """ Watches every directory below the roots with inotify, so that waiting for a
+    change costs nothing, however large the tree. Directories created later are
+    watched as they appear. Raises `OSError` if inotify is unavailable (e.g. not on
+    Linux), or if the watch limit is reached. """
+
+    def __init__(
+        self,
+        roots: Iterable[Path],
+        excluded_dirs: Iterable[str] = DEFAULT_EXCLUDED_DIRS,
+        debounce: float = DEFAULT_WATCH_DEBOUNCE,
+    ) -> None:
+        super().__init__(roots, excluded_dirs, debounce)
+        import ctypes
+        import ctypes.util
+
+        if not sys.platform.startswith('linux'):
+            raise OSError('inotify is only available on Linux')
+        self._libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        self._get_errno = ctypes.get_errno
+        self._fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(self._get_errno(), 'inotify_init1 failed')
+
+        self._dirs_by_descriptor: Dict[int, Path] = {}
+        try:
+            for root in self.roots:
+                self._add_watches(root)
+        except OSError:
+            self.close()
+            raise
+
+    def _add_watches(self, root: Path) -> None:
+        for dir_path in _walk_dirs(root, self.excluded_dirs):
+            descriptor = self._libc.inotify_add_watch(self._fd, os.fsencode(str(dir_path)), _WATCH_MASK)
+            if descriptor < 0:
+                error_number = self._get_errno()
+                # The directory may have been deleted since it was listed
+                if error_number == errno.ENOENT:
+                    continue
+                raise OSError(error_number, f'Could not watch {dir_path}')
+            self._dirs_by_descriptor[descriptor] = dir_path
+
+    def _parse(self, data: bytes) -> Iterator[Tuple[int, int, str]]:
+        offset = 0
+        while offset + _EVENT_HEADER.size <= len(data):
+            descriptor, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += _EVENT_HEADER.size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b'\0'))
+            offset += length
+            yield descriptor, mask, name
+
+    def _read_changes(self, timeout: Optional[float]) -> Set[Path]:
+        import select
+
+        readable, _, _ = select.select([self._fd], [], [], timeout)
+        if not readable:
+            return set()
+        try:
+            data = os.read(self._fd, 1 << 16)
+        except BlockingIOError:
+            return set()
+
+        changes = set()
+        for descriptor, mask, name in self._parse(data):
+            changes.update(self._handle_event(descriptor, mask, name))
+        return changes
+
+    def _handle_event(self, descriptor: int, mask: int, name: str) -> Set[Path]:
+        if mask & IN_Q_OVERFLOW:
+            # Events were dropped, so anything may have changed
+            return set(self.roots)
+        if mask & IN_IGNORED:
+            # The watch was removed, e.g. because its directory was deleted
+            self._dirs_by_descriptor.pop(descriptor, None)
+            return set()
+        dir_path = self._dirs_by_descriptor.get(descriptor)
+        if dir_path is None:
+            return set()
+
+        path = dir_path.joinpath(name) if name else dir_path
+        if mask & IN_ISDIR:
+            if _is_excluded(name, self.excluded_dirs):
+                return set()
+            if mask & (IN_CREATE | IN_MOVED_TO):
+                try:
+                    self._add_watches(path)
+                except OSError:
+                    logger.warning(f'Could not watch {path}', exc_info=True)
+        return {path}
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+def create_watcher(roots: Iterable[Path], excluded_dirs: Iterable[str] = DEFAULT_EXCLUDED_DIRS) -> Watcher:
+    """ An `InotifyWatcher` where possible, and a `PollingWatcher` otherwise. """
+    roots = list(roots)
+    try:
+        return InotifyWatcher(roots, excluded_dirs)
+    except (OSError, AttributeError) as ex:
+        logger.debug(f'Falling back to polling for changes: {ex}')
+        return PollingWatcher(roots, excluded_dirs)
+
+
+def purge_project_modules(roots: Iterable[Path], keep: Iterable[str] = ('begin',)) -> List[str]:
+    """ Removes the modules imported from below `roots` from `sys.modules`, so that the
+    next import (e.g. by pytest, while collecting tests) reads them from disk again.
+    Installed packages, such as the tools recipes wrap, stay imported, as do the
+    packages named in `keep` and their submodules. Returns the names of the modules
+    which were removed. """
+    roots = [str(root) for root in roots]
+    # A virtualenv may live inside the project
+    prefixes = {sys.prefix, sys.base_prefix, sys.exec_prefix}
+
+    removed = []
+    for name, module in list(sys.modules.items()):
+        if any(name == package or name.startswith(f'{package}.') for package in keep):
+            continue
+        module_path = getattr(module, '__file__', None)
+        if not module_path:
+            continue
+        if any(module_path.startswith(os.path.join(prefix, '')) for prefix in prefixes):
+            continue
+        if any(module_path.startswith(os.path.join(root, '')) for root in roots):
+            del sys.modules[name]
+            removed.append(name)
+    return removed
@@ -7,6 +7,81 @@ class ExitCodeEnum(Enum):
     SUCCESS = 0
     UNSPECIFIED_FAILURE = 1
     REGISTRY_NAME_COLLISION = 3
+    TARGET_FAILURE = 4
+    UNKNOWN_TARGET = 5
+    DEPENDENCY_CYCLE = 6
+    DAEMON_ERROR = 7
+    INVALID_OPTIONS = 8
 
 
 DEFAULT_REGISTRY_NAME = 'default'
+
+DEFAULT_TARGETS_EXTENSION = '*targets.py'
+DEFAULT_GLOBAL_DIR = '~/.begin'
+
+COMPLETION_SHELLS = ('bash', 'zsh', 'fish')
+
+RESULT_CACHE_ACTIONS = ('stats', 'prune', 'clear')
+
+# How the output of targets run concurrently with -j is shown: line by line as it is
+# written, or in one piece per target once it finishes
+OUTPUT_MODES = ('live', 'grouped')
+DEFAULT_OUTPUT_MODE = 'live'
+
+# In bytes: how much of a target's output grouped mode holds in memory, before moving it
+# to a temporary file
+DEFAULT_OUTPUT_SPILL_SIZE = 1024 * 1024
+
+# The maximum number of threads used to walk target directories
+DEFAULT_DISCOVERY_WORKERS = 8
+
+# In seconds: how long --watch waits for a burst of changes to end before re-running
+# targets, and how often it checks for changes where inotify is not available
+DEFAULT_WATCH_DEBOUNCE = 0.2
+DEFAULT_WATCH_POLL_INTERVAL = 0.5
+
+# The modules imported up front by the daemon and by recipe worker pools, so that each
+# command or recipe finds the tools warm. Modules which are not installed are skipped.
+WARM_MODULES = (
+    'begin.recipes',
+    'black',
+    'flake8.main.cli',
+    'isort.main',
+    'pytest',
+    'coverage.cmdline',
+    'pip._internal.cli.main',
+)
+
+# Directory names (fnmatch patterns) which are never descended into when
+# searching for targets files
+DEFAULT_EXCLUDED_DIRS = frozenset({
+    '.git',
+    '.hg',
+    '.svn',
+    '.tox',
+    '.nox',
+    '.venv',
+    'venv',
+    'node_modules',
+    '__pycache__',
+    '.mypy_cache',
+    '.pytest_cache',
+    'build',
+    'dist',
+    '*.egg-info',
+})
+
+# Files which configure the tools wrapped by recipes. A change to any of them invalidates
+# what incremental recipe runs recorded
+TOOL_CONFIG_FILES = ('setup.cfg', 'tox.ini', '.flake8', 'pyproject.toml', '.isort.cfg', '.editorconfig')
+
+# Entries whose presence marks a directory as the root of a project
+PROJECT_ROOT_MARKERS = ('.git', '.hg', 'pyproject.toml', 'setup.py', 'setup.cfg')
+
+# Files holding gitignore-style patterns which are honoured during discovery
+IGNORE_FILE_NAMES = ('.gitignore', '.beginignore')
+
+# The ignore files whose patterns apply to targets files as well as directories. Patterns
+# in a `.gitignore` only prune directories, since git-ignored targets files (e.g. personal
+# `local_targets.py` files) are still meant to be loaded.
+FILE_IGNORE_FILE_NAMES = ('.beginignore',)
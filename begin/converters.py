@@ -0,0 +1,162 @@
+from dataclasses import (
+    dataclass,
+    field,
+)
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+)
+
+
+_TRUE_STRINGS = frozenset({'yes', 'y', 'true', 't', '1', 'on'})
+_FALSE_STRINGS = frozenset({'no', 'n', 'false', 'f', '0', 'off'})
+
+
+def parse_bool(arg: str) -> bool:
+    """ Unlike `utils.str_to_bool`, rejects anything which is not clearly true or false,
+    so that a mistyped value is reported rather than taken to mean `True`. """
+    lowered = arg.lower()
+    if lowered in _TRUE_STRINGS:
+        return True
+    if lowered in _FALSE_STRINGS:
+        return False
+    raise ValueError(f'not a boolean: {arg}')
+
+
+# The converters options can be given, by the name recorded in an `OptionSchema`. Options
+# are strings on the command line, so `str` converts nothing
+CONVERTERS: Dict[str, Callable[[str], Any]] = {
+    'str': str,
+    'int': int,
+    'float': float,
+    'bool': parse_bool,
+    'path': Path,
+}
+
+# The annotations which select a converter, by name, as written in a targets file
+_ANNOTATION_CONVERTERS = {
+    'str': 'str',
+    'int': 'int',
+    'float': 'float',
+    'bool': 'bool',
+    'Path': 'path',
+    'PurePath': 'path',
+}
+
+
+def converter_for(annotation: Optional[str], default: Any = None) -> str:
+    """ The name of the converter for a parameter annotated with `annotation` (the name of
+    a type, e.g. `int`, `Optional[int]` or `int | None`), or if it has no annotation, whose
+    default is `default`. Options for other parameters are passed on as strings. """
+    if annotation is not None:
+        annotation = annotation.strip()
+        if annotation.startswith(('Optional[', 'typing.Optional[')) and annotation.endswith(']'):
+            annotation = annotation[annotation.index('[') + 1:-1].strip()
+        elif '|' in annotation:
+            # e.g. `int | None`
+            types = [part.strip() for part in annotation.split('|') if part.strip() != 'None']
+            annotation = types[0] if len(types) == 1 else ''
+        # e.g. `pathlib.Path`
+        return _ANNOTATION_CONVERTERS.get(annotation.rpartition('.')[2], 'str')
+    # bool is a subclass of int, so is checked first
+    for default_type, converter in ((bool, 'bool'), (int, 'int'), (float, 'float'), (Path, 'path')):
+        if isinstance(default, default_type):
+            return converter
+    return 'str'
+
+
+@dataclass
+class Parameter:
+    name: str
+    converter: str = 'str'
+    required: bool = False
+
+
+@dataclass
+class OptionSchema:
+    """ The options a target accepts, derived from its signature: one `Parameter` for each
+    parameter which can be passed by keyword, and whether any other option is accepted
+    too (through `**kwargs`). Options are checked and converted before the target is
+    called, so that a mistyped option fails a command before anything runs. """
+    parameters: List[Parameter] = field(default_factory=list)
+    accepts_any: bool = False
+
+    @classmethod
+    def from_function(cls, function: Callable) -> 'OptionSchema':
+        # inspect is slow to import, and only needed once a target is about to run
+        import inspect
+
+        schema = cls()
+        for parameter in inspect.signature(function).parameters.values():
+            if parameter.kind == parameter.VAR_KEYWORD:
+                schema.accepts_any = True
+            if parameter.kind not in (parameter.POSITIONAL_OR_KEYWORD, parameter.KEYWORD_ONLY):
+                continue
+            required = parameter.default is parameter.empty
+            schema.parameters.append(Parameter(
+                name=parameter.name,
+                converter=converter_for(
+                    None if parameter.annotation is parameter.empty else _annotation_name(parameter.annotation),
+                    None if required else parameter.default,
+                ),
+                required=required,
+            ))
+        return schema
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'OptionSchema':
+        return cls(
+            parameters=[Parameter(**parameter) for parameter in data['parameters']],
+            accepts_any=data['accepts_any'],
+        )
+
+    def _parameter(self, name: str) -> Optional[Parameter]:
+        return next((parameter for parameter in self.parameters if parameter.name == name), None)
+
+    def problems(self, options: Mapping[str, Any]) -> List[str]:
+        """ Everything wrong with calling the target with `options`, as messages. """
+        problems = []
+        for parameter in self.parameters:
+            if parameter.required and parameter.name not in options:
+                problems.append(f'missing required option `{parameter.name}`')
+
+        for name, value in options.items():
+            parameter = self._parameter(name)
+            if parameter is None:
+                if not self.accepts_any:
+                    expected = ', '.join(known.name for known in self.parameters) or 'none'
+                    problems.append(f'unknown option `{name}` (expected: {expected})')
+                continue
+            if not isinstance(value, str):
+                continue
+            try:
+                CONVERTERS[parameter.converter](value)
+            except ValueError:
+                problems.append(f'option `{name}` expects {parameter.converter}, got `{value}`')
+        return problems
+
+    def convert(self, options: Mapping[str, Any]) -> Dict[str, Any]:
+        """ `options`, with each string converted for the parameter it is passed to. Values
+        which are not strings (e.g. from a target calling another) are passed as they are.
+        Assumes `options` has no `problems`. """
+        converted = dict(options)
+        for name, value in options.items():
+            parameter = self._parameter(name)
+            if parameter is not None and isinstance(value, str):
+                converted[name] = CONVERTERS[parameter.converter](value)
+        return converted
+
+
+def _annotation_name(annotation: Any) -> str:
+    """ A live annotation as it would be written, e.g. `typing.Optional[int]`. """
+    if isinstance(annotation, str):
+        # A postponed (`from __future__ import annotations`) or quoted annotation
+        return annotation
+    if isinstance(annotation, type):
+        return annotation.__name__
+    return str(annotation)
@@ -0,0 +1,108 @@
+import logging
+import os
+import shutil
+import sys
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Tuple,
+)
+
+from begin.cache import (
+    get_cache_dir,
+    make_cache_key,
+    read_json,
+    write_json,
+)
+
+
+logger = logging.getLogger(__name__)
+
+# Given the resolved path of a tool's console script, returns the directories to add to
+# `sys.path` so that the tool's package (and any dependencies it vendors) is importable
+SysPathLocator = Callable[[Path], List[Path]]
+
+VERSION = 1
+
+_locations: Dict[Tuple[str, ...], List[str]] = {}
+
+
+def _environment_key(tool: str) -> Tuple[str, ...]:
+    """ Where a tool is found depends on `PATH`, and whether it can be imported on
+    the interpreter. """
+    return (tool, os.environ.get('PATH', ''), sys.executable, sys.version)
+
+
+def _get_record_path(tool: str) -> Path:
+    key = make_cache_key(VERSION, *_environment_key(tool))
+    return get_cache_dir().joinpath('entrypoints', f'{key}.json')
+
+
+def _stat_script(script: str) -> Optional[Tuple[int, int]]:
+    try:
+        stat_result = os.stat(script)
+    except OSError:
+        return None
+    return stat_result.st_mtime_ns, stat_result.st_size
+
+
+def _is_valid(record: Any) -> bool:
+    """ A record stays valid while its script is unchanged (e.g. not reinstalled) and
+    every directory it adds to `sys.path` still exists. Costs a few `stat` calls. """
+    if not isinstance(record, dict) or record.get('version') != VERSION:
+        return False
+    if _stat_script(record['script']) != tuple(record['script_stat']):
+        return False
+    return all(os.path.isdir(path) for path in record['sys_path'])
+
+
+def _discover(tool: str, locator: SysPathLocator) -> Optional[Dict[str, Any]]:
+    script = shutil.which(tool)
+    if script is None:
+        return None
+    resolved_script = str(Path(script).resolve())
+    script_stat = _stat_script(resolved_script)
+    if script_stat is None:
+        return None
+    return {
+        'version': VERSION,
+        'script': resolved_script,
+        'script_stat': list(script_stat),
+        'sys_path': [str(path) for path in locator(Path(resolved_script))],
+    }
+
+
+def locate_global_install(tool: str, locator: SysPathLocator) -> Optional[List[str]]:
+    """ The `sys.path` entries which make a globally installed `tool` importable, or
+    `None` if `tool` is not on `PATH`. The console script is looked up on `PATH` (without
+    spawning a process) once, and the result is kept for the rest of the process, and
+    in the cache for later ones, until `PATH`, the interpreter or the script changes.
+    Failures are not recorded, so installing the tool takes effect immediately. """
+    environment_key = _environment_key(tool)
+    if environment_key in _locations:
+        return _locations[environment_key]
+
+    record_path = _get_record_path(tool)
+    record = read_json(record_path)
+    if not _is_valid(record):
+        record = _discover(tool, locator)
+        if record is None:
+            logger.info(f'Could not find `{tool}` on PATH')
+            return None
+        write_json(record_path, record)
+
+    _locations[environment_key] = record['sys_path']
+    return record['sys_path']
+
+
+def extend_sys_path(paths: Iterable[str]) -> None:
+    """ Appends each of `paths` which is not already on `sys.path`, so that resolving
+    an entry point repeatedly does not grow it. """
+    for path in paths:
+        if path not in sys.path:
+            sys.path.append(path)
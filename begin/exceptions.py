@@ -2,6 +2,9 @@ from pathlib import Path
 from typing import (
     List,
     Mapping,
+    Optional,
+    Sequence,
+    Tuple,
 )
 
 from begin.constants import ExitCodeEnum
@@ -51,6 +54,7 @@ class RegistryNameCollisionError(BeginError):
         for values. The paths in the list point to files where the namespace was defined.
         The length of each list is assumed to be greater than 1 (otherwise there is no
         namespace collision. """
+        self.colliding_namespaces = dict(colliding_namespaces)
         lines = []
         for name, paths in colliding_namespaces.items():
             lines.append(f'Found multiple registries with name `{name}` in files:')
@@ -58,3 +62,60 @@ class RegistryNameCollisionError(BeginError):
                 lines.append(f'\t{path}')
         message = '\n'.join(lines)
         super().__init__(message)
+
+
+class TargetFailureError(BeginError):
+
+    _exit_code_enum = ExitCodeEnum.TARGET_FAILURE
+
+    def __init__(self, failures: Sequence[Tuple[str, int]]) -> None:
+        """ `failures` holds the identifier of each target which failed, along with
+        the exit code it failed with. """
+        lines = ['The following targets failed:']
+        for target_identifier, exit_code in failures:
+            lines.append(f'\t{target_identifier} (exit code {exit_code})')
+        message = '\n'.join(lines)
+        super().__init__(message)
+
+
+class UnknownTargetError(BeginError):
+
+    _exit_code_enum = ExitCodeEnum.UNKNOWN_TARGET
+
+    def __init__(self, target_identifier: str, required_by: Optional[str] = None) -> None:
+        """ `required_by` is the identifier of the target which declared a dependency
+        on the unknown target, if it was not requested directly. """
+        message = f'Could not find target `{target_identifier}`'
+        if required_by is not None:
+            message += f', which is a dependency of `{required_by}`'
+        super().__init__(message)
+
+
+class DependencyCycleError(BeginError):
+
+    _exit_code_enum = ExitCodeEnum.DEPENDENCY_CYCLE
+
+    def __init__(self, cycle: Sequence[str]) -> None:
+        """ `cycle` holds the identifiers of the targets in the cycle, in dependency
+        order, with the first target repeated at the end. """
+        message = f'Found a dependency cycle: {" -> ".join(cycle)}'
+        super().__init__(message)
+
+
+class InvalidOptionsError(BeginError):
+
+    _exit_code_enum = ExitCodeEnum.INVALID_OPTIONS
+
+    def __init__(self, problems: Sequence[Tuple[str, str]]) -> None:
+        """ `problems` holds the identifier of each target whose options are invalid,
+        along with what is wrong with them. """
+        lines = ['Found invalid options:']
+        for target_identifier, problem in problems:
+            lines.append(f'\t{target_identifier}: {problem}')
+        message = '\n'.join(lines)
+        super().__init__(message)
+
+
+class DaemonError(BeginError):
+
+    _exit_code_enum = ExitCodeEnum.DAEMON_ERROR
@@ -0,0 +1,214 @@
+import hashlib
+import logging
+import os
+import subprocess
+from fnmatch import fnmatch
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Set,
+)
+
+from begin.cache import (
+    get_cache_dir,
+    make_cache_key,
+    read_json,
+    write_json,
+)
+from begin.cli.discovery import (
+    IgnoreRules,
+    is_ignored,
+    parse_ignore_file,
+)
+from begin.constants import (
+    DEFAULT_EXCLUDED_DIRS,
+    IGNORE_FILE_NAMES,
+    TOOL_CONFIG_FILES,
+)
+from begin.stamps import (
+    Fingerprint,
+    fingerprint,
+)
+from begin.utils import exit_status
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PATTERNS = ('**/*.py',)
+
+
+def _matches(relative_path: str, patterns: Iterable[str]) -> bool:
+    """ Patterns are matched with `fnmatch`, where `*` also matches `/`. A leading `**/`
+    matches any number of directories, including none. """
+    for pattern in patterns:
+        if fnmatch(relative_path, pattern):
+            return True
+        if pattern.startswith('**/') and fnmatch(relative_path, pattern[3:]):
+            return True
+    return False
+
+
+def find_candidates(
+    patterns: Sequence[str] = DEFAULT_PATTERNS,
+    root: Optional[Path] = None,
+    excluded_dirs: Iterable[str] = DEFAULT_EXCLUDED_DIRS,
+) -> List[str]:
+    """ The sorted paths, relative to `root`, of the files below it matching `patterns`.
+    Excluded directories (e.g. `.git` and virtualenvs) are never descended into. As in
+    discovery, paths matched by a `.gitignore` or `.beginignore` below `root` are skipped,
+    but here the patterns of both apply to files, since the tools would skip them too
+    when run on the whole tree. """
+    root = root or Path.cwd()
+    excluded_dirs = tuple(excluded_dirs)
+    inherited_rules: Dict[str, IgnoreRules] = {}
+    candidates = []
+    for dir_path, dir_names, file_names in os.walk(str(root)):
+        rules = list(inherited_rules.pop(dir_path, ()))
+        for file_name in sorted(file_names):
+            if file_name in IGNORE_FILE_NAMES:
+                rules.extend(parse_ignore_file(os.path.join(dir_path, file_name), applies_to_files=True))
+
+        dir_names[:] = [
+            name for name in dir_names
+            if not any(fnmatch(name, p) for p in excluded_dirs)
+            and not is_ignored(rules, os.path.join(dir_path, name), is_dir=True)
+        ]
+        for name in dir_names:
+            inherited_rules[os.path.join(dir_path, name)] = tuple(rules)
+
+        relative_dir = os.path.relpath(dir_path, str(root))
+        for file_name in file_names:
+            if is_ignored(rules, os.path.join(dir_path, file_name), is_dir=False):
+                continue
+            relative_path = file_name if relative_dir == os.curdir else os.path.join(relative_dir, file_name)
+            if _matches(relative_path.replace(os.sep, '/'), patterns):
+                candidates.append(relative_path)
+    return sorted(candidates)
+
+
+def _config_digest(root: Path, config_files: Iterable[str]) -> str:
+    digest = hashlib.sha256()
+    for name in config_files:
+        try:
+            content = root.joinpath(name).read_bytes()
+        except OSError:
+            continue
+        digest.update(name.encode() + b'\0' + content + b'\0')
+    return digest.hexdigest()
+
+
+class SuccessRecord:
+    """ The content of the files a tool last succeeded on. Records are kept per tool,
+    version, arguments, patterns and working directory, and are forgotten whenever a
+    tool configuration file changes. """
+
+    VERSION = 1
+
+    def __init__(
+        self,
+        tool: str,
+        args: Sequence[str],
+        patterns: Sequence[str],
+        root: Path,
+        tool_version: Optional[str] = None,
+        config_files: Iterable[str] = TOOL_CONFIG_FILES,
+    ) -> None:
+        self._root = root
+        key = make_cache_key(
+            self.VERSION,
+            tool,
+            tool_version,
+            list(args),
+            list(patterns),
+            str(root),
+            _config_digest(root, config_files),
+        )
+        self.path = get_cache_dir().joinpath('incremental', f'{key}.json')
+
+    def _absolute(self, paths: Iterable[str]) -> List[str]:
+        return [str(self._root.joinpath(path)) for path in paths]
+
+    def changed(self, candidates: Sequence[str]) -> List[str]:
+        """ The candidates which are new, or whose content changed, since the last success. """
+        recorded = read_json(self.path)
+        if not isinstance(recorded, dict):
+            return list(candidates)
+        paths = self._absolute(candidates)
+        current = fingerprint(paths, recorded)
+        return [
+            candidate for candidate, path in zip(candidates, paths)
+            if path not in current or current[path]['sha256'] != recorded.get(path, {}).get('sha256')
+        ]
+
+    def record(self, candidates: Sequence[str]) -> None:
+        """ Called after the tool succeeded. Every candidate is recorded, not only those it
+        ran on, since the others were unchanged since it last succeeded. The files are
+        hashed after the run, so that those a formatter rewrote are not run again. """
+        recorded = read_json(self.path)
+        previous: Fingerprint = recorded if isinstance(recorded, dict) else {}
+        write_json(self.path, fingerprint(self._absolute(candidates), previous))
+
+
+def changed_since_ref(ref: str, candidates: Sequence[str], root: Path) -> List[str]:
+    """ The candidates which differ from `ref` in git, including uncommitted and untracked
+    changes. Raises `subprocess.CalledProcessError` if git fails, e.g. for an unknown ref. """
+    def git(*args: str) -> Set[str]:
+        completed = subprocess.run(
+            ['git', *args],
+            cwd=str(root),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            check=True,
+        )
+        return {os.path.normpath(line) for line in completed.stdout.decode().splitlines() if line}
+
+    # Paths are relative to the working directory, like the candidates
+    changed = git('diff', '--name-only', '--relative', '--diff-filter=ACMR', ref)
+    changed |= git('ls-files', '--others', '--exclude-standard')
+    return [candidate for candidate in candidates if os.path.normpath(candidate) in changed]
+
+
+def run_on_changed_files(
+    tool: str,
+    run: Callable[[List[str]], Any],
+    args: Sequence[str],
+    patterns: Sequence[str] = DEFAULT_PATTERNS,
+    since: Optional[str] = None,
+    tool_version: Optional[str] = None,
+) -> int:
+    """ Calls `run` with the files matching `patterns` which changed since `tool` last
+    succeeded with `args` (or since the git ref `since`), and returns its exit status.
+    `run` may return or exit. The tool is not run at all if nothing changed. """
+    root = Path.cwd()
+    candidates = find_candidates(patterns, root)
+    record = SuccessRecord(tool, args, patterns, root, tool_version)
+    if since is not None:
+        try:
+            changed = changed_since_ref(since, candidates, root)
+        except (OSError, subprocess.CalledProcessError) as ex:
+            stderr = getattr(ex, 'stderr', None)
+            logger.error(f'Could not list the files changed since {since}: {stderr.decode().strip() if stderr else ex}')
+            return 1
+        description = f'since {since}'
+    else:
+        changed = record.changed(candidates)
+        description = 'since it last succeeded'
+
+    if not changed:
+        logger.info(f'No files changed {description}; skipping {tool}')
+        return 0
+    logger.info(f'Running {tool} on {len(changed)} of {len(candidates)} files, which changed {description}')
+
+    try:
+        status = exit_status(run(changed))
+    except SystemExit as ex:
+        status = exit_status(ex.code)
+    if status == 0 and since is None:
+        record.record(candidates)
+    return status
@@ -0,0 +1,73 @@
+""" A pytest plugin, loaded into the processes `begin.sharding` starts with
+`-p begin_pytest_shard`. It is imported from its own directory rather than as part
+of `begin`, so that `begin` is not imported before coverage measurement starts.
+
+The JSON file named by `$BEGIN_PYTEST_SHARD_FILE` says what to do:
+    {"mode": "collect", "output": <path>}
+        writes the node ids of the collected (and not deselected) tests to `output`.
+    {"mode": "run", "node_ids": [...], "output": <path>}
+        deselects every test not in `node_ids`, and writes the duration of each test
+        which ran, along with the outcome counts and failed node ids, to `output`.
+"""
+import json
+import os
+
+
+SHARD_FILE_ENV_VAR = 'BEGIN_PYTEST_SHARD_FILE'
+
+_spec = None
+_durations = {}
+_outcomes = {}
+_failed = []
+
+
+def _load_spec():
+    global _spec
+    if _spec is None:
+        path = os.environ.get(SHARD_FILE_ENV_VAR)
+        if not path:
+            _spec = {}
+        else:
+            with open(path, encoding='utf-8') as spec_file:
+                _spec = json.load(spec_file)
+    return _spec
+
+
+def _write(data):
+    with open(_load_spec()['output'], 'w', encoding='utf-8') as output_file:
+        json.dump(data, output_file)
+
+
+def pytest_collection_modifyitems(session, config, items):
+    spec = _load_spec()
+    if spec.get('mode') != 'run':
+        return
+    selected = set(spec['node_ids'])
+    deselected = [item for item in items if item.nodeid not in selected]
+    items[:] = [item for item in items if item.nodeid in selected]
+    if deselected:
+        config.hook.pytest_deselected(items=deselected)
+
+
+def pytest_collection_finish(session):
+    if _load_spec().get('mode') == 'collect':
+        _write([item.nodeid for item in session.items])
+
+
+def pytest_runtest_logreport(report):
+    if _load_spec().get('mode') != 'run':
+        return
+    _durations[report.nodeid] = _durations.get(report.nodeid, 0.0) + report.duration
+    if report.when == 'call' or report.outcome != 'passed':
+        if report.when != 'call' and report.outcome == 'failed':
+            outcome = 'error'
+        else:
+            outcome = report.outcome
+        _outcomes[outcome] = _outcomes.get(outcome, 0) + 1
+        if outcome in ('failed', 'error'):
+            _failed.append(report.nodeid)
+
+
+def pytest_sessionfinish(session, exitstatus):
+    if _load_spec().get('mode') == 'run':
+        _write({'durations': _durations, 'outcomes': _outcomes, 'failed': _failed})
@@ -1,14 +1,36 @@
 import logging
-import subprocess
+import os
 import sys
+import time
+from contextlib import (
+    ExitStack,
+    redirect_stderr,
+    redirect_stdout,
+)
+from dataclasses import dataclass
+from concurrent.futures import as_completed
 from pathlib import Path
 from typing import (
+    Any,
     Callable,
+    Dict,
+    Iterable,
+    List,
+    NoReturn,
     Optional,
+    Sequence,
+    Tuple,
 )
 
+from begin.entrypoints import (
+    extend_sys_path,
+    locate_global_install,
+)
 from begin.utils import (
+    exit_status,
     patched_argv_context,
+    read_text_buffer,
+    text_buffer,
     with_exit,
 )
 
@@ -16,12 +38,42 @@ from begin.utils import (
 logger = logging.getLogger(__name__)
 
 
+def _run_on_changed_files(
+    tool: str,
+    run: Callable[..., int],
+    args: Sequence[str],
+    since: Optional[str],
+    tool_version: Optional[str],
+) -> int:
+    """ Runs a linter or formatter on the Python files below the working directory which
+    changed since it last succeeded with the same arguments, version and configuration
+    (`changed_only`), or which differ from the git ref `since`, rather than on the whole
+    tree. `args` must then only hold options, not paths. """
+    from begin.incremental import run_on_changed_files
+
+    return run_on_changed_files(tool, lambda paths: run(*paths), args, since=since, tool_version=tool_version)
+
+
 @with_exit
-def black(*args: str) -> int:
+def black(*args: str, changed_only: bool = False, since: Optional[str] = None) -> int:
+    """ With `changed_only` or `since`, see `_run_on_changed_files`. """
+    import black as _black
     from black import patched_main as _black_main
 
-    with patched_argv_context('black', *args):
-        return _black_main()
+    def _run(*paths: str) -> int:
+        with patched_argv_context('black', *args, *paths):
+            return _black_main()
+
+    if changed_only or since is not None:
+        # Files passed explicitly are only checked against black's own excludes with --force-exclude
+        return _run_on_changed_files(
+            'black',
+            lambda *paths: _run('--force-exclude', *paths),
+            args,
+            since,
+            getattr(_black, '__version__', None),
+        )
+    return _run()
 
 
 @with_exit
@@ -43,19 +95,35 @@ def coverage(*args: str) -> int:
 
 
 @with_exit
-def flake8(*args: str) -> int:
+def flake8(*args: str, changed_only: bool = False, since: Optional[str] = None) -> int:
+    """ With `changed_only` or `since`, see `_run_on_changed_files`. """
+    import flake8 as _flake8
     from flake8.main.cli import main as _flake8_main
 
-    # flake8.main.cli.main expects a list of strings
-    args_list = list(args)
+    def _run(*paths: str) -> int:
+        # flake8.main.cli.main expects a list of strings
+        return _flake8_main([*args, *paths])
 
-    return _flake8_main(args_list)
+    if changed_only or since is not None:
+        return _run_on_changed_files('flake8', _run, args, since, getattr(_flake8, '__version__', None))
+    return _run()
 
 
 @with_exit
-def isort(*args: str) -> int:
+def isort(*args: str, changed_only: bool = False, since: Optional[str] = None) -> int:
+    """ With `changed_only` or `since`, see `_run_on_changed_files`. """
+    import isort as _isort
     from isort.main import main
 
+    if changed_only or since is not None:
+        return _run_on_changed_files(
+            'isort',
+            # Files passed explicitly are only checked against isort's own skips with --filter-files
+            lambda *paths: main((*args, '--filter-files', *paths)),
+            args,
+            since,
+            getattr(_isort, '__version__', None),
+        )
     return main(args)
 
 
@@ -82,35 +150,32 @@ def _get_local_poetry_entrypoint() -> Optional[PoetryMainType]:
         return None
 
 
-def _get_global_poetry_entrypoint() -> Optional[PoetryMainType]:
-    """ Try a global import of `poetry.console.main`. This will work if the
-    user followed the (recommended) global `poetry` install method with
-    get-poetry.py. It looks up the location of the `poetry` script, and then
-    adds the package and vendored dependencies to `sys.path`. """
-
-    # Find the location of the script which is executed when running
-    # `poetry ...` from the console.
-    which_poetry = subprocess.run(['which', 'poetry'], capture_output=True)
-    return_code = which_poetry.returncode
-    std_out = which_poetry.stdout.decode().strip()
-    std_err = which_poetry.stderr.decode().strip()
-
-    # Something went wrong with the lookup
-    if return_code != 0:
-        logger.info(std_out)
-        logger.error(std_err)
-        return None
-
-    poetry_path = Path(std_out).resolve()
-    lib = poetry_path.joinpath('../../lib').resolve()
+def _get_poetry_sys_path(poetry_script: Path) -> List[Path]:
+    """ The (recommended) global install with get-poetry.py keeps the package, and the
+    dependencies it vendors for each Python version, relative to the `poetry` script. """
+    lib = poetry_script.joinpath('../../lib').resolve()
     vendors = lib.joinpath('poetry/_vendor')
     major, minor = sys.version_info[:2]
     current_vendors = vendors.joinpath(f'py{major}.{minor}')
+    return [lib, current_vendors]
 
-    sys.path.append(str(lib))
-    sys.path.append(str(current_vendors))
 
-    from poetry.console import main
+def _get_global_poetry_entrypoint() -> Optional[PoetryMainType]:
+    """ Try a global import of `poetry.console.main`. This will work if the
+    user followed the (recommended) global `poetry` install method with
+    get-poetry.py. The location of the `poetry` script, and from it the
+    package and vendored dependencies, is resolved once and cached (see
+    `begin.entrypoints`), and added to `sys.path`. """
+    poetry_sys_path = locate_global_install('poetry', _get_poetry_sys_path)
+    if poetry_sys_path is None:
+        return None
+    extend_sys_path(poetry_sys_path)
+
+    try:
+        from poetry.console import main
+    except ModuleNotFoundError:
+        logger.error('Found the `poetry` script, but could not import poetry from beside it')
+        return None
     return main
 
 
@@ -133,3 +198,137 @@ def pytest(*args: str) -> int:
     args_list = list(args)
 
     return _pytest_main(args_list)
+
+
+@with_exit
+def pytest_sharded(*args: str, shards: Optional[int] = None) -> int:
+    """ Like `pytest`, but splits the tests across `shards` processes (one per CPU by
+    default), balanced by the durations of previous runs. See `begin.sharding`. """
+    from begin.sharding import run_sharded
+
+    return run_sharded(args, shards or os.cpu_count() or 1)
+
+
+@dataclass
+class RecipeResult:
+    """ The outcome of a recipe called with `run`. `stdout` and `stderr` are only
+    recorded when output was captured. """
+    name: str
+    args: Tuple[str, ...]
+    exit_code: int
+    duration: float
+    stdout: Optional[str] = None
+    stderr: Optional[str] = None
+
+    @property
+    def succeeded(self) -> bool:
+        return self.exit_code == 0
+
+    def check(self) -> None:
+        """ Exits with the recipe's exit code if it failed, as the recipe itself would have. """
+        if not self.succeeded:
+            sys.exit(self.exit_code)
+
+
+def run(recipe: Callable[..., NoReturn], *args: str, capture_output: bool = False, **kwargs: Any) -> RecipeResult:
+    """ Calls `recipe` (e.g. `recipes.flake8`) with `args`, and returns its result instead
+    of exiting, so that a target can run several recipes in one process and decide what
+    to do about their failures. With `capture_output`, what the tool writes to
+    `sys.stdout` and `sys.stderr` is recorded in the result instead of printed; output
+    written straight to the file descriptors (e.g. by a subprocess) is not captured.
+    Exceptions other than `SystemExit`, such as a missing tool, are raised as usual.
+    `kwargs` are passed to the recipe, e.g. `changed_only=True`. """
+    fn = getattr(recipe, 'without_exit', recipe)
+    stdout, stderr = text_buffer(), text_buffer()
+
+    start = time.perf_counter()
+    with ExitStack() as stack:
+        if capture_output:
+            stack.enter_context(redirect_stdout(stdout))
+            stack.enter_context(redirect_stderr(stderr))
+        try:
+            code = fn(*args, **kwargs)
+        except SystemExit as ex:
+            # Many tools exit, rather than returning, even from their Python entry points
+            code = ex.code
+        exit_code = exit_status(code)
+    duration = time.perf_counter() - start
+
+    return RecipeResult(
+        name=getattr(recipe, '__name__', repr(recipe)),
+        args=args,
+        exit_code=exit_code,
+        duration=duration,
+        stdout=read_text_buffer(stdout) if capture_output else None,
+        stderr=read_text_buffer(stderr) if capture_output else None,
+    )
+
+
+def check_results(results: Iterable[RecipeResult]) -> None:
+    """ Logs each of `results` which failed, then exits with the exit code of the first
+    of them, if any. """
+    failures = [result for result in results if not result.succeeded]
+    for result in failures:
+        logger.error(f'{result.name} failed with exit code {result.exit_code} after {result.duration:.2f}s')
+    if failures:
+        sys.exit(failures[0].exit_code)
+
+
+# The checks run by `lint`: each tool's recipe, and the options which make it report
+# problems rather than fix them
+LINT_CHECKS: Dict[str, Tuple[Callable[..., NoReturn], Tuple[str, ...]]] = {
+    'flake8': (flake8, ()),
+    'black': (black, ('--check',)),
+    'isort': (isort, ('--check-only',)),
+}
+
+
+@with_exit
+def lint(
+    *paths: str,
+    tools: Sequence[str] = tuple(LINT_CHECKS),
+    changed_only: bool = False,
+    since: Optional[str] = None,
+) -> int:
+    """ Runs the checks of `tools` (by default flake8, `black --check` and `isort
+    --check-only`) on `paths` (the working directory by default) concurrently, each in a
+    separate process (see `begin.workers.RecipePool`), so that the suite takes as long as
+    the slowest tool rather than the sum of all of them. Each tool's output is buffered,
+    and printed in one piece under a header once that tool finishes. Exits with the exit
+    code of the first of `tools` which failed. `changed_only` and `since` are passed to
+    every tool, in which case `paths` must be empty; see `_run_on_changed_files`. """
+    from begin.workers import RecipePool
+
+    unknown = [tool for tool in tools if tool not in LINT_CHECKS]
+    if unknown:
+        raise ValueError(f'Unknown lint tools {unknown}; expected some of {list(LINT_CHECKS)}')
+    incremental = changed_only or since is not None
+    if incremental and paths:
+        raise ValueError('Paths cannot be given with `changed_only` or `since`')
+    if not incremental:
+        paths = paths or (os.curdir,)
+        kwargs: Dict[str, Any] = {}
+    else:
+        kwargs = {'changed_only': changed_only, 'since': since}
+
+    results: Dict[str, RecipeResult] = {}
+    with RecipePool(max_workers=len(tools)) as pool:
+        futures = {}
+        for tool in tools:
+            recipe, options = LINT_CHECKS[tool]
+            futures[pool.submit(recipe, *options, *paths, capture_output=True, **kwargs)] = tool
+        for future in as_completed(futures):
+            result = results[futures[future]] = future.result()
+            _print_lint_result(futures[future], result)
+
+    failures = [results[tool] for tool in tools if not results[tool].succeeded]
+    return failures[0].exit_code if failures else 0
+
+
+def _print_lint_result(tool: str, result: RecipeResult) -> None:
+    outcome = 'passed' if result.succeeded else f'failed with exit code {result.exit_code}'
+    print(f'==== {tool} {outcome} in {result.duration:.2f}s ====', flush=True)
+    sys.stdout.write(result.stdout or '')
+    sys.stdout.flush()
+    sys.stderr.write(result.stderr or '')
+    sys.stderr.flush()
@@ -1,34 +1,92 @@
-import inspect
 import logging
+import sys
 from collections import defaultdict
-from dataclasses import dataclass
 from pathlib import Path
 from typing import (
+    Any,
     Callable,
     Dict,
+    Iterable,
+    Iterator,
     List,
+    Mapping,
     Optional,
+    Sequence,
     Set,
+    Tuple,
+    Union,
 )
 
 from begin.constants import DEFAULT_REGISTRY_NAME
-from begin.exceptions import RegistryNameCollisionError
+from begin.converters import OptionSchema
+from begin.exceptions import (
+    DependencyCycleError,
+    InvalidOptionsError,
+    RegistryNameCollisionError,
+    UnknownTargetError,
+)
 
 
 logger = logging.getLogger(__name__)
 
 
-@dataclass
 class TargetOptions:
-    name_override: Optional[str] = None
+
+    __slots__ = ('name_override', 'depends_on', 'inputs', 'outputs', 'cache')
+
+    def __init__(
+        self,
+        name_override: Optional[str] = None,
+        depends_on: Optional[Union[str, Sequence[str]]] = None,
+        inputs: Optional[Union[str, Sequence[str]]] = None,
+        outputs: Optional[Union[str, Sequence[str]]] = None,
+        cache: bool = False,
+    ) -> None:
+        self.name_override = name_override
+        self.depends_on = self._as_tuple(depends_on)
+        self.inputs = self._as_tuple(inputs)
+        self.outputs = self._as_tuple(outputs)
+        if cache and not self.inputs:
+            raise ValueError('Only targets which declare their inputs can be cached')
+        self.cache = cache
+
+    @staticmethod
+    def _as_tuple(value: Optional[Union[str, Sequence[str]]]) -> Tuple[str, ...]:
+        if isinstance(value, str):
+            return (value,)
+        return tuple(value or ())
+
+
+def split_target_identifier(identifier: str, default_namespace: str = DEFAULT_REGISTRY_NAME) -> Tuple[str, str]:
+    """ Splits `<target_name>@<registry_name>` into its parts. The registry name
+    is optional, and defaults to `default_namespace`. """
+    target_name, _, registry_namespace = identifier.partition('@')
+    return target_name, registry_namespace or default_namespace
 
 
 class Target:
+    """ Targets are identified by their namespace and name, so two targets registered
+    under the same name in the same registry are equal. There can be tens of thousands
+    of targets in generated registries, so instances are slotted, and the hash is
+    computed once at construction rather than on every set insertion or lookup. """
+
+    __slots__ = ('_function', '_registry_namespace', '_options', '_function_name', '_dependencies', '_hash', '_schema')
 
-    def __init__(self, function: Callable, registry_namespace: str, **options: str) -> None:
+    def __init__(self, function: Callable, registry_namespace: str, **options: Any) -> None:
         self._function = function
         self._registry_namespace = registry_namespace
         self._options = TargetOptions(**options)
+        self._function_name: str = self._options.name_override or function.__name__
+        self._dependencies = tuple(
+            split_target_identifier(identifier, default_namespace=registry_namespace)
+            for identifier in self._options.depends_on
+        )
+        self._hash = hash((registry_namespace, self._function_name))
+        self._schema: Optional[OptionSchema] = None
+
+    @property
+    def function(self) -> Callable:
+        return self._function
 
     @property
     def registry_namespace(self) -> str:
@@ -37,19 +95,93 @@ class Target:
     @property
     def function_name(self) -> str:
         # TODO change this to target_name, or just name
-        function_name = self._function.__name__
-        name_override = self._options.name_override
-        return name_override or function_name
+        return self._function_name
+
+    @property
+    def identifier(self) -> str:
+        return f'{self._function_name}@{self._registry_namespace}'
+
+    @property
+    def dependencies(self) -> Tuple[Tuple[str, str], ...]:
+        """ The name and namespace of each target declared in `depends_on`. """
+        return self._dependencies
+
+    @property
+    def inputs(self) -> Tuple[str, ...]:
+        """ Glob patterns, relative to the working directory, of the files the target reads. """
+        return self._options.inputs
+
+    @property
+    def outputs(self) -> Tuple[str, ...]:
+        """ Glob patterns, relative to the working directory, of the files the target writes. """
+        return self._options.outputs
+
+    @property
+    def cache(self) -> bool:
+        """ Whether results are served from, and stored in, the `ResultCache`. """
+        return self._options.cache
+
+    @property
+    def signature(self) -> str:
+        # inspect is slow to import, and only needed when listing targets
+        import inspect
+        return str(inspect.signature(self._function))
+
+    @property
+    def schema(self) -> OptionSchema:
+        """ The options the target accepts, and how each is converted from a string. """
+        if self._schema is None:
+            self._schema = OptionSchema.from_function(self._function)
+        return self._schema
+
+    def convert_options(self, options: Mapping[str, Any]) -> Dict[str, Any]:
+        """ `options` converted for the target's parameters (see `OptionSchema`). Raises
+        `InvalidOptionsError` if the target cannot be called with them. """
+        problems = self.schema.problems(options)
+        if problems:
+            raise InvalidOptionsError([(self.identifier, problem) for problem in problems])
+        return self.schema.convert(options)
+
+    @property
+    def is_coroutine(self) -> bool:
+        """ Whether the target was defined with `async def`. """
+        import inspect
+        return inspect.iscoroutinefunction(self._function)
 
     def execute(self, **options) -> None:
-        self._function(**options)
+        """ Options given as strings (e.g. on the command line) are converted first, see
+        `convert_options`. Coroutine targets are run to completion on a new event loop. """
+        options = self.convert_options(options)
+        if self.is_coroutine:
+            import asyncio
+            asyncio.run(self._function(**options))
+        else:
+            self._function(**options)
+
+    async def execute_async(self, **options) -> None:
+        """ Awaits coroutine targets on the running event loop. Other targets are called
+        directly, blocking the loop until they return. """
+        options = self.convert_options(options)
+        if self.is_coroutine:
+            await self._function(**options)
+        else:
+            self._function(**options)
 
     def __repr__(self) -> str:
         class_name = f'{self.__class__.__module__}.{self.__class__.__name__}'
         return f'<{class_name}(registry_namespace={self.registry_namespace},function_name={self.function_name})>'
 
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Target):
+            return NotImplemented
+        return (
+            self._hash == other._hash
+            and self._registry_namespace == other._registry_namespace
+            and self._function_name == other._function_name
+        )
+
     def __hash__(self) -> int:
-        return hash(repr(self))
+        return self._hash
 
 
 class Registry:
@@ -63,14 +195,16 @@ class Registry:
     def _get_calling_context_path() -> Path:
         """ Gets the `Path` of the first context in the stack to not be __file__.
         Intended to be called at instantiation-time to track the filenames of different
-        targets.py files.
+        targets.py files. Frames are walked directly rather than with `inspect.stack`,
+        which builds a `FrameInfo` (and reads source lines) for every frame on the stack.
         Example:
             # /path/to/foo.py
             Registry._get_calling_context_path()  # Path('/path/to/foo.py')
         """
-        stack = inspect.stack()
-        calling_context = next(context for context in stack if context.filename != __file__)
-        return Path(calling_context.filename)
+        frame = sys._getframe(1)
+        while frame.f_code.co_filename == __file__:
+            frame = frame.f_back  # type: ignore
+        return Path(frame.f_code.co_filename)
 
     def register_target(self, *args, **kwargs) -> Callable:
         if args:
@@ -91,14 +225,21 @@ class Registry:
             registry_namespace=self.name,
             **kwargs,
         )
+        # Targets compare equal by name, so discard first to make the most
+        # recent registration of a name win
+        self.targets.discard(new_target)
         self.targets.add(new_target)
 
 
 class TargetMap:
+    """ Maps target names to the targets registered under that name in each namespace.
+    Registries can be added, replaced and removed one at a time, at a cost proportional
+    to the number of targets they hold rather than to the size of the whole map. """
 
     def __init__(self, registries: List[Registry]) -> None:
         self._registries: List[Registry] = registries
         self._map: Dict[str, Dict[str, Target]] = {}
+        self._names_by_namespace: Dict[str, Set[str]] = defaultdict(set)
 
     @classmethod
     def create(cls, registries: List[Registry]) -> 'TargetMap':
@@ -123,14 +264,43 @@ class TargetMap:
             }
         else:
             self._map[target_name][namespace] = target
+        self._names_by_namespace[namespace].add(target_name)
+
+    def remove_namespace(self, namespace: str) -> None:
+        """ Removes every target in `namespace` from the map. """
+        for target_name in self._names_by_namespace.pop(namespace, ()):
+            targets_by_namespace = self._map[target_name]
+            del targets_by_namespace[namespace]
+            if not targets_by_namespace:
+                del self._map[target_name]
+
+    def add_registry(self, registry: Registry) -> None:
+        # The list is rebound rather than mutated, since it may belong to the caller
+        self._registries = self._registries + [registry]
+        self.unpack_registry(registry)
+
+    def remove_registry(self, namespace: str) -> None:
+        self._registries = [registry for registry in self._registries if registry.name != namespace]
+        self.remove_namespace(namespace)
+
+    def replace_registry(self, registry: Registry) -> None:
+        """ Swaps whichever registry currently holds `registry.name` for `registry`, so
+        that targets which were deleted from the registry disappear from the map. """
+        self.remove_registry(registry.name)
+        self.add_registry(registry)
 
     def get(self, target_name: str, namespace: str) -> Target:
         return self._map[target_name][namespace]
 
+    def __iter__(self) -> Iterator[Target]:
+        for targets_by_namespace in self._map.values():
+            yield from targets_by_namespace.values()
+
 
 class RegistryManager:
 
     def __init__(self, registries: List[Registry]) -> None:
+        self._registries: Dict[str, Registry] = {registry.name: registry for registry in registries}
         self._target_map: TargetMap = TargetMap.create(registries)
 
     @classmethod
@@ -149,5 +319,82 @@ class RegistryManager:
         if colliding_namespaces:
             raise RegistryNameCollisionError(colliding_namespaces=colliding_namespaces)
 
+    def add_registry(self, registry: Registry) -> None:
+        """ Only the namespace of `registry` can collide, so only it is checked. """
+        existing = self._registries.get(registry.name)
+        if existing is not None:
+            raise RegistryNameCollisionError(colliding_namespaces={registry.name: [existing.path, registry.path]})
+        self._registries[registry.name] = registry
+        self._target_map.add_registry(registry)
+
+    def replace_registry(self, registry: Registry) -> None:
+        """ Replaces the registry with the same name as `registry`, or adds `registry` if
+        there is none. Re-registering a namespace from the file which defined it is how
+        an edited targets file is reloaded; doing so from any other file is a collision. """
+        existing = self._registries.get(registry.name)
+        if existing is not None and existing.path != registry.path:
+            raise RegistryNameCollisionError(colliding_namespaces={registry.name: [existing.path, registry.path]})
+        self._registries[registry.name] = registry
+        self._target_map.replace_registry(registry)
+
+    def remove_registry(self, namespace: str) -> Registry:
+        """ Removes and returns the registry named `namespace`, raising `KeyError` if
+        there is no such registry. """
+        registry = self._registries.pop(namespace)
+        self._target_map.remove_registry(namespace)
+        return registry
+
+    @property
+    def registries(self) -> List[Registry]:
+        return list(self._registries.values())
+
     def get_target(self, requested_target_name: str, requested_namespace: str) -> Target:
         return self._target_map.get(requested_target_name, requested_namespace)
+
+    def _get_dependencies(self, target: Target) -> List[Target]:
+        dependencies = []
+        for target_name, namespace in target.dependencies:
+            try:
+                dependencies.append(self._target_map.get(target_name, namespace))
+            except KeyError:
+                raise UnknownTargetError(f'{target_name}@{namespace}', required_by=target.identifier) from None
+        return dependencies
+
+    def dependency_graph(self, targets: Iterable[Target]) -> Dict[Target, List[Target]]:
+        """ Maps each of `targets`, and every target they depend on (directly or not),
+        to its direct dependencies. Dependencies may belong to any registry. Each target
+        follows its dependencies in the returned mapping, and otherwise appears in the
+        order it was first reached, so iterating the mapping gives a valid execution order.
+        Raises `UnknownTargetError` if a dependency does not exist, and
+        `DependencyCycleError` if targets depend on each other. """
+        graph: Dict[Target, List[Target]] = {}
+        for root in targets:
+            if root in graph:
+                continue
+
+            # A depth-first search, with an explicit stack so that long chains of
+            # dependencies cannot exhaust the recursion limit. The stack holds the
+            # path from `root` to the target being visited.
+            root_dependencies = self._get_dependencies(root)
+            stack = [(root, root_dependencies, iter(root_dependencies))]
+            on_stack = {root}
+            while stack:
+                target, dependencies, unvisited = stack[-1]
+                for dependency in unvisited:
+                    if dependency in on_stack:
+                        path = [stacked_target for stacked_target, _, _ in stack]
+                        cycle = path[path.index(dependency):] + [dependency]
+                        raise DependencyCycleError([cycle_target.identifier for cycle_target in cycle])
+                    if dependency not in graph:
+                        dependency_dependencies = self._get_dependencies(dependency)
+                        stack.append((dependency, dependency_dependencies, iter(dependency_dependencies)))
+                        on_stack.add(dependency)
+                        break
+                else:
+                    stack.pop()
+                    on_stack.discard(target)
+                    graph[target] = dependencies
+        return graph
+
+    def targets(self) -> Iterator[Target]:
+        return iter(self._target_map)
@@ -0,0 +1,403 @@
+import hashlib
+import logging
+import marshal
+import os
+import sys
+import sysconfig
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    NamedTuple,
+    Optional,
+    TextIO,
+    Tuple,
+)
+
+from begin.cache import (
+    get_cache_dir,
+    make_cache_key,
+    read_json,
+    write_json,
+)
+from begin.registry import Target
+from begin.stamps import (
+    expand_patterns,
+    fingerprint,
+)
+from begin.utils import (
+    read_text_buffer,
+    text_buffer,
+)
+
+
+logger = logging.getLogger(__name__)
+
+RESULT_CACHE_SIZE_ENV_VAR = 'BEGIN_RESULT_CACHE_SIZE'
+
+# The size, in bytes, the result cache is pruned to after each new result is stored
+DEFAULT_RESULT_CACHE_SIZE = 512 * 2**20
+
+
+def get_result_cache_size() -> int:
+    """ Read from `$BEGIN_RESULT_CACHE_SIZE`, in bytes, falling back to
+    `DEFAULT_RESULT_CACHE_SIZE` if it is unset or invalid. """
+    size = os.environ.get(RESULT_CACHE_SIZE_ENV_VAR)
+    try:
+        return max(int(size), 0) if size else DEFAULT_RESULT_CACHE_SIZE
+    except ValueError:
+        logger.warning(f'Ignoring invalid ${RESULT_CACHE_SIZE_ENV_VAR}: {size!r}')
+        return DEFAULT_RESULT_CACHE_SIZE
+
+
+def _function_fingerprint(function: Any) -> str:
+    """ Changes whenever the function's bytecode, constants, names or defaults do. """
+    code = getattr(function, '__code__', None)
+    if code is None:
+        return repr(function)
+    digest = hashlib.sha256(marshal.dumps(code))
+    digest.update(repr(getattr(function, '__defaults__', None)).encode())
+    digest.update(repr(getattr(function, '__kwdefaults__', None)).encode())
+    return digest.hexdigest()
+
+
+def _environment_fingerprint() -> Tuple[Any, ...]:
+    """ Installing or removing a distribution adds or removes an entry in site-packages,
+    which moves the mtime of the directory, so the mtimes stand in for the (much more
+    expensive) versions of every installed distribution. """
+    site_packages_mtimes = []
+    for name in ('purelib', 'platlib'):
+        try:
+            site_packages_mtimes.append(os.stat(sysconfig.get_paths()[name]).st_mtime_ns)
+        except (KeyError, OSError):
+            site_packages_mtimes.append(None)
+    return sys.version, sys.executable, sys.platform, tuple(site_packages_mtimes)
+
+
+def _relative(paths: List[str], root: Path) -> Dict[str, str]:
+    return {os.path.relpath(path, str(root)): path for path in paths}
+
+
+class _BinaryTee:
+    """ The binary `buffer` of a `_Tee`. """
+
+    def __init__(self, stream: BinaryIO, captured: BinaryIO) -> None:
+        self.stream = stream
+        self._captured = captured
+
+    def write(self, data: bytes) -> int:
+        self._captured.write(data)
+        return self.stream.write(data)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.stream, name)
+
+
+class _Tee:
+    """ Writes through to `stream`, and keeps a copy of everything written, including to
+    its binary `buffer` (which some tools, e.g. flake8, write to). Output written straight
+    to the file descriptor (e.g. by a subprocess) is not captured. """
+
+    def __init__(self, stream: TextIO) -> None:
+        self.stream = stream
+        self._captured = text_buffer()
+        if hasattr(stream, 'buffer'):
+            self.buffer = _BinaryTee(stream.buffer, self._captured.buffer)
+
+    def write(self, text: str) -> int:
+        self._captured.write(text)
+        return self.stream.write(text)
+
+    def getvalue(self) -> str:
+        return read_text_buffer(self._captured)
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.stream, name)
+
+
+@contextmanager
+def _captured_output() -> Iterator[Tuple[_Tee, _Tee]]:
+    stdout, stderr = _Tee(sys.stdout), _Tee(sys.stderr)
+    sys.stdout, sys.stderr = stdout, stderr  # type: ignore
+    try:
+        yield stdout, stderr
+    finally:
+        sys.stdout, sys.stderr = stdout.stream, stderr.stream
+
+
+@dataclass
+class CachedResult:
+    """ What running a target produced. `exited` records whether it called `sys.exit`,
+    which recipes do even when they succeed, and `exit_code` the argument it was called
+    with. `artifacts` maps the path of each output, relative to the working directory,
+    to the hash of the object holding its content. """
+    exited: bool
+    exit_code: Any
+    stdout: str
+    stderr: str
+    artifacts: Dict[str, str]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'exited': self.exited,
+            'exit_code': self.exit_code,
+            'stdout': self.stdout,
+            'stderr': self.stderr,
+            'artifacts': self.artifacts,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'CachedResult':
+        return cls(**data)
+
+
+class _Entry(NamedTuple):
+    path: Path
+    mtime_ns: int
+    size: int
+    # The hash of each object the entry refers to
+    objects: List[str]
+
+
+@dataclass
+class CacheStats:
+    entries: int
+    objects: int
+    size: int
+    max_size: int
+
+
+class ResultCache:
+    """ A content-addressed store of target results. Each result is an entry, keyed on
+    everything which could change it: the target, the code of its function, the arguments
+    it was given (with defaults applied), the content of its declared inputs, and the
+    interpreter and installed distributions. Output artifacts are stored as objects named
+    by their content hash, so identical artifacts of different results are stored once.
+    Using an entry refreshes its mtime, and pruning evicts the least recently used entries
+    (and any objects no longer referenced) until the store fits its size limit. """
+
+    VERSION = 2
+
+    def __init__(self, root: Optional[Path] = None, max_size: Optional[int] = None) -> None:
+        self.root = root or get_cache_dir().joinpath('results')
+        self.max_size = get_result_cache_size() if max_size is None else max_size
+
+    @property
+    def _entries_dir(self) -> Path:
+        return self.root.joinpath('entries')
+
+    @property
+    def _objects_dir(self) -> Path:
+        return self.root.joinpath('objects')
+
+    def _entry_path(self, key: str) -> Path:
+        return self._entries_dir.joinpath(f'{key}.json')
+
+    def _object_path(self, content_hash: str) -> Path:
+        return self._objects_dir.joinpath(content_hash[:2], content_hash)
+
+    def key(self, target: Target, options: Mapping[str, str], cwd: Path) -> Optional[str]:
+        """ Returns `None` if `options` do not fit the target's signature, in which
+        case the target should be executed, so that it reports the mistake. """
+        import inspect
+
+        try:
+            bound_arguments = inspect.signature(target.function).bind(**options)
+        except (TypeError, ValueError):
+            return None
+        bound_arguments.apply_defaults()
+
+        input_hashes = {
+            os.path.relpath(path, str(cwd)): entry['sha256']
+            for path, entry in fingerprint(expand_patterns(target.inputs, cwd)).items()
+        }
+        return make_cache_key(
+            self.VERSION,
+            target.identifier,
+            _function_fingerprint(target.function),
+            sorted(bound_arguments.arguments.items()),
+            sorted(input_hashes.items()),
+            target.outputs,
+            _environment_fingerprint(),
+        )
+
+    def get(self, key: str) -> Optional[CachedResult]:
+        """ Returns `None` if there is no usable entry for `key`. """
+        entry_path = self._entry_path(key)
+        data = read_json(entry_path)
+        if not isinstance(data, dict):
+            return None
+        try:
+            result = CachedResult.from_dict(data)
+        except TypeError:
+            return None
+        # Another process may have evicted objects the entry refers to
+        if not all(self._object_path(content_hash).is_file() for content_hash in result.artifacts.values()):
+            return None
+
+        try:
+            os.utime(str(entry_path))
+        except OSError:
+            pass
+        return result
+
+    def _store_object(self, path: str) -> Optional[str]:
+        try:
+            content = Path(path).read_bytes()
+        except OSError:
+            return None
+        content_hash = hashlib.sha256(content).hexdigest()
+        object_path = self._object_path(content_hash)
+        if object_path.is_file():
+            return content_hash
+
+        tmp_path = object_path.with_name(f'.{content_hash}.{os.getpid()}')
+        try:
+            object_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_bytes(content)
+            os.replace(str(tmp_path), str(object_path))
+        except OSError:
+            return None
+        return content_hash
+
+    def put(self, key: str, result: CachedResult, outputs: Dict[str, str]) -> None:
+        """ `outputs` maps the relative path of each output artifact to its current path.
+        Failures are swallowed, like those of every other cache. """
+        for relative_path, path in outputs.items():
+            content_hash = self._store_object(path)
+            if content_hash is None:
+                return
+            result.artifacts[relative_path] = content_hash
+        write_json(self._entry_path(key), result.to_dict())
+        self.prune()
+
+    def restore(self, result: CachedResult, cwd: Path) -> None:
+        """ Writes each artifact of `result` below `cwd`, unless it is already there. """
+        for relative_path, content_hash in result.artifacts.items():
+            path = cwd.joinpath(relative_path)
+            content = self._object_path(content_hash).read_bytes()
+            try:
+                if hashlib.sha256(path.read_bytes()).hexdigest() == content_hash:
+                    continue
+            except OSError:
+                pass
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(content)
+
+    def _scan(self) -> Tuple[List[_Entry], Dict[str, int]]:
+        """ Every entry, and the size of every object. """
+        entries = []
+        for entry_path in self._entries_dir.glob('*.json'):
+            try:
+                stat_result = entry_path.stat()
+            except OSError:
+                continue
+            data = read_json(entry_path)
+            artifacts = data.get('artifacts', {}) if isinstance(data, dict) else {}
+            entries.append(_Entry(entry_path, stat_result.st_mtime_ns, stat_result.st_size, list(artifacts.values())))
+
+        object_sizes = {}
+        for object_path in self._objects_dir.glob('*/*'):
+            # Objects which are still being written are hidden
+            if object_path.name.startswith('.'):
+                continue
+            try:
+                object_sizes[object_path.name] = object_path.stat().st_size
+            except OSError:
+                continue
+        return entries, object_sizes
+
+    def _delete(self, path: Path) -> bool:
+        try:
+            path.unlink()
+        except OSError:
+            return False
+        return True
+
+    def stats(self) -> CacheStats:
+        entries, object_sizes = self._scan()
+        size = sum(entry.size for entry in entries) + sum(object_sizes.values())
+        return CacheStats(entries=len(entries), objects=len(object_sizes), size=size, max_size=self.max_size)
+
+    def prune(self, max_size: Optional[int] = None) -> int:
+        """ Evicts the least recently used entries until the store holds at most
+        `max_size` bytes (by default, its size limit), and deletes objects which no
+        entry refers to. Returns the number of entries evicted. """
+        max_size = self.max_size if max_size is None else max_size
+        entries, object_sizes = self._scan()
+        references = Counter(content_hash for entry in entries for content_hash in entry.objects)
+
+        # Objects no entry refers to are left behind by interrupted runs
+        for content_hash in set(object_sizes) - set(references):
+            self._delete(self._object_path(content_hash))
+            del object_sizes[content_hash]
+
+        size = sum(entry.size for entry in entries) + sum(object_sizes.values())
+        evicted = 0
+        for entry in sorted(entries, key=lambda entry: entry.mtime_ns):
+            if size <= max_size:
+                break
+            if not self._delete(entry.path):
+                continue
+            evicted += 1
+            size -= entry.size
+            for content_hash in entry.objects:
+                references[content_hash] -= 1
+                if references[content_hash] == 0 and self._delete(self._object_path(content_hash)):
+                    size -= object_sizes.get(content_hash, 0)
+        return evicted
+
+    def clear(self) -> int:
+        """ Evicts every entry, returning the number evicted. """
+        return self.prune(max_size=0)
+
+
+def execute_cached(target: Target, options: Mapping[str, str], refresh: bool = False) -> None:
+    """ Executes `target` with `options` through the `ResultCache`. On a hit, the target's
+    output artifacts are restored and its output replayed rather than running it, and an
+    exit is re-raised with the recorded exit code. On a miss (or if `refresh` is set) the
+    target runs with its output captured, and the result is stored if it succeeded. Failures
+    (a non-zero or non-integer exit code) and exceptions other than `SystemExit` are never
+    cached, since they may not be down to the inputs at all. """
+    cwd = Path.cwd()
+    cache = ResultCache()
+    key = cache.key(target, options, cwd)
+    if key is None:
+        target.execute(**options)
+        return
+
+    result = None if refresh else cache.get(key)
+    if result is not None:
+        logger.info(f'Replaying the cached result of {target.identifier}')
+        cache.restore(result, cwd)
+        sys.stdout.write(result.stdout)
+        sys.stderr.write(result.stderr)
+        if result.exited:
+            sys.exit(result.exit_code)
+        return
+
+    exited, exit_code = False, None
+    with _captured_output() as (stdout, stderr):
+        try:
+            target.execute(**options)
+        except SystemExit as ex:
+            exited, exit_code = True, ex.code
+
+    if exit_code in (0, None):
+        result = CachedResult(
+            exited=exited,
+            exit_code=exit_code,
+            stdout=stdout.getvalue(),
+            stderr=stderr.getvalue(),
+            artifacts={},
+        )
+        cache.put(key, result, _relative(expand_patterns(target.outputs, cwd), cwd))
+    if exited:
+        sys.exit(exit_code)
@@ -0,0 +1,122 @@
+from collections import defaultdict
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Future,
+    wait,
+)
+from typing import (
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+    TypeVar,
+)
+
+
+Node = TypeVar('Node', bound=Hashable)
+
+
+class Scheduler(Generic[Node]):
+    """ Runs the nodes of a dependency graph, such as the one built by
+    `RegistryManager.dependency_graph`. `graph` maps every node to the nodes it depends
+    on. Each node runs at most once, and only after all of its dependencies succeeded.
+    Running a node produces an exit status, where 0 means success. The result of a run
+    maps each node to its status, or to `None` if it never ran because a dependency
+    failed. """
+
+    def __init__(self, graph: Mapping[Node, Sequence[Node]]) -> None:
+        # Duplicate dependencies are dropped, but their order is preserved
+        self._dependencies: Dict[Node, List[Node]] = {
+            node: list(dict.fromkeys(dependencies)) for node, dependencies in graph.items()
+        }
+        self._dependents: Dict[Node, List[Node]] = defaultdict(list)
+        for node, dependencies in self._dependencies.items():
+            for dependency in dependencies:
+                self._dependents[dependency].append(node)
+
+    def execution_order(self) -> List[Node]:
+        """ Every node, following its dependencies. Nodes are otherwise kept in the
+        order of `graph`. Raises `ValueError` if the graph has a cycle. """
+        order: List[Node] = []
+        done = set()
+        for root in self._dependencies:
+            if root in done:
+                continue
+            stack = [(root, iter(self._dependencies[root]))]
+            on_stack = {root}
+            while stack:
+                node, unvisited = stack[-1]
+                for dependency in unvisited:
+                    if dependency in on_stack:
+                        raise ValueError(f'The graph has a cycle through {dependency!r}')
+                    if dependency not in done:
+                        stack.append((dependency, iter(self._dependencies[dependency])))
+                        on_stack.add(dependency)
+                        break
+                else:
+                    stack.pop()
+                    on_stack.discard(node)
+                    done.add(node)
+                    order.append(node)
+        return order
+
+    def _start(self) -> Tuple[Dict[Node, Optional[int]], Dict[Node, int], List[Node]]:
+        """ The initial status of each node, the number of dependencies each node is
+        waiting for, and the nodes which can run straight away. """
+        # Nodes on a cycle would never run, so reject cycles up front
+        self.execution_order()
+
+        statuses: Dict[Node, Optional[int]] = dict.fromkeys(self._dependencies)
+        unfinished_dependencies = {node: len(dependencies) for node, dependencies in self._dependencies.items()}
+        ready = [node for node, count in unfinished_dependencies.items() if count == 0]
+        return statuses, unfinished_dependencies, ready
+
+    def _finish(self, node: Node, status: int, unfinished_dependencies: Dict[Node, int]) -> List[Node]:
+        """ Returns the dependents of `node` which can run now that it finished. """
+        if status != 0:
+            return []
+        ready = []
+        for dependent in self._dependents[node]:
+            unfinished_dependencies[dependent] -= 1
+            if unfinished_dependencies[dependent] == 0:
+                ready.append(dependent)
+        return ready
+
+    def run_concurrently(self, submit: Callable[[Node], 'Future[int]']) -> Dict[Node, Optional[int]]:
+        """ `submit` starts running a node, e.g. on an executor, and returns a future
+        for its exit status. Each node is submitted as soon as all of its dependencies
+        have succeeded, so independent branches of the graph overlap. If a node fails,
+        its dependents are never submitted, but every other branch runs to completion. """
+        statuses, unfinished_dependencies, ready = self._start()
+        running: Dict['Future[int]', Node] = {submit(node): node for node in ready}
+        while running:
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                node = running.pop(future)
+                statuses[node] = future.result()
+                for dependent in self._finish(node, future.result(), unfinished_dependencies):
+                    running[submit(dependent)] = dependent
+        return statuses
+
+    async def run_asynchronously(self, run: Callable[[Node], Awaitable[int]]) -> Dict[Node, Optional[int]]:
+        """ As `run_concurrently`, but each node runs as a task on the running event loop,
+        with `run` returning its exit status. """
+        # asyncio is slow to import, and only needed by coroutine targets
+        import asyncio
+
+        statuses, unfinished_dependencies, ready = self._start()
+        running: Dict['asyncio.Future[int]', Node] = {asyncio.ensure_future(run(node)): node for node in ready}
+        while running:
+            finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+            for future in finished:
+                node = running.pop(future)
+                statuses[node] = future.result()
+                for dependent in self._finish(node, future.result(), unfinished_dependencies):
+                    running[asyncio.ensure_future(run(dependent))] = dependent
+        return statuses
@@ -0,0 +1,313 @@
+import heapq
+import json
+import logging
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from dataclasses import (
+    dataclass,
+    field,
+)
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+from begin.cache import (
+    get_cache_dir,
+    make_cache_key,
+    read_json,
+    write_json,
+)
+from begin.plugins.begin_pytest_shard import SHARD_FILE_ENV_VAR
+
+
+logger = logging.getLogger(__name__)
+
+PLUGIN_DIR = Path(__file__).parent.joinpath('plugins')
+PLUGIN_NAME = 'begin_pytest_shard'
+
+# Assumed for tests which have never run, when no test has
+DEFAULT_TEST_DURATION = 1.0
+
+# See `_pytest.config.ExitCode`
+PYTEST_NO_TESTS_COLLECTED = 5
+PYTEST_TESTS_FAILED = 1
+
+# pytest-cov options which take a value, and are handled by the parent rather than by
+# each shard, so that the reports and the threshold apply to the merged data
+_COVERAGE_REPORT_OPTION = '--cov-report'
+_COVERAGE_FAIL_UNDER_OPTION = '--cov-fail-under'
+_COVERAGE_CONFIG_OPTION = '--cov-config'
+
+
+def get_durations_path(root: Path) -> Path:
+    return get_cache_dir().joinpath('pytest_durations', f'{make_cache_key(str(root))}.json')
+
+
+def load_durations(root: Path) -> Dict[str, float]:
+    durations = read_json(get_durations_path(root))
+    return durations if isinstance(durations, dict) else {}
+
+
+def balance(node_ids: Sequence[str], durations: Mapping[str, float], shards: int) -> List[List[str]]:
+    """ Splits `node_ids` into at most `shards` groups of roughly equal total duration,
+    by assigning the longest tests first, each to the group with the least to do so far.
+    Tests without a recorded duration are assumed to take as long as the average test
+    which has one. Each group keeps the collection order, so that tests sharing
+    fixtures stay together where possible. Empty groups are dropped. """
+    known = [durations[node_id] for node_id in node_ids if node_id in durations]
+    default = sum(known) / len(known) if known else DEFAULT_TEST_DURATION
+
+    order = {node_id: index for index, node_id in enumerate(node_ids)}
+    by_duration = sorted(node_ids, key=lambda node_id: (-durations.get(node_id, default), order[node_id]))
+
+    heap: List[Tuple[float, int]] = [(0.0, index) for index in range(max(1, shards))]
+    groups: List[List[str]] = [[] for _ in heap]
+    for node_id in by_duration:
+        total, index = heapq.heappop(heap)
+        groups[index].append(node_id)
+        heapq.heappush(heap, (total + durations.get(node_id, default), index))
+
+    return [sorted(group, key=order.__getitem__) for group in groups if group]
+
+
+@dataclass
+class CoverageOptions:
+    """ The pytest-cov options which the parent applies to the merged coverage data. """
+    reports: List[str] = field(default_factory=list)
+    fail_under: Optional[float] = None
+    config_file: Optional[str] = None
+
+
+def _take_value(args: Sequence[str], index: int) -> Tuple[str, Optional[str], int]:
+    """ Parses `--option=value` or `--option value` at `index`. """
+    arg = args[index]
+    option, separator, value = arg.partition('=')
+    if separator:
+        return option, value, index + 1
+    if index + 1 < len(args):
+        return option, args[index + 1], index + 2
+    return option, None, index + 1
+
+
+def split_coverage_args(args: Sequence[str]) -> Tuple[List[str], Optional[CoverageOptions]]:
+    """ Returns the arguments for each shard, and the coverage options for the parent, or
+    `None` if coverage was not requested. Shards measure coverage, but neither report it
+    nor enforce the threshold. """
+    shard_args: List[str] = []
+    options = CoverageOptions()
+    measured = False
+    index = 0
+    while index < len(args):
+        arg = args[index]
+        option = arg.partition('=')[0]
+        if option in (_COVERAGE_REPORT_OPTION, _COVERAGE_FAIL_UNDER_OPTION):
+            option, value, index = _take_value(args, index)
+            if value is None:
+                continue
+            if option == _COVERAGE_REPORT_OPTION:
+                options.reports.append(value)
+            else:
+                options.fail_under = float(value)
+            continue
+        if option == _COVERAGE_CONFIG_OPTION:
+            options.config_file = _take_value(args, index)[1]
+        measured = measured or option == '--cov'
+        if arg == '--no-cov':
+            measured = False
+        shard_args.append(arg)
+        index += 1
+
+    if not measured:
+        return list(args), None
+    return [*shard_args, f'{_COVERAGE_REPORT_OPTION}='], options
+
+
+@dataclass
+class ShardResult:
+    exit_code: int
+    output: str
+    durations: Dict[str, float] = field(default_factory=dict)
+    outcomes: Dict[str, int] = field(default_factory=dict)
+    failed: List[str] = field(default_factory=list)
+
+
+def _get_coverage_file(work_dir: Path, name: str) -> Path:
+    return work_dir.joinpath(f'{name}.coverage')
+
+
+class _PytestProcess:
+    """ A pytest run in a separate process, with the shard plugin loaded, and its output
+    collected in a temporary file. """
+
+    def __init__(self, args: Sequence[str], spec: Dict[str, Any], work_dir: Path, name: str) -> None:
+        self.output_path = work_dir.joinpath(f'{name}.json')
+        spec_path = work_dir.joinpath(f'{name}.spec.json')
+        spec_path.write_text(json.dumps({**spec, 'output': str(self.output_path)}), encoding='utf-8')
+
+        env = dict(os.environ)
+        env[SHARD_FILE_ENV_VAR] = str(spec_path)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, (str(PLUGIN_DIR), env.get('PYTHONPATH'))))
+        env['COVERAGE_FILE'] = str(_get_coverage_file(work_dir, name))
+
+        self._log = tempfile.TemporaryFile(mode='w+', encoding='utf-8', errors='replace')
+        self._process = subprocess.Popen(
+            [sys.executable, '-m', 'pytest', '-p', PLUGIN_NAME, *args],
+            env=env,
+            stdout=self._log,
+            stderr=subprocess.STDOUT,
+        )
+
+    def wait(self) -> Tuple[int, str, Any]:
+        exit_code = self._process.wait()
+        self._log.seek(0)
+        output = self._log.read()
+        self._log.close()
+        try:
+            data = json.loads(self.output_path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            data = None
+        return exit_code, output, data
+
+
+def collect(args: Sequence[str], work_dir: Path) -> Tuple[int, str, List[str]]:
+    """ The node ids of the tests `pytest args` would run. """
+    collect_args = [*args, '--collect-only', '-q']
+    exit_code, output, node_ids = _PytestProcess(collect_args, {'mode': 'collect'}, work_dir, 'collect').wait()
+    return exit_code, output, node_ids or []
+
+
+def run_shards(args: Sequence[str], groups: List[List[str]], work_dir: Path) -> List[ShardResult]:
+    processes = [
+        _PytestProcess(args, {'mode': 'run', 'node_ids': group}, work_dir, f'shard{index}')
+        for index, group in enumerate(groups)
+    ]
+    results = []
+    for process in processes:
+        exit_code, output, data = process.wait()
+        data = data or {}
+        results.append(ShardResult(
+            exit_code=exit_code,
+            output=output,
+            durations=data.get('durations', {}),
+            outcomes=data.get('outcomes', {}),
+            failed=data.get('failed', []),
+        ))
+    return results
+
+
+def merge_exit_codes(exit_codes: Sequence[int]) -> int:
+    """ pytest's exit codes grow with severity (tests failed, interrupted, internal
+    error, usage error), except for "no tests collected", which only counts if no shard
+    ran any test. """
+    ran = [exit_code for exit_code in exit_codes if exit_code != PYTEST_NO_TESTS_COLLECTED]
+    if not ran:
+        return PYTEST_NO_TESTS_COLLECTED
+    return max(ran)
+
+
+def _write_coverage_report(cov: Any, report: str) -> Optional[float]:
+    """ Writes a report given as to pytest-cov's `--cov-report`, and returns the total
+    coverage, if the report computes it. """
+    report_type, _, destination = report.partition(':')
+    if report_type in ('term', 'term-missing'):
+        return cov.report(show_missing=report_type == 'term-missing', skip_covered=destination == 'skip-covered')
+    if report_type == 'annotate':
+        cov.annotate(directory=destination or None)
+        return None
+    writers = {
+        'html': lambda: cov.html_report(directory=destination or None),
+        'xml': lambda: cov.xml_report(outfile=destination or None),
+        'json': lambda: cov.json_report(outfile=destination or None),
+        'lcov': lambda: cov.lcov_report(outfile=destination or None),
+    }
+    if report_type not in writers:
+        logger.warning(f'Ignoring unknown coverage report type `{report_type}`')
+        return None
+    return writers[report_type]()
+
+
+def merge_coverage(coverage_files: Sequence[Path], options: CoverageOptions) -> bool:
+    """ Combines the data of every shard, writes the requested reports (a terminal
+    report by default), and returns whether the total meets the threshold, if any. """
+    import coverage
+
+    cov = coverage.Coverage(config_file=options.config_file or True)
+    cov.combine([str(path) for path in coverage_files if path.exists()])
+    cov.save()
+
+    totals = [_write_coverage_report(cov, report) for report in options.reports or ['term']]
+    if options.fail_under is None:
+        return True
+
+    total = next((total for total in totals if total is not None), None)
+    if total is None:
+        with open(os.devnull, 'w') as devnull:
+            total = cov.report(file=devnull)
+    if total < options.fail_under:
+        print(f'FAIL Required test coverage of {options.fail_under}% not reached. Total coverage: {total:.2f}%')
+        return False
+    return True
+
+
+def _print_summary(results: Sequence[ShardResult], duration: float) -> None:
+    outcomes: Dict[str, int] = {}
+    for result in results:
+        for outcome, count in result.outcomes.items():
+            outcomes[outcome] = outcomes.get(outcome, 0) + count
+    failed = [node_id for result in results for node_id in result.failed]
+
+    if failed:
+        print('Failed tests:')
+        for node_id in failed:
+            print(f'\t{node_id}')
+    counts = ', '.join(f'{count} {outcome}' for outcome, count in sorted(outcomes.items())) or 'no tests ran'
+    print(f'{counts} in {duration:.2f}s across {len(results)} shards')
+
+
+def run_sharded(args: Sequence[str], shards: int, root: Optional[Path] = None) -> int:
+    """ Runs `pytest args` split across `shards` processes, and returns the merged exit
+    code. The collected tests are balanced by the durations recorded in previous sharded
+    runs below `root` (the working directory by default), and the durations of this run
+    are recorded for the next. With `--cov`, each shard measures coverage, and the data
+    is combined into a single set of reports once every shard has finished. """
+    root = root or Path.cwd()
+    start = time.perf_counter()
+    shard_args, coverage_options = split_coverage_args(args)
+
+    with tempfile.TemporaryDirectory(prefix='begin-pytest-') as work_dir_name:
+        work_dir = Path(work_dir_name)
+        # Collecting measures nothing worth reporting
+        collect_args = shard_args if coverage_options is None else [*shard_args, '--no-cov']
+        exit_code, output, node_ids = collect(collect_args, work_dir)
+        if exit_code != 0 or not node_ids:
+            print(output, end='')
+            return exit_code
+
+        durations = load_durations(root)
+        groups = balance(node_ids, durations, shards)
+        results = run_shards(shard_args, groups, work_dir)
+
+        for index, (group, result) in enumerate(zip(groups, results)):
+            print(f'==== Shard {index + 1}/{len(groups)}: {len(group)} tests, exit code {result.exit_code} ====')
+            print(result.output, end='')
+        for result in results:
+            durations.update(result.durations)
+        write_json(get_durations_path(root), durations)
+
+        exit_code = merge_exit_codes([result.exit_code for result in results])
+        _print_summary(results, time.perf_counter() - start)
+        if coverage_options is not None:
+            coverage_files = [_get_coverage_file(work_dir, f'shard{index}') for index in range(len(groups))]
+            if not merge_coverage(coverage_files, coverage_options) and exit_code == 0:
+                exit_code = PYTEST_TESTS_FAILED
+    return exit_code
@@ -0,0 +1,142 @@
+import glob
+import hashlib
+import logging
+import os
+import time
+from pathlib import Path
+from typing import (
+    Any,
+    Dict,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+)
+
+from begin.cache import (
+    get_cache_dir,
+    make_cache_key,
+    read_json,
+    trusted_mtime,
+    write_json,
+)
+from begin.registry import Target
+
+
+logger = logging.getLogger(__name__)
+
+# Maps the path of each file matching a target's patterns to its size, mtime and content hash
+Fingerprint = Dict[str, Dict[str, Any]]
+
+
+def expand_patterns(patterns: Sequence[str], root: Path) -> List[str]:
+    """ The sorted paths of the files matching any of `patterns`, which are glob patterns
+    relative to `root`. `**` matches any number of directories. """
+    paths = set()
+    for pattern in patterns:
+        for path in glob.iglob(os.path.join(str(root), pattern), recursive=True):
+            if os.path.isfile(path):
+                paths.add(path)
+    return sorted(paths)
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(lambda: file.read(1 << 16), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint(paths: Sequence[str], previous: Optional[Fingerprint] = None) -> Fingerprint:
+    """ Hashes the content of each of `paths`. A file whose size and mtime match its entry
+    in `previous` is not read, and keeps the recorded hash. Files which cannot be read are
+    left out, so that they show up as a change. """
+    previous = previous or {}
+    now_ns = time.time_ns()
+    result: Fingerprint = {}
+    for path in paths:
+        try:
+            stat_result = os.stat(path)
+            entry = previous.get(path)
+            if (
+                entry is not None
+                and entry['size'] == stat_result.st_size
+                and entry['mtime_ns'] == stat_result.st_mtime_ns
+            ):
+                content_hash = entry['sha256']
+            else:
+                content_hash = _hash_file(path)
+        except OSError:
+            continue
+        result[path] = {
+            'size': stat_result.st_size,
+            'mtime_ns': trusted_mtime(stat_result.st_mtime_ns, now_ns),
+            'sha256': content_hash,
+        }
+    return result
+
+
+def _content(fingerprint: Fingerprint) -> Dict[str, str]:
+    return {path: entry['sha256'] for path, entry in fingerprint.items()}
+
+
+class TargetStamp:
+    """ Records the content of a target's declared inputs and outputs after it ran
+    successfully, so that it can be skipped while neither they nor the options it was
+    requested with change. A target which declares outputs is never up to date while
+    none of them exist. Stamps are kept per working directory, since the patterns are
+    relative to it. """
+
+    VERSION = 1
+
+    def __init__(self, target: Target, options: Mapping[str, str], root: Path) -> None:
+        self._target = target
+        self._options = dict(options)
+        self._root = root
+        key = make_cache_key(self.VERSION, str(root), target.identifier)
+        self.path = get_cache_dir().joinpath('stamps', f'{key}.json')
+        self._recorded: Optional[Dict[str, Any]] = None
+        self._loaded = False
+
+    @classmethod
+    def for_target(cls, target: Target, options: Mapping[str, str]) -> Optional['TargetStamp']:
+        """ Returns `None` for targets which declare no inputs, which always run. """
+        if not target.inputs:
+            return None
+        return cls(target, options, Path.cwd())
+
+    def _load(self) -> Optional[Dict[str, Any]]:
+        if not self._loaded:
+            data = read_json(self.path)
+            if isinstance(data, dict) and data.get('version') == self.VERSION:
+                self._recorded = data
+            self._loaded = True
+        return self._recorded
+
+    def _fingerprints(self, recorded: Optional[Dict[str, Any]]) -> Dict[str, Fingerprint]:
+        recorded = recorded or {}
+        return {
+            kind: fingerprint(expand_patterns(patterns, self._root), recorded.get(kind))
+            for kind, patterns in (('inputs', self._target.inputs), ('outputs', self._target.outputs))
+        }
+
+    def is_up_to_date(self) -> bool:
+        recorded = self._load()
+        if recorded is None or recorded['options'] != self._options:
+            return False
+
+        current = self._fingerprints(recorded)
+        if self._target.outputs and not current['outputs']:
+            return False
+        return all(_content(current[kind]) == _content(recorded[kind]) for kind in ('inputs', 'outputs'))
+
+    def record(self) -> None:
+        """ Called after the target succeeded. The files are hashed again, since
+        the target may have rewritten its inputs (e.g. a formatter). """
+        self._recorded = {
+            'version': self.VERSION,
+            'options': self._options,
+            **self._fingerprints(self._load()),
+        }
+        write_json(self.path, self._recorded)
@@ -1,5 +1,10 @@
 import sys
 from contextlib import contextmanager
+from functools import wraps
+from io import (
+    BytesIO,
+    TextIOWrapper,
+)
 from typing import (
     Any,
     Callable,
@@ -32,11 +37,35 @@ def patched_argv_context(*args):
 
 
 def with_exit(fn: Callable) -> Callable:
+    """ The original, returning, function stays available as `without_exit`. """
+    @wraps(fn)
     def _fn(*args: Any, **kwargs: Any) -> NoReturn:
         sys.exit(fn(*args, **kwargs))
+    _fn.without_exit = fn  # type: ignore
     return _fn
 
 
+def exit_status(code: object) -> int:
+    """ Mirrors how the interpreter turns the argument of `sys.exit` into an exit status. """
+    if code is None:
+        return 0
+    if isinstance(code, int):
+        return code
+    print(code, file=sys.stderr)
+    return 1
+
+
+def text_buffer() -> TextIOWrapper:
+    """ An in-memory text stream which, unlike a `StringIO`, has the binary `buffer`
+    that some tools (e.g. flake8) write to. Read it with `read_text_buffer`. """
+    return TextIOWrapper(BytesIO(), encoding='utf-8', errors='replace', newline='', write_through=True)
+
+
+def read_text_buffer(stream: TextIOWrapper) -> str:
+    stream.flush()
+    return stream.buffer.getvalue().decode('utf-8', errors='replace')
+
+
 def str_to_bool(arg: str) -> bool:
     if arg.lower() in {'no', 'n', 'false', 'f', '0'}:
         return False
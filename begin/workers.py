@@ -0,0 +1,152 @@
+import logging
+import multiprocessing
+import os
+import pickle
+from concurrent.futures import (
+    Future,
+    ThreadPoolExecutor,
+)
+from multiprocessing.connection import Connection
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    NoReturn,
+    Optional,
+)
+
+from begin.constants import WARM_MODULES
+from begin.recipes import (
+    RecipeResult,
+    run,
+)
+
+
+logger = logging.getLogger(__name__)
+
+
+class RecipeWorkerError(Exception):
+    """ Raised in the caller's process in place of an exception which the recipe raised
+    in its worker, when that exception could not be sent back. """
+
+
+def _run_in_worker(
+    connection: Connection,
+    recipe: Callable[..., NoReturn],
+    args: Iterable[str],
+    capture_output: bool,
+    kwargs: Dict[str, Any],
+) -> None:
+    """ The entry point of each worker. Exactly one message is sent: the result, or the
+    exception the recipe raised. """
+    try:
+        message: Any = run(recipe, *args, capture_output=capture_output, **kwargs)
+    except Exception as ex:
+        message = ex
+    try:
+        connection.send(message)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        connection.send(RecipeWorkerError(f'{type(message).__name__}: {message}'))
+    finally:
+        connection.close()
+
+
+def _exit_code_of_lost_worker(process_exit_code: Optional[int]) -> int:
+    """ Follows the shell's convention for processes killed by a signal. """
+    if process_exit_code is None or process_exit_code == 0:
+        return 1
+    if process_exit_code < 0:
+        return 128 - process_exit_code
+    return process_exit_code
+
+
+class RecipePool:
+    """ Runs recipes in worker processes, each forked from a server process which imported
+    `preload` (by default, the tools wrapped by `begin.recipes`) once. Every call gets a
+    fresh copy-on-write worker, so it pays nothing to import the tools, and cannot leak
+    state (e.g. `sys.argv`, `sys.modules` or tool configuration) into the caller or into
+    later calls. At most `max_workers` recipes run at once.
+
+    Where the `forkserver` start method is not available (e.g. on Windows), workers are
+    spawned, and import the tools themselves. The server is shared by every pool in the
+    process, and keeps the `preload` of the first pool to start a worker.
+
+    Recipes are sent to the workers by reference, so must be defined at the top level of
+    a module, as those in `begin.recipes` are. Their output goes straight to the caller's
+    standard streams, unless it is captured. """
+
+    def __init__(self, preload: Iterable[str] = WARM_MODULES, max_workers: Optional[int] = None) -> None:
+        start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+        self._context = multiprocessing.get_context(start_method)
+        if start_method == 'forkserver':
+            self._context.set_forkserver_preload(list(preload))
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or os.cpu_count() or 1)
+
+    def _run(
+        self,
+        recipe: Callable[..., NoReturn],
+        args: Iterable[str],
+        capture_output: bool,
+        kwargs: Dict[str, Any],
+    ) -> RecipeResult:
+        receiver, sender = self._context.Pipe(duplex=False)
+        process = self._context.Process(
+            target=_run_in_worker,
+            args=(sender, recipe, tuple(args), capture_output, kwargs),
+            daemon=True,
+        )
+        process.start()
+        sender.close()
+        try:
+            message = receiver.recv()
+        except EOFError:
+            # The worker died before sending anything, e.g. it was killed
+            message = None
+        finally:
+            receiver.close()
+            process.join()
+
+        if isinstance(message, BaseException):
+            raise message
+        if message is None:
+            name = getattr(recipe, '__name__', repr(recipe))
+            logger.error(f'The worker running {name} exited with {process.exitcode} before reporting a result')
+            return RecipeResult(
+                name=name,
+                args=tuple(args),
+                exit_code=_exit_code_of_lost_worker(process.exitcode),
+                duration=0.0,
+            )
+        return message
+
+    def submit(
+        self,
+        recipe: Callable[..., NoReturn],
+        *args: str,
+        capture_output: bool = False,
+        **kwargs: Any,
+    ) -> Future:
+        """ Starts running `recipe` in a worker, and returns a future holding its
+        `RecipeResult`. See `recipes.run`. """
+        return self._executor.submit(self._run, recipe, args, capture_output, kwargs)
+
+    def run(
+        self,
+        recipe: Callable[..., NoReturn],
+        *args: str,
+        capture_output: bool = False,
+        **kwargs: Any,
+    ) -> RecipeResult:
+        """ Like `recipes.run`, but in a worker. """
+        return self.submit(recipe, *args, capture_output=capture_output, **kwargs).result()
+
+    def close(self) -> None:
+        """ Waits for running recipes to finish. """
+        self._executor.shutdown(wait=True)
+
+    def __enter__(self) -> 'RecipePool':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
@@ -0,0 +1,92 @@
+""" Measures the latency of shell completion (`begin --complete WORD`, run on every
+keypress) in a generated project, against the start-up of a bare interpreter, which no
+command can beat. Each run is a fresh process, as it is in a shell. The first run fills
+the discovery index and the manifest cache, so later runs measure the warm path.
+
+Usage (with `begin` installed, e.g. after `poetry install`):
+    python benchmarks/completion_latency.py [targets_file_count] [runs]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import (
+    List,
+    Sequence,
+)
+
+import begin
+from begin.cache import (
+    CACHE_DIR_ENV_VAR,
+    RACY_WINDOW_NS,
+)
+
+
+# The budget for interactive tab completion
+BUDGET_MS = 50
+
+TARGETS_FILE = """
+from begin import Registry
+
+registry = Registry(name='{namespace}')
+
+
+@registry.register_target
+def build_{index}(version: int = 1):
+    pass
+
+
+@registry.register_target
+def test_{index}(shards=1):
+    pass
+"""
+
+COMPLETE = 'from begin.cli.cli import main; main()'
+
+
+def _create_project(root: Path, targets_file_count: int) -> None:
+    for index in range(targets_file_count):
+        package_dir = root / f'package_{index}'
+        package_dir.mkdir()
+        package_dir.joinpath('targets.py').write_text(TARGETS_FILE.format(namespace=f'ns{index}', index=index))
+        package_dir.joinpath('module.py').write_text('x = 1\n')
+
+
+def _time_runs(command: Sequence[str], cwd: Path, env: dict, runs: int) -> List[float]:
+    timings = []
+    for _ in range(runs):
+        start = time.perf_counter()
+        subprocess.run(command, cwd=str(cwd), env=env, stdout=subprocess.DEVNULL, check=True)
+        timings.append((time.perf_counter() - start) * 1e3)
+    return sorted(timings)
+
+
+def main(targets_file_count: int = 200, runs: int = 20) -> None:
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        root = Path(tmp_dir)
+        project_dir = root / 'project'
+        project_dir.mkdir()
+        _create_project(project_dir, targets_file_count)
+        # The caches do not trust an mtime from the last few seconds, so would revalidate
+        # (and rewrite) everything on every run of a project which was only just created
+        time.sleep(RACY_WINDOW_NS / 1e9)
+
+        env = dict(os.environ, HOME=str(root))
+        env[CACHE_DIR_ENV_VAR] = str(root / 'cache')
+        source_root = str(Path(begin.__file__).parent.parent)
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, (source_root, env.get('PYTHONPATH'))))
+        complete = [sys.executable, '-c', COMPLETE, '--complete', 'build_1']
+
+        print(f'Completing in a project of {targets_file_count} targets files (best and median of {runs} runs)')
+        cold, = _time_runs(complete, project_dir, env, 1)
+        print(f'{"cold caches":>20}: {cold:7.1f} ms')
+        for label, command in (('bare interpreter', [sys.executable, '-c', 'pass']), ('--complete', complete)):
+            timings = _time_runs(command, project_dir, env, runs)
+            print(f'{label:>20}: {timings[0]:7.1f} ms best, {timings[len(timings) // 2]:7.1f} ms median')
+        print(f'{"budget":>20}: {BUDGET_MS:7.1f} ms')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,50 @@
+""" Measures the cost of creating registries, which is dominated by capturing the
+path of the file each registry is defined in. Compares `Registry` against the previous
+implementation, which used `inspect.stack()`. Registries are created from below a
+stack of nested frames, as they are when a targets file is executed by `begin`.
+
+Usage (with `begin` installed, e.g. after `poetry install`):
+    python benchmarks/registry_creation.py [registry_count] [stack_depth]
+"""
+import inspect
+import sys
+import timeit
+from pathlib import Path
+
+from begin import registry as registry_module
+from begin.registry import Registry
+
+
+def _legacy_get_calling_context_path() -> Path:
+    stack = inspect.stack()
+    calling_context = next(context for context in stack if context.filename != registry_module.__file__)
+    return Path(calling_context.filename)
+
+
+class LegacyRegistry(Registry):
+
+    _get_calling_context_path = staticmethod(_legacy_get_calling_context_path)
+
+
+def _create_registries(registry_class, registry_count: int, stack_depth: int) -> None:
+    if stack_depth > 0:
+        return _create_registries(registry_class, registry_count, stack_depth - 1)
+    for i in range(registry_count):
+        registry_class(name=f'registry_{i}')
+
+
+def main(registry_count: int = 1000, stack_depth: int = 20, repeat: int = 5) -> None:
+    print(f'Creating {registry_count} registries at a stack depth of {stack_depth} (best of {repeat})')
+    for registry_class in (LegacyRegistry, Registry):
+        timings = timeit.repeat(
+            lambda: _create_registries(registry_class, registry_count, stack_depth),
+            number=1,
+            repeat=repeat,
+        )
+        best = min(timings)
+        per_registry_us = best / registry_count * 1e6
+        print(f'{registry_class.__name__:>16}: {best * 1e3:9.2f} ms total, {per_registry_us:8.2f} us per registry')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,90 @@
+""" Measures the memory footprint and set throughput of `Target`, against the previous
+implementation, which kept a per-instance `__dict__` and rebuilt `repr(self)` on every
+call to `__hash__`.
+
+Usage (with `begin` installed, e.g. after `poetry install`):
+    python benchmarks/target_representation.py [target_count]
+"""
+import sys
+import timeit
+import tracemalloc
+from dataclasses import dataclass
+from typing import (
+    Callable,
+    List,
+    Optional,
+)
+
+from begin.registry import Target
+
+
+@dataclass
+class LegacyTargetOptions:
+    name_override: Optional[str] = None
+
+
+class LegacyTarget:
+
+    def __init__(self, function: Callable, registry_namespace: str, **options: str) -> None:
+        self._function = function
+        self._registry_namespace = registry_namespace
+        self._options = LegacyTargetOptions(**options)
+
+    @property
+    def registry_namespace(self) -> str:
+        return self._registry_namespace
+
+    @property
+    def function_name(self) -> str:
+        return self._options.name_override or self._function.__name__
+
+    def __repr__(self) -> str:
+        class_name = f'{self.__class__.__module__}.{self.__class__.__name__}'
+        return f'<{class_name}(registry_namespace={self.registry_namespace},function_name={self.function_name})>'
+
+    def __hash__(self) -> int:
+        return hash(repr(self))
+
+
+def _target_function():
+    pass
+
+
+def _create_targets(target_class, target_count: int) -> List:
+    return [
+        target_class(_target_function, 'namespace', name_override=f'target_{i}')
+        for i in range(target_count)
+    ]
+
+
+def _measure_memory(target_class, target_count: int) -> int:
+    tracemalloc.start()
+    targets = _create_targets(target_class, target_count)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del targets
+    return size
+
+
+def _fill_and_probe(targets: List) -> None:
+    target_set = set()
+    for target in targets:
+        target_set.add(target)
+    for target in targets:
+        assert target in target_set
+
+
+def main(target_count: int = 50000, repeat: int = 5) -> None:
+    print(f'{target_count} targets (best of {repeat})')
+    for target_class in (LegacyTarget, Target):
+        memory = _measure_memory(target_class, target_count)
+        targets = _create_targets(target_class, target_count)
+        best = min(timeit.repeat(lambda: _fill_and_probe(targets), number=1, repeat=repeat))
+        print(
+            f'{target_class.__name__:>12}: {memory / target_count:7.1f} bytes per target, '
+            f'{best * 1e3:8.2f} ms to insert into and probe a set',
+        )
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
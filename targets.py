@@ -5,14 +5,23 @@ from begin import (
     Registry,
     recipes,
 )
-from begin.utils import str_to_bool
 
 
 local_registry = Registry()
 ci_registry = Registry(name='ci')
 
 
-@local_registry.register_target
+# Everything `recipes.flake8()` reads: the Python files below the working directory, and
+# the files flake8 can be configured in
+@local_registry.register_target(inputs=[
+    'targets.py',
+    'begin/**/*.py',
+    'tests/**/*.py',
+    'benchmarks/**/*.py',
+    'setup.cfg',
+    'tox.ini',
+    '.flake8',
+])
 @ci_registry.register_target
 def check_style():
     recipes.flake8()
@@ -24,14 +33,15 @@ def isort():
 
 
 @local_registry.register_target(name_override='tests')
-def tests_with_coverage(xml_coverage_report=False):
+def tests_with_coverage(xml_coverage_report: bool = False, shards: int = 1):
     """ Note: this approach is only required because we are using `begin` to trigger
     tests of `begin`. When `begin` is used to trigger tests in 3rd party repositories,
     `pytest('--cov', 'package_name')` is sufficient to run tests. `coverage` (and
     therefore `pytest-cov`) reports incorrect coverage data if the package under test
     is imported prior to the invocation of `pytest`. Therefore, immediately before the
     call to `pytest`, we need to remove every `begin` module which was import from
-    `sys.modules`. """
+    `sys.modules`. With `shards` above 1, the tests run in that many processes, which
+    do not import `begin` before coverage starts anyway. """
     import begin
     begin_dir = Path(begin.__file__).parent
 
@@ -43,15 +53,14 @@ def tests_with_coverage(xml_coverage_report=False):
         if module_name.startswith('begin') and module_path.startswith(str(begin_dir)):
             del sys.modules[module_name]
 
-    # TODO do this with arg converters
-    if not isinstance(xml_coverage_report, bool):
-        xml_coverage_report = str_to_bool(xml_coverage_report)
-
     # Use the pytest recipe to run the tests with coverage collection
+    args = ['--cov', 'begin']
     if xml_coverage_report:
-        recipes.pytest('--cov', 'begin', '--cov-report', 'xml')
+        args.extend(['--cov-report', 'xml'])
+    if shards > 1:
+        recipes.pytest_sharded(*args, shards=shards)
     else:
-        recipes.pytest('--cov', 'begin')
+        recipes.pytest(*args)
 
 
 @ci_registry.register_target(name_override='test-coverage')
@@ -66,12 +75,7 @@ def tests_without_coverage():
 
 @local_registry.register_target
 def install():
-    try:
-        recipes.pip('install', '--upgrade', 'pip')
-    except SystemExit as err:
-        if err.code != 0:
-            raise
-
+    recipes.run(recipes.pip, 'install', '--upgrade', 'pip').check()
     recipes.poetry('install')
 
 
@@ -82,32 +86,21 @@ def release():
 
 @ci_registry.register_target
 def setup_poetry_ci():
-    try:
-        # TODO once config reading is done, we can probably
-        # pin the poetry version in `pyproject.toml`, read
-        # it from there into settings, and use settings for
-        # the version below. That way there's one source of
-        # truth.
-        recipes.pip('install', 'poetry==1.1.3')
-    except SystemExit as err:
-        if err.code != 0:
-            raise
-
+    # TODO once config reading is done, we can probably
+    # pin the poetry version in `pyproject.toml`, read
+    # it from there into settings, and use settings for
+    # the version below. That way there's one source of
+    # truth.
+    recipes.run(recipes.pip, 'install', 'poetry==1.1.3').check()
     recipes.poetry('config', 'virtualenvs.create', 'false')
 
 
-@ci_registry.register_target
+@ci_registry.register_target(depends_on=['setup_poetry_ci', 'install@default'])
 def install_ci():
-    try:
-        setup_poetry_ci()
-    except SystemExit as err:
-        if err.code != 0:
-            raise
-
-    install()
+    """ Everything is done by the dependencies. """
 
 
-@ci_registry.register_target
+@ci_registry.register_target(inputs=['begin/**/*.py', 'pyproject.toml', 'README.md'], outputs=['dist/*'])
 def build():
     recipes.poetry('build')
 
@@ -1,13 +1,37 @@
 import inspect
+import os
 import logging
+import subprocess
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
 from unittest import mock
 
 import pytest
 
 from begin.cli import cli
-from begin.cli.parser import ParsedCommand
+from begin.cli.completion import (
+    IndexedTarget,
+    TargetIndex,
+    completion_script,
+)
+from begin.cli.discovery import DiscoveryOptions
+from begin.cli.parser import (
+    ParsedCommand,
+    Request,
+)
 from begin.constants import ExitCodeEnum
-from begin.exceptions import BeginError
+from begin.exceptions import (
+    BeginError,
+    InvalidOptionsError,
+    TargetFailureError,
+    UnknownTargetError,
+)
+from begin.registry import (
+    RegistryManager,
+    Target,
+)
+from begin.stamps import TargetStamp
 
 
 class TestMainPublic:
@@ -71,15 +95,19 @@ class TestMainPrivate:
             requests=requests,
         )
         with mock.patch('begin.cli.cli.load_registries', return_value=registries) as mock_load_registries:
-            with mock.patch('begin.cli.cli.parse_command', return_value=parsed_command) as mock_parse_command:
-                with mock.patch('begin.cli.cli.RegistryManager') as MockRegistryManager:
+            with mock.patch('begin.cli.parser.parse_command', return_value=parsed_command) as mock_parse_command:
+                with mock.patch('begin.registry.RegistryManager') as MockRegistryManager:
+                    MockRegistryManager.create.return_value.get_target.return_value.is_coroutine = False
                     cli._main()
 
         mock_manager = MockRegistryManager.create.return_value
         assert mock_parse_command.call_args_list == [mock.call()]
-        assert mock_load_registries.call_args_list == [mock.call()]
+        assert mock_load_registries.call_args_list == [
+            mock.call(parsed_command.discovery_options, parsed_command.requests),
+        ]
         assert MockRegistryManager.create.call_args_list == [mock.call(registries)]
-        assert mock_manager.get_target.call_count == len(requests)
+        # Every target is looked up once to validate the requests, then again to execute them
+        assert mock_manager.get_target.call_count == 2 * len(requests)
 
         for i in range(len(requests)):
             request = requests[i]
@@ -88,13 +116,33 @@ class TestMainPrivate:
                 request.target_name,
                 request.registry_namespace,
             )
+            assert mock_manager.get_target.call_args_list[len(requests) + i] == get_target_call
+
+    def test_main_registry_loader(self, resource_factory):
+        registries = resource_factory.registry.create_multi()
+        parsed_command = ParsedCommand(extension='*recipes.py', global_dir='~/.recipes', requests=[])
+        registry_loader = mock.Mock(return_value=registries)
+        with mock.patch('begin.cli.cli.load_registries') as mock_load_registries:
+            with mock.patch('begin.cli.parser.parse_command', return_value=parsed_command):
+                with mock.patch('begin.registry.RegistryManager') as MockRegistryManager:
+                    cli._main(registry_loader=registry_loader)
+
+        assert mock_load_registries.call_count == 0
+        assert registry_loader.call_args_list == [mock.call(parsed_command.discovery_options, [])]
+        assert MockRegistryManager.create.call_args_list == [mock.call(registries)]
+
+    @mock.patch('begin.cli.daemon.serve')
+    def test_main_daemon(self, mock_serve):
+        parsed_command = ParsedCommand(extension='*recipes.py', global_dir='~/.recipes', requests=[], daemon=True)
+        with mock.patch('begin.cli.parser.parse_command', return_value=parsed_command):
+            cli._main()
+        assert mock_serve.call_args_list == [mock.call(parsed_command.discovery_options)]
 
 
-@mock.patch('begin.cli.cli.Path.home')
 @mock.patch('begin.cli.cli.Path.cwd')
-def test_collect_target_file_paths(mock_cwd, mock_home, target_file_tmp_tree):
+def test_collect_target_file_paths(mock_cwd, target_file_tmp_tree, monkeypatch):
     mock_cwd.return_value = target_file_tmp_tree.cwd_dir
-    mock_home.return_value = target_file_tmp_tree.home_dir
+    monkeypatch.setenv('HOME', str(target_file_tmp_tree.home_dir))
     target_paths_gen = cli.collect_target_file_paths()
 
     # target_paths_gen should be a generator
@@ -105,6 +153,119 @@ def test_collect_target_file_paths(mock_cwd, mock_home, target_file_tmp_tree):
     assert target_paths == set(target_file_tmp_tree.expected_target_files)
 
 
+@mock.patch('begin.cli.cli.Path.cwd')
+def test_collect_target_file_paths_with_options(mock_cwd, target_file_tmp_tree):
+    # --extension and --global-dir should be honoured
+    mock_cwd.return_value = target_file_tmp_tree.cwd_dir
+    global_dir = target_file_tmp_tree.home_dir / 'other_dir'
+    options = DiscoveryOptions(extension='*_dir_targets.py', global_dir=str(global_dir))
+    target_paths = list(cli.collect_target_file_paths(options))
+    assert target_paths == [
+        target_file_tmp_tree.cwd_dir / 'sub_dir/sub_dir_targets.py',
+        global_dir / 'other_dir_targets.py',
+    ]
+
+
+@mock.patch('begin.cli.cli.Path.cwd')
+def test_collect_target_file_paths_no_duplicates(mock_cwd, target_file_tmp_tree):
+    # If the global directory lives below cwd, its files should only be yielded once
+    mock_cwd.return_value = target_file_tmp_tree.home_dir
+    global_dir = target_file_tmp_tree.home_dir / '.begin'
+    options = DiscoveryOptions(global_dir=str(global_dir))
+    target_paths = list(cli.collect_target_file_paths(options))
+    assert len(target_paths) == len(set(target_paths))
+
+
+@pytest.mark.parametrize('workers', (1, 4))
+@pytest.mark.parametrize('use_cache', (True, False))
+@mock.patch('begin.cli.cli.Path.cwd')
+def test_collect_target_file_paths_with_cache(mock_cwd, target_file_tmp_tree, use_cache, workers):
+    # With or without the discovery index or concurrency, the same files should be
+    # collected, and a warm run should agree with a cold one
+    mock_cwd.return_value = target_file_tmp_tree.cwd_dir
+    options = DiscoveryOptions(
+        global_dir=str(target_file_tmp_tree.home_dir / '.begin'),
+        use_cache=use_cache,
+        workers=workers,
+    )
+    cold_paths = list(cli.collect_target_file_paths(options))
+    warm_paths = list(cli.collect_target_file_paths(options))
+    assert set(cold_paths) == set(target_file_tmp_tree.expected_target_files)
+    assert warm_paths == cold_paths
+
+
+@pytest.mark.parametrize('workers', (1, 4))
+@pytest.mark.parametrize('use_cache', (True, False))
+def test_collect_target_file_paths_symlinked_sub_dir(tmp_path, use_cache, workers):
+    # `a` is a symlink to its sibling `b`, so the targets file in `b` is reachable
+    # from two top-level sub-directories, but should only be collected once
+    (tmp_path / 'b').mkdir()
+    (tmp_path / 'b' / 'x_targets.py').touch()
+    try:
+        os.symlink(str(tmp_path / 'b'), str(tmp_path / 'a'), target_is_directory=True)
+    except (OSError, NotImplementedError):
+        pytest.skip('symlinks are not supported on this platform')
+
+    options = DiscoveryOptions(global_dir=str(tmp_path / 'missing'), use_cache=use_cache, workers=workers)
+    with mock.patch('begin.cli.cli.Path.cwd', return_value=tmp_path):
+        for _ in range(2):
+            assert list(cli.collect_target_file_paths(options)) == [tmp_path / 'a' / 'x_targets.py']
+
+
+@mock.patch('begin.cli.cli.TargetFileWalker')
+@mock.patch('begin.cli.cli.DiscoveryIndex')
+def test_collect_target_file_paths_no_cache(MockDiscoveryIndex, MockTargetFileWalker, tmp_path):
+    options = DiscoveryOptions(global_dir=str(tmp_path / 'missing'), use_cache=False, workers=1)
+    with mock.patch('begin.cli.cli.Path.cwd', return_value=tmp_path):
+        list(cli.collect_target_file_paths(options))
+    assert MockDiscoveryIndex.load.call_count == 0
+    assert MockTargetFileWalker.call_args_list == [mock.call(tmp_path, options.extension, max_depth=None)]
+
+
+@mock.patch('begin.cli.cli.DiscoveryIndex')
+def test_collect_target_file_paths_rebuild_index(MockDiscoveryIndex, tmp_path):
+    options = DiscoveryOptions(global_dir=str(tmp_path / 'missing'), rebuild_index=True, workers=1)
+    with mock.patch('begin.cli.cli.Path.cwd', return_value=tmp_path):
+        list(cli.collect_target_file_paths(options))
+    assert MockDiscoveryIndex.load.call_args_list == [
+        mock.call(tmp_path, options.extension, max_depth=None, rebuild=True),
+    ]
+
+
+@pytest.mark.parametrize('use_cache', (True, False))
+def test_collect_target_file_paths_nearest(target_file_tmp_tree, use_cache):
+    # Running from a directory without targets files, inside a project whose root
+    # holds targets files, should only collect the targets files at the root
+    cwd_dir = target_file_tmp_tree.cwd_dir
+    cwd_dir.joinpath('pyproject.toml').touch()
+    working_dir = cwd_dir / 'empty_dir'
+    working_dir.mkdir()
+    global_dir = target_file_tmp_tree.home_dir / '.begin'
+    options = DiscoveryOptions(global_dir=str(global_dir), use_cache=use_cache, nearest=True)
+
+    with mock.patch('begin.cli.cli.Path.cwd', return_value=working_dir):
+        target_paths = list(cli.collect_target_file_paths(options))
+
+    assert target_paths == [
+        cwd_dir / 'targets.py',
+        global_dir / 'other_targets.py',
+        global_dir / 'targets.py',
+        global_dir / 'sub_dir' / 'sub_dir_targets.py',
+    ]
+
+
+@mock.patch('begin.cli.cli.Path.cwd')
+def test_collect_target_file_paths_max_depth(mock_cwd, target_file_tmp_tree):
+    mock_cwd.return_value = target_file_tmp_tree.cwd_dir
+    global_dir = target_file_tmp_tree.home_dir / '.begin'
+    options = DiscoveryOptions(global_dir=str(global_dir), max_depth=0)
+    assert list(cli.collect_target_file_paths(options)) == [
+        target_file_tmp_tree.cwd_dir / 'targets.py',
+        global_dir / 'other_targets.py',
+        global_dir / 'targets.py',
+    ]
+
+
 def test_load_module_from_path(target_file_tmp_tree):
     # target_file_tmp_tree.file_with_registry is the path of a targets file
     # which actually contains a registry with a single target, called install.
@@ -133,8 +294,721 @@ def test_load_registries(target_file_tmp_tree):
     file = target_file_tmp_tree.file_with_registry
     with mock.patch.object(cli, 'collect_target_file_paths', return_value=[file]) as mock_ctfp:
         registries = cli.load_registries()
-    assert mock_ctfp.call_args_list == [mock.call()]
+    assert mock_ctfp.call_args_list == [mock.call(DiscoveryOptions())]
     assert len(registries) == 1
     registry = registries.pop()
     assert registry.name == 'resource_global'
     assert registry.path == file
+
+
+def test_load_registries_with_requests(target_file_tmp_tree):
+    # Only the targets file which defines the requested namespace should be executed
+    file_with_registry = target_file_tmp_tree.file_with_registry
+    paths = target_file_tmp_tree.expected_target_files
+    requests = [Request('install@resource_global')]
+    with mock.patch.object(cli, 'collect_target_file_paths', return_value=paths):
+        with mock.patch.object(cli, 'load_module_from_path', wraps=cli.load_module_from_path) as mock_load_module:
+            registries = cli.load_registries(requests=requests)
+
+    assert mock_load_module.call_args_list == [mock.call(file_with_registry)]
+    assert [registry.name for registry in registries] == ['resource_global']
+
+
+def test_select_target_file_paths_fallback(target_file_tmp_tree):
+    # If a requested target cannot be located statically, every file should be executed
+    paths = target_file_tmp_tree.expected_target_files
+    requests = [Request('missing@resource_global')]
+    assert cli.select_target_file_paths(paths, requests) == paths
+
+
+def test_load_target_index_from_manifest(target_file_tmp_tree):
+    # When the manifest is conclusive, no targets file should be executed
+    paths = target_file_tmp_tree.expected_target_files
+    with mock.patch.object(cli, 'collect_target_file_paths', return_value=paths):
+        with mock.patch.object(cli, 'load_module_from_path') as mock_load_module:
+            target_index = cli.load_target_index(DiscoveryOptions())
+    assert mock_load_module.call_count == 0
+    assert target_index.complete('inst@') == []
+    assert target_index.complete('install@') == ['install@resource_global']
+
+
+def test_load_target_index_inconclusive(target_file_tmp_tree):
+    # An inconclusive manifest should fall back to executing every targets file
+    paths = target_file_tmp_tree.expected_target_files
+    with mock.patch.object(cli, 'collect_target_file_paths', return_value=paths):
+        with mock.patch.object(cli.TargetManifest, 'conclusive', new_callable=mock.PropertyMock, return_value=False):
+            with mock.patch.object(cli, 'load_module_from_path', wraps=cli.load_module_from_path) as mock_load_module:
+                target_index = cli.load_target_index(DiscoveryOptions())
+    assert mock_load_module.call_count == len(paths)
+    assert target_index.complete('install@') == ['install@resource_global']
+
+
+def test_list_targets(capsys):
+    stub_index = TargetIndex([IndexedTarget('tests', 'ci', '(a, b=1)')])
+    with mock.patch.object(cli, 'load_target_index', return_value=stub_index):
+        cli.list_targets(DiscoveryOptions(), '')
+    assert capsys.readouterr().out == 'tests@ci(a, b=1)\n'
+
+
+def test_complete(capsys):
+    stub_index = TargetIndex([IndexedTarget('tests', 'ci', '()')])
+    with mock.patch.object(cli, 'load_target_index', return_value=stub_index):
+        cli.complete(DiscoveryOptions(), 'te')
+    assert capsys.readouterr().out == 'tests@ci\n'
+
+
+def test_complete_swallows_errors(capsys):
+    with mock.patch.object(cli, 'load_target_index', side_effect=RuntimeError):
+        cli.complete(DiscoveryOptions(), 'te')
+    assert capsys.readouterr().out == ''
+
+
+@pytest.mark.parametrize('argv, completed', (
+    (['begin', '--complete', 'te'], True),
+    (['begin', '--no-cache', '--complete', 'te'], False),
+    (['begin', 'tests'], False),
+))
+def test_main_completion_fast_path(monkeypatch, argv, completed):
+    """ The command the completion scripts run is answered without parsing the command line. """
+    monkeypatch.setattr(sys, 'argv', argv)
+    with mock.patch.object(cli, 'complete') as mock_complete, mock.patch.object(cli, '_main') as mock_private_main:
+        with pytest.raises(SystemExit) as e_info:
+            cli.main()
+    assert e_info.value.code == 0
+    assert mock_complete.call_args_list == ([mock.call(DiscoveryOptions(workers=1), 'te')] if completed else [])
+    assert mock_private_main.call_count == (0 if completed else 1)
+
+
+def test_completion_imports(tmp_path):
+    """ Completing imports none of what running targets needs. """
+    code = (
+        "import sys; sys.argv = ['begin', '--complete', 'te']\n"
+        'from begin.cli.cli import main\n'
+        'try:\n'
+        '    main()\n'
+        'except SystemExit:\n'
+        "    print(' '.join(sorted(name for name in sys.modules if name.startswith(('begin', 'argparse')))))\n"
+    )
+    env = dict(os.environ, HOME=str(tmp_path))
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, (str(Path(cli.__file__).parents[2]), env.get('PYTHONPATH'))))
+    completed = subprocess.run(
+        [sys.executable, '-c', code], cwd=str(tmp_path), env=env, stdout=subprocess.PIPE, check=True, timeout=60,
+    )
+    imported = completed.stdout.decode().split()
+    for module in ('argparse', 'begin.registry', 'begin.cli.parser', 'begin.scheduler', 'begin.stamps'):
+        assert module not in imported
+
+
+@pytest.mark.parametrize('field, value, handler', (
+    ('list_pattern', 'te@ci', 'list_targets'),
+    ('complete', 'te', 'complete'),
+))
+def test_main_listing_modes(field, value, handler):
+    parsed_command = ParsedCommand(extension='*targets.py', global_dir='~/.begin', requests=[])
+    setattr(parsed_command, field, value)
+    with mock.patch('begin.cli.parser.parse_command', return_value=parsed_command):
+        with mock.patch.object(cli, handler) as mock_handler:
+            with mock.patch.object(cli, 'load_registries') as mock_load_registries:
+                cli._main()
+    assert mock_handler.call_args_list == [mock.call(parsed_command.discovery_options, value)]
+    assert mock_load_registries.call_count == 0
+
+
+def test_main_completion_script(capsys):
+    parsed_command = ParsedCommand(extension='*targets.py', global_dir='~/.begin', requests=[], completion_shell='bash')
+    with mock.patch('begin.cli.parser.parse_command', return_value=parsed_command):
+        cli._main()
+    assert capsys.readouterr().out == completion_script('bash')
+
+
+EXIT_CODE_TARGETS = """
+import asyncio
+import sys
+
+from begin.exceptions import RegistryNameCollisionError
+from begin.registry import Registry
+
+registry = Registry()
+
+
+@registry.register_target
+def succeeds(message='done'):
+    print(message)
+
+
+@registry.register_target
+def exits_none():
+    sys.exit()
+
+
+@registry.register_target
+def exits_2():
+    sys.exit(2)
+
+
+@registry.register_target
+def exits_message():
+    sys.exit('failure message')
+
+
+@registry.register_target
+def raises():
+    raise RuntimeError('raised')
+
+
+@registry.register_target
+def raises_begin_error():
+    raise RegistryNameCollisionError({'namespace': []})
+
+
+@registry.register_target(depends_on=['exits_none'])
+def after_exit():
+    print('after exit')
+
+
+@registry.register_target(depends_on=['exits_2'])
+def after_failure():
+    print('after failure')
+
+
+@registry.register_target(depends_on=['succeeds', 'after_exit'])
+def after_both():
+    print('after both')
+
+
+@registry.register_target(depends_on=['missing'])
+def missing_dependency():
+    pass
+
+
+@registry.register_target
+def repeat(times: int, shout=False):
+    print(('HI' if shout else 'hi') * times)
+
+
+@registry.register_target(depends_on=['repeat'])
+def after_repeat():
+    pass
+
+
+events = {}
+
+
+def _event(name):
+    return events.setdefault(name, asyncio.Event())
+
+
+@registry.register_target
+async def ping():
+    # Only finishes if `pong` runs at the same time
+    _event('ping').set()
+    await asyncio.wait_for(_event('pong').wait(), timeout=5)
+    print('ping')
+
+
+@registry.register_target(depends_on=['succeeds'])
+async def pong():
+    _event('pong').set()
+    await asyncio.wait_for(_event('ping').wait(), timeout=5)
+    print('pong')
+
+
+@registry.register_target
+async def async_succeeds():
+    print('async')
+
+
+@registry.register_target
+async def async_fails():
+    sys.exit(3)
+"""
+
+
+@pytest.fixture
+def exit_code_targets_file(tmp_path):
+    path = tmp_path / 'exit_code_targets.py'
+    path.write_text(EXIT_CODE_TARGETS)
+    return path
+
+
+def _request(target_identifier, *options):
+    request = Request(target_identifier)
+    for option in options:
+        request.add_option(option)
+    return request
+
+
+@pytest.mark.parametrize('target_identifier, exit_code', (
+    ('succeeds', 0),
+    ('exits_none', 0),
+    ('exits_2', 2),
+    ('exits_message', 1),
+    ('raises', 1),
+    ('raises_begin_error', ExitCodeEnum.REGISTRY_NAME_COLLISION.value),
+    ('missing', 1),
+    ('async_succeeds', 0),
+    ('async_fails', 3),
+))
+def test_execute_request(exit_code_targets_file, target_identifier, exit_code):
+    assert cli.execute_request([exit_code_targets_file], _request(target_identifier)) == exit_code
+
+
+def test_execute_request_passes_options(exit_code_targets_file, capsys):
+    cli.execute_request([exit_code_targets_file], _request('succeeds', 'message:hello'))
+    assert capsys.readouterr().out == 'hello\n'
+
+
+def _counting_target(exit_code=None, **options):
+    calls = []
+
+    def build(**kwargs):
+        calls.append(kwargs)
+        if exit_code is not None:
+            sys.exit(exit_code)
+    target = Target(function=build, registry_namespace='default', inputs=['*.py'], **options)
+    return target, calls
+
+
+def test_execute_target_skips_up_to_date_target(tmp_path, monkeypatch, caplog):
+    monkeypatch.chdir(tmp_path)
+    tmp_path.joinpath('module.py').write_text('')
+    target, calls = _counting_target()
+    cli.execute_target(target, {})
+    with caplog.at_level(logging.INFO):
+        cli.execute_target(target, {})
+    assert calls == [{}]
+    assert 'build@default is up to date' in caplog.text
+
+    tmp_path.joinpath('module.py').write_text('changed = True\n')
+    cli.execute_target(target, {})
+    assert calls == [{}, {}]
+
+
+def test_execute_target_force(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    target, calls = _counting_target()
+    cli.execute_target(target, {'key': 'value'})
+    cli.execute_target(target, {'key': 'value'}, force=True)
+    assert calls == [{'key': 'value'}, {'key': 'value'}]
+
+
+@pytest.mark.parametrize('exit_code, up_to_date', ((0, True), (2, False)))
+def test_execute_target_exit(tmp_path, monkeypatch, exit_code, up_to_date):
+    # Recipes exit even when they succeed, and only success is recorded
+    monkeypatch.chdir(tmp_path)
+    target, _ = _counting_target(exit_code)
+    with pytest.raises(SystemExit):
+        cli.execute_target(target, {})
+    assert TargetStamp.for_target(target, {}).is_up_to_date() is up_to_date
+
+
+def test_execute_target_cached(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    target, calls = _counting_target(cache=True)
+    cli.execute_target(target, {})
+    # Forcing the target bypasses both the stamp and the cached result
+    cli.execute_target(target, {}, force=True)
+    assert calls == [{}, {}]
+
+    # A stale stamp falls back to the result cache
+    TargetStamp.for_target(target, {}).path.unlink()
+    cli.execute_target(target, {})
+    assert calls == [{}, {}]
+
+
+@pytest.mark.parametrize('action, expected_output', (
+    ('stats', 'Entries: 1\nObjects: 0\n'),
+    ('prune', 'Evicted 0 entries\n'),
+    ('clear', 'Evicted 1 entries\n'),
+))
+def test_manage_result_cache(tmp_path, monkeypatch, capsys, action, expected_output):
+    monkeypatch.chdir(tmp_path)
+    target, _ = _counting_target(cache=True)
+    cli.execute_target(target, {})
+    capsys.readouterr()
+
+    cli.manage_result_cache(action)
+    assert expected_output in capsys.readouterr().out
+
+
+def _load_manager(path):
+    return RegistryManager.create(cli.load_registries_from_paths([path]))
+
+
+def test_execute_requests(exit_code_targets_file, capsys):
+    manager = _load_manager(exit_code_targets_file)
+    cli.execute_requests(manager, [_request('succeeds', 'message:first'), _request('succeeds', 'message:second')])
+    # A target requested twice still runs twice, as it always has
+    assert capsys.readouterr().out == 'first\nsecond\n'
+
+
+def test_execute_requests_requested_target_exits(exit_code_targets_file, capsys):
+    # An exit from a requested target still ends the run, even with status 0
+    manager = _load_manager(exit_code_targets_file)
+    with pytest.raises(SystemExit) as e_info:
+        cli.execute_requests(manager, [_request('exits_none'), _request('succeeds')])
+    assert e_info.value.code is None
+    assert capsys.readouterr().out == ''
+
+
+def test_execute_requests_runs_dependencies_first(exit_code_targets_file, capsys):
+    # The dependency exits with status 0, which should not end the run
+    manager = _load_manager(exit_code_targets_file)
+    cli.execute_requests(manager, [_request('after_exit')])
+    assert capsys.readouterr().out == 'after exit\n'
+
+
+def test_execute_requests_runs_dependencies_once(exit_code_targets_file, capsys):
+    manager = _load_manager(exit_code_targets_file)
+    cli.execute_requests(manager, [_request('after_both'), _request('after_exit')])
+    # `succeeds` and `after_exit` already ran as dependencies of `after_both`, but
+    # `after_exit` was also requested, so it runs again
+    assert capsys.readouterr().out == 'done\nafter exit\nafter both\nafter exit\n'
+
+
+def test_execute_requests_dependency_already_requested(exit_code_targets_file, capsys):
+    manager = _load_manager(exit_code_targets_file)
+    cli.execute_requests(manager, [_request('succeeds'), _request('after_both')])
+    assert capsys.readouterr().out == 'done\nafter exit\nafter both\n'
+
+
+def test_execute_requests_failing_dependency(exit_code_targets_file, capsys):
+    manager = _load_manager(exit_code_targets_file)
+    with pytest.raises(SystemExit) as e_info:
+        cli.execute_requests(manager, [_request('after_failure')])
+    assert e_info.value.code == 2
+    assert capsys.readouterr().out == ''
+
+
+def test_execute_requests_coroutine(exit_code_targets_file, capsys):
+    manager = _load_manager(exit_code_targets_file)
+    cli.execute_requests(manager, [_request('async_succeeds')])
+    assert capsys.readouterr().out == 'async\n'
+
+
+def test_execute_requests_coroutines_run_concurrently(exit_code_targets_file, capsys):
+    manager = _load_manager(exit_code_targets_file)
+    cli.execute_requests(manager, [_request('succeeds', 'message:first'), _request('ping'), _request('pong')])
+    output = capsys.readouterr().out.splitlines()
+    # `succeeds` already ran, so it does not run again as a dependency of `pong`
+    assert output[0] == 'first'
+    assert sorted(output[1:]) == ['ping', 'pong']
+
+
+def test_execute_requests_coroutines_fail_together(exit_code_targets_file, capsys):
+    manager = _load_manager(exit_code_targets_file)
+    with pytest.raises(TargetFailureError) as e_info:
+        cli.execute_requests(manager, [_request('async_fails'), _request('async_succeeds'), _request('succeeds')])
+    assert 'async_fails@default (exit code 3)' in e_info.value.message
+    # The other coroutine target still ran, but the run stopped before the next group
+    assert capsys.readouterr().out == 'async\n'
+
+
+@pytest.mark.parametrize('target_identifier, error_message', (
+    ('missing', 'Could not find target `missing@default`'),
+    (
+        'missing_dependency',
+        'Could not find target `missing@default`, which is a dependency of `missing_dependency@default`',
+    ),
+))
+def test_execute_requests_unknown_target(exit_code_targets_file, target_identifier, error_message):
+    manager = _load_manager(exit_code_targets_file)
+    with pytest.raises(UnknownTargetError) as e_info:
+        cli.execute_requests(manager, [_request(target_identifier)])
+    assert e_info.value.message == error_message
+
+
+def test_execute_requests_converts_options(exit_code_targets_file, capsys):
+    manager = _load_manager(exit_code_targets_file)
+    cli.execute_requests(manager, [_request('repeat', 'times:2', 'shout:yes'), _request('repeat', 'times:1')])
+    assert capsys.readouterr().out == 'HIHI\nhi\n'
+
+
+def test_execute_requests_validates_before_running(exit_code_targets_file, capsys):
+    manager = _load_manager(exit_code_targets_file)
+    requests = [
+        _request('succeeds'),
+        _request('repeat', 'times:two', 'shout:maybe'),
+        _request('after_repeat'),
+        _request('succeeds', 'colour:red'),
+    ]
+    with pytest.raises(InvalidOptionsError) as e_info:
+        cli.execute_requests(manager, requests)
+
+    assert capsys.readouterr().out == ''
+    assert e_info.value.message.splitlines() == [
+        'Found invalid options:',
+        '\trepeat@default: option `times` expects int, got `two`',
+        '\trepeat@default: option `shout` expects bool, got `maybe`',
+        '\tsucceeds@default: unknown option `colour` (expected: message)',
+    ]
+
+
+def test_execute_requests_validates_dependencies(exit_code_targets_file, capsys):
+    # Dependencies run without options
+    manager = _load_manager(exit_code_targets_file)
+    with pytest.raises(InvalidOptionsError, match='repeat@default: missing required option `times`'):
+        cli.execute_requests(manager, [_request('succeeds'), _request('after_repeat')])
+    assert capsys.readouterr().out == ''
+
+
+def test_execute_requests_concurrently_validates_before_running(exit_code_targets_file):
+    with mock.patch.object(cli, 'collect_target_file_paths', return_value=[exit_code_targets_file]):
+        with mock.patch.object(cli, 'execute_request') as mock_execute_request:
+            with pytest.raises(InvalidOptionsError):
+                cli.execute_requests_concurrently(DiscoveryOptions(), [_request('succeeds', 'colour:red')], jobs=2)
+    assert mock_execute_request.call_args_list == []
+
+
+TYPED_TARGETS = """
+from begin.registry import Registry
+
+print('executed')
+
+registry = Registry()
+
+
+@registry.register_target
+def build(version: int, *, release=False):
+    pass
+"""
+
+
+def test_load_registries_checks_options_statically(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    tmp_path.joinpath('targets.py').write_text(TYPED_TARGETS)
+    options = DiscoveryOptions(global_dir=str(tmp_path / 'global'))
+
+    with pytest.raises(InvalidOptionsError) as e_info:
+        cli.load_registries(options, [_request('build', 'version:1.0', 'release:sure')])
+    assert capsys.readouterr().out == ''
+    assert e_info.value.message.splitlines()[1:] == [
+        '\tbuild@default: option `version` expects int, got `1.0`',
+        '\tbuild@default: option `release` expects bool, got `sure`',
+    ]
+
+    assert cli.load_registries(options, [_request('build', 'version:1', 'release:true')])
+    assert capsys.readouterr().out == 'executed\n'
+
+
+def _statuses(statuses):
+    return {target.identifier: status for target, status in statuses.items()}
+
+
+def test_execute_requests_concurrently(exit_code_targets_file):
+    requests = [_request(identifier) for identifier in ('exits_2', 'succeeds', 'raises', 'exits_none')]
+    with mock.patch.object(cli, 'collect_target_file_paths', return_value=[exit_code_targets_file]):
+        statuses = cli.execute_requests_concurrently(DiscoveryOptions(), requests, jobs=2)
+    # Every request should run, and the statuses should be in request order
+    assert list(_statuses(statuses).items()) == [
+        ('exits_2@default', 2),
+        ('succeeds@default', 0),
+        ('raises@default', 1),
+        ('exits_none@default', 0),
+    ]
+
+
+def test_execute_requests_concurrently_with_dependencies(exit_code_targets_file):
+    requests = [_request('after_both'), _request('after_failure')]
+    with mock.patch.object(cli, 'collect_target_file_paths', return_value=[exit_code_targets_file]):
+        statuses = cli.execute_requests_concurrently(DiscoveryOptions(), requests, jobs=2)
+    assert _statuses(statuses) == {
+        'succeeds@default': 0,
+        'exits_none@default': 0,
+        'after_exit@default': 0,
+        'after_both@default': 0,
+        'exits_2@default': 2,
+        # Never runs, since its dependency failed
+        'after_failure@default': None,
+    }
+
+
+def _record_request(calls):
+    def execute_request(paths, request, force):
+        calls.append((paths, request.identifier))
+        return 0
+    return execute_request
+
+
+def test_execute_requests_concurrently_selects_paths(target_file_tmp_tree, exit_code_targets_file):
+    # Each worker should only be handed the targets files defining its target. Threads
+    # stand in for processes, so that the recorded calls are visible here
+    calls = []
+    paths = target_file_tmp_tree.expected_target_files + [exit_code_targets_file]
+    with mock.patch.object(cli, 'collect_target_file_paths', return_value=paths):
+        with mock.patch('concurrent.futures.ProcessPoolExecutor', ThreadPoolExecutor):
+            with mock.patch.object(cli, 'execute_request', side_effect=_record_request(calls)):
+                cli.execute_requests_concurrently(DiscoveryOptions(), [_request('after_exit')], jobs=1)
+    assert calls == [
+        ([exit_code_targets_file], 'exits_none@default'),
+        ([exit_code_targets_file], 'after_exit@default'),
+    ]
+
+
+def test_execute_requests_concurrently_runs_each_target_once(exit_code_targets_file):
+    calls = []
+    requests = [_request('after_both'), _request('after_exit'), _request('succeeds')]
+    with mock.patch.object(cli, 'collect_target_file_paths', return_value=[exit_code_targets_file]):
+        with mock.patch('concurrent.futures.ProcessPoolExecutor', ThreadPoolExecutor):
+            with mock.patch.object(cli, 'execute_request', side_effect=_record_request(calls)):
+                cli.execute_requests_concurrently(DiscoveryOptions(), requests, jobs=4)
+    identifiers = [identifier for _, identifier in calls]
+    assert sorted(identifiers) == sorted(set(identifiers))
+    assert set(identifiers) == {'succeeds@default', 'exits_none@default', 'after_exit@default', 'after_both@default'}
+
+
+def _target(identifier):
+    target_name, _, namespace = identifier.partition('@')
+    return Target(function=lambda: None, registry_namespace=namespace, name_override=target_name)
+
+
+@pytest.mark.parametrize('statuses', (
+    {'first@default': 0, 'second@ci': 0},
+    {'first@default': 0, 'second@ci': 3},
+    {'first@default': 2, 'second@ci': 1},
+    {'first@default': 2, 'second@ci': None},
+))
+def test_main_jobs(statuses, caplog):
+    requests = [_request('first'), _request('second@ci')]
+    parsed_command = ParsedCommand(extension='*targets.py', global_dir='~/.begin', requests=requests, jobs=2)
+    target_statuses = {_target(identifier): status for identifier, status in statuses.items()}
+    with mock.patch('begin.cli.parser.parse_command', return_value=parsed_command):
+        with mock.patch.object(cli, 'execute_requests_concurrently', return_value=target_statuses) as mock_execute:
+            if any(statuses.values()):
+                with pytest.raises(TargetFailureError) as e_info:
+                    cli._main()
+            else:
+                cli._main()
+
+    assert mock_execute.call_args_list == [mock.call(parsed_command.discovery_options, requests, 2, False, 'live')]
+    if any(statuses.values()):
+        assert e_info.value.exit_code == ExitCodeEnum.TARGET_FAILURE.value
+        for identifier, status in statuses.items():
+            assert (f'{identifier} (exit code' in e_info.value.message) is bool(status)
+
+    skipped = [identifier for identifier, status in statuses.items() if status is None]
+    if skipped:
+        assert f'Skipped because a dependency failed: {", ".join(skipped)}' in caplog.text
+
+
+WATCHED_TARGETS = """
+from begin.registry import Registry
+
+registry = Registry(name='{namespace}')
+
+
+@registry.register_target(name_override='{target_name}')
+def target():
+    print('{target_name}@{namespace}')
+"""
+
+
+def _write_targets(path, target_name='first', namespace='watched'):
+    path.write_text(WATCHED_TARGETS.format(target_name=target_name, namespace=namespace))
+    return path
+
+
+def _target_identifiers(manager):
+    return sorted(target.identifier for target in manager.targets())
+
+
+class TestReloadTargetsFiles:
+
+    def test_edited_file(self, tmp_path):
+        path = _write_targets(tmp_path / 'targets.py')
+        manager = _load_manager(path)
+        _write_targets(path, target_name='second')
+        cli.reload_targets_files(manager, [path], '*targets.py')
+        assert _target_identifiers(manager) == ['second@watched']
+
+    def test_renamed_registry(self, tmp_path):
+        path = _write_targets(tmp_path / 'targets.py')
+        manager = _load_manager(path)
+        _write_targets(path, namespace='renamed')
+        cli.reload_targets_files(manager, [path], '*targets.py')
+        assert [registry.name for registry in manager.registries] == ['renamed']
+        assert _target_identifiers(manager) == ['first@renamed']
+
+    def test_deleted_file(self, tmp_path):
+        path = _write_targets(tmp_path / 'targets.py')
+        manager = _load_manager(path)
+        path.unlink()
+        cli.reload_targets_files(manager, [path], '*targets.py')
+        assert manager.registries == []
+
+    def test_new_file(self, tmp_path):
+        manager = _load_manager(_write_targets(tmp_path / 'targets.py'))
+        new_path = _write_targets(tmp_path / 'new_targets.py', namespace='new')
+        other_path = _write_targets(tmp_path / 'not_a_targets_file.py', namespace='other')
+        cli.reload_targets_files(manager, [new_path, other_path], '*targets.py')
+        assert _target_identifiers(manager) == ['first@new', 'first@watched']
+
+    def test_broken_file(self, tmp_path, caplog):
+        path = _write_targets(tmp_path / 'targets.py')
+        manager = _load_manager(path)
+        path.write_text('def broken(:')
+        cli.reload_targets_files(manager, [path], '*targets.py')
+        assert _target_identifiers(manager) == ['first@watched']
+        assert f'Failed to reload {path}' in caplog.text
+
+    def test_collision(self, tmp_path, caplog):
+        manager = _load_manager(_write_targets(tmp_path / 'targets.py'))
+        other_path = _write_targets(tmp_path / 'other_targets.py')
+        collisions = cli.reload_targets_files(manager, [other_path], '*targets.py')
+        assert [registry.path for registry in manager.registries] == [tmp_path / 'targets.py']
+        assert list(collisions) == [other_path]
+        assert collisions[other_path].colliding_namespaces == {'watched': [tmp_path / 'targets.py', other_path]}
+        assert 'Found multiple registries with name `watched`' in caplog.text
+
+
+class FakeWatcher:
+    """ Reports each of `changes` in turn, then stops the watch. """
+
+    def __init__(self, changes, before_change=lambda: None):
+        self._changes = list(changes)
+        self._before_change = before_change
+        self.closed = False
+
+    def wait_for_changes(self):
+        if not self._changes:
+            raise KeyboardInterrupt
+        self._before_change()
+        return self._changes.pop(0)
+
+    def discard_changes(self):
+        pass
+
+    def close(self):
+        self.closed = True
+
+
+def test_watch_requests(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    path = _write_targets(tmp_path / 'targets.py')
+    messages = iter(['edited', 'not reloaded'])
+
+    def edit():
+        path.write_text(path.read_text().replace("print('first@watched')", f"print('{next(messages)}')"))
+
+    # Only the first change reports the targets file, so only the first edit is reloaded
+    watcher = FakeWatcher([{path}, {tmp_path / 'unrelated.py'}], before_change=edit)
+    options = DiscoveryOptions(global_dir=str(tmp_path / 'missing'), use_cache=False)
+    with mock.patch('begin.cli.watch.create_watcher', return_value=watcher) as mock_create_watcher:
+        with mock.patch('begin.cli.watch.purge_project_modules') as mock_purge:
+            cli.watch_requests(options, [_request('first@watched')])
+
+    assert capsys.readouterr().out == 'first@watched\nedited\nedited\n'
+    assert mock_create_watcher.call_args_list == [mock.call([tmp_path])]
+    assert mock_purge.call_args_list == [mock.call([tmp_path])] * 2
+    assert watcher.closed
+
+
+def test_watch_requests_survives_failures(tmp_path, monkeypatch, capsys):
+    monkeypatch.chdir(tmp_path)
+    path = tmp_path / 'exit_code_targets.py'
+    path.write_text(EXIT_CODE_TARGETS)
+    watcher = FakeWatcher([{path}])
+    options = DiscoveryOptions(global_dir=str(tmp_path / 'missing'), use_cache=False)
+    with mock.patch('begin.cli.watch.create_watcher', return_value=watcher):
+        cli.watch_requests(options, [_request('exits_2')])
+    assert capsys.readouterr().err.count('Finished with exit status 2') == 2
@@ -0,0 +1,117 @@
+import os
+import socket
+import threading
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from begin.cli import (
+    client,
+    daemon,
+)
+
+
+def test_get_socket_path(isolated_cache_dir, tmp_path):
+    socket_path = client.get_socket_path(tmp_path)
+    assert socket_path.parent == isolated_cache_dir / 'daemon'
+    assert socket_path.suffix == '.sock'
+    assert socket_path == client.get_socket_path(tmp_path)
+    assert socket_path != client.get_socket_path(tmp_path / 'other')
+
+
+def test_find_socket(tmp_path):
+    nested = tmp_path / 'a' / 'b'
+    assert client.find_socket(nested) is None
+
+    socket_path = client.get_socket_path(tmp_path)
+    socket_path.parent.mkdir(parents=True)
+    socket_path.touch()
+    assert client.find_socket(nested) == socket_path
+    assert client.find_socket(tmp_path) == socket_path
+
+
+def test_forward_without_daemon(tmp_path):
+    # Nothing is listening on a stale socket
+    socket_path = tmp_path / 'stale.sock'
+    socket_path.touch()
+    assert client.forward(socket_path, ['begin'], tmp_path, {}) is None
+
+
+@pytest.fixture
+def serve_once(tmp_path):
+    """ Listens on a socket in `tmp_path`, and answers a single request with `status`,
+    recording the request and the number of file descriptors received. """
+    socket_path = tmp_path / 'test.sock'
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(socket_path))
+    server.listen()
+    received = {}
+
+    def serve(status):
+        connection, _ = server.accept()
+        with connection:
+            header, file_descriptors = daemon._receive_request(connection)
+            for file_descriptor in file_descriptors:
+                os.close(file_descriptor)
+            received.update(header=header, file_descriptor_count=len(file_descriptors))
+            if status is not None:
+                connection.sendall(f'{status}\n'.encode())
+
+    def start(status):
+        thread = threading.Thread(target=serve, args=(status,))
+        thread.start()
+        return thread
+
+    yield socket_path, start, received
+    server.close()
+
+
+@pytest.mark.parametrize('status', (0, 4))
+def test_forward(tmp_path, serve_once, status):
+    socket_path, start, received = serve_once
+    thread = start(status)
+    result = client.forward(socket_path, ['begin', 'tests'], tmp_path, {'KEY': 'value'})
+    thread.join()
+
+    assert result == status
+    assert received['header'] == {'argv': ['begin', 'tests'], 'cwd': str(tmp_path), 'env': {'KEY': 'value'}}
+    assert received['file_descriptor_count'] == len(client.FORWARDED_FILE_DESCRIPTORS)
+
+
+def test_forward_daemon_exited(tmp_path, serve_once, capsys):
+    socket_path, start, _ = serve_once
+    thread = start(None)
+    result = client.forward(socket_path, ['begin'], tmp_path, {})
+    thread.join()
+
+    assert result == 1
+    assert 'the daemon exited' in capsys.readouterr().err
+
+
+@mock.patch('begin.cli.client.forward', return_value=4)
+def test_main_forwards(mock_forward, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    socket_path = client.get_socket_path(tmp_path)
+    socket_path.parent.mkdir(parents=True)
+    socket_path.touch()
+
+    with mock.patch('sys.argv', ['begin-client', 'tests']):
+        with pytest.raises(SystemExit) as exc_info:
+            client.main()
+
+    assert exc_info.value.code == 4
+    assert mock_forward.call_args[0][:3] == (socket_path, ['begin-client', 'tests'], Path.cwd())
+
+
+@pytest.mark.parametrize('stale_socket', (False, True))
+@mock.patch('begin.cli.cli.main')
+def test_main_falls_back(mock_begin_main, tmp_path, monkeypatch, stale_socket):
+    monkeypatch.chdir(tmp_path)
+    if stale_socket:
+        socket_path = client.get_socket_path(tmp_path)
+        socket_path.parent.mkdir(parents=True)
+        socket_path.touch()
+
+    client.main()
+    mock_begin_main.assert_called_once_with()
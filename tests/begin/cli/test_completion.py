@@ -0,0 +1,97 @@
+import pytest
+
+from begin.cli import completion
+from begin.cli.completion import (
+    IndexedTarget,
+    TargetIndex,
+)
+from begin.cli.manifest import (
+    ManifestTarget,
+    ModuleManifest,
+    TargetManifest,
+)
+from begin.constants import DEFAULT_REGISTRY_NAME
+from begin.registry import RegistryManager
+
+
+@pytest.fixture
+def target_index():
+    return TargetIndex([
+        IndexedTarget('tests', DEFAULT_REGISTRY_NAME, '(xml_coverage_report=False)'),
+        IndexedTarget('tests', 'ci', '()'),
+        IndexedTarget('test-coverage', 'ci', '()'),
+        IndexedTarget('build', 'ci', '()'),
+        IndexedTarget('install', DEFAULT_REGISTRY_NAME, '()'),
+    ])
+
+
+def test_indexed_target_names():
+    default_target = IndexedTarget('tests', DEFAULT_REGISTRY_NAME, '()')
+    assert default_target.qualified_name == f'tests@{DEFAULT_REGISTRY_NAME}'
+    assert default_target.short_name == 'tests'
+
+    ci_target = IndexedTarget('tests', 'ci', '()')
+    assert ci_target.qualified_name == ci_target.short_name == 'tests@ci'
+
+
+@pytest.mark.parametrize('pattern, expected', (
+    ('', [
+        'build@ci',
+        'install@default',
+        'test-coverage@ci',
+        'tests@ci',
+        'tests@default',
+    ]),
+    ('te', ['test-coverage@ci', 'tests@ci', 'tests@default']),
+    ('tests', ['tests@ci', 'tests@default']),
+    ('te@ci', ['test-coverage@ci', 'tests@ci']),
+    ('@default', ['install@default', 'tests@default']),
+    ('missing', []),
+))
+def test_list_targets(target_index, pattern, expected):
+    assert [target.qualified_name for target in target_index.list_targets(pattern)] == expected
+
+
+@pytest.mark.parametrize('word, expected', (
+    ('', ['build@ci', 'install', 'test-coverage@ci', 'tests', 'tests@ci']),
+    ('te', ['test-coverage@ci', 'tests', 'tests@ci']),
+    ('tests@', ['tests@ci', 'tests@default']),
+    ('tests@c', ['tests@ci']),
+    ('z', []),
+))
+def test_complete(target_index, word, expected):
+    assert target_index.complete(word) == expected
+
+
+def test_from_manifest(tmp_path):
+    manifest = TargetManifest([
+        ModuleManifest(
+            path=tmp_path / 'targets.py',
+            namespaces={'ci'},
+            targets=[ManifestTarget(name='tests', namespace='ci', qualname='ci_tests', signature='(a)')],
+        ),
+    ])
+    target_index = TargetIndex.from_manifest(manifest)
+    assert target_index.list_targets() == [IndexedTarget('tests', 'ci', '(a)')]
+
+
+def test_from_registry_manager(resource_factory):
+    registries = resource_factory.registry.create_multi()
+    manager = RegistryManager.create(registries)
+    target_index = TargetIndex.from_registry_manager(manager)
+
+    expected = sorted(
+        (target.function_name, target.registry_namespace)
+        for registry in registries
+        for target in registry.targets
+    )
+    assert [(t.name, t.namespace) for t in target_index.list_targets()] == expected
+
+
+@pytest.mark.parametrize('shell', ('bash', 'zsh', 'fish'))
+def test_completion_script(shell):
+    assert 'begin --complete' in completion.completion_script(shell)
+
+
+def test_completion_script_unknown_shell():
+    assert completion.completion_script('cmd') is None
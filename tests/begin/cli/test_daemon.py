@@ -0,0 +1,232 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import pytest
+
+import begin
+from begin.cli import (
+    client,
+    daemon,
+)
+from begin.cli.discovery import DiscoveryOptions
+from begin.constants import ExitCodeEnum
+from begin.exceptions import (
+    DaemonError,
+    RegistryNameCollisionError,
+)
+
+
+DAEMON_TARGETS = """
+from begin.registry import Registry
+
+registry = Registry(name='daemon')
+
+
+@registry.register_target(name_override='{target_name}')
+def target():
+    print('{target_name}@daemon')
+
+
+@registry.register_target
+def fails():
+    raise SystemExit(3)
+"""
+
+
+def _write_targets(path, target_name='first'):
+    path.write_text(DAEMON_TARGETS.format(target_name=target_name))
+    # Make sure the change is seen, however coarse the file system's timestamps
+    stat_result = path.stat()
+    os.utime(str(path), ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns + 10 ** 9))
+    return path
+
+
+def _write_registry(path, namespace):
+    path.write_text(f'from begin.registry import Registry\nregistry = Registry(name={namespace!r})\n')
+    stat_result = path.stat()
+    os.utime(str(path), ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns + 10 ** 9))
+    return path
+
+
+def _target_names(warm_registries):
+    return sorted(target.identifier for target in warm_registries.manager.targets())
+
+
+@pytest.fixture
+def options(tmp_path):
+    return DiscoveryOptions(global_dir=str(tmp_path / 'global'), use_cache=False)
+
+
+def test_warm_up():
+    assert daemon.warm_up(('json', 'not_a_real_module')) == ['json']
+
+
+class TestWarmRegistries:
+
+    def test_refresh(self, tmp_path, monkeypatch, options):
+        monkeypatch.chdir(tmp_path)
+        path = _write_targets(tmp_path / 'targets.py')
+        warm_registries = daemon.WarmRegistries(tmp_path, options)
+        warm_registries.refresh()
+        assert _target_names(warm_registries) == ['fails@daemon', 'first@daemon']
+
+        _write_targets(path, target_name='second')
+        warm_registries.refresh()
+        assert _target_names(warm_registries) == ['fails@daemon', 'second@daemon']
+
+        path.unlink()
+        warm_registries.refresh()
+        assert _target_names(warm_registries) == []
+
+    def test_unchanged_files_are_not_reloaded(self, tmp_path, monkeypatch, options):
+        monkeypatch.chdir(tmp_path)
+        _write_targets(tmp_path / 'targets.py')
+        warm_registries = daemon.WarmRegistries(tmp_path, options)
+        warm_registries.refresh()
+        registries = warm_registries.manager.registries
+
+        warm_registries.refresh()
+        assert warm_registries.manager.registries == registries
+
+    def test_load_registries(self, tmp_path, monkeypatch, options):
+        monkeypatch.chdir(tmp_path)
+        _write_targets(tmp_path / 'targets.py')
+        warm_registries = daemon.WarmRegistries(tmp_path, options)
+        warm_registries.refresh()
+        assert warm_registries.load_registries(options, []) == warm_registries.manager.registries
+
+        # Commands which discover targets files differently are served from disk
+        other_options = DiscoveryOptions(global_dir=options.global_dir, use_cache=False, nearest=True)
+        registries = warm_registries.load_registries(other_options, [])
+        assert [registry.name for registry in registries] == ['daemon']
+        assert registries != warm_registries.manager.registries
+
+    def test_collision(self, tmp_path, monkeypatch, options):
+        monkeypatch.chdir(tmp_path)
+        path = _write_targets(tmp_path / 'targets.py')
+        warm_registries = daemon.WarmRegistries(tmp_path, options)
+        warm_registries.refresh()
+
+        other_path = _write_registry(tmp_path / 'other_targets.py', 'daemon')
+        warm_registries.refresh()
+        with pytest.raises(RegistryNameCollisionError) as e_info:
+            warm_registries.load_registries(options, [])
+        assert e_info.value.colliding_namespaces == {'daemon': [path, other_path]}
+
+        # Once the other file gives up the name, the colliding file is loaded, though unchanged
+        _write_registry(path, 'renamed')
+        warm_registries.refresh()
+        registries = warm_registries.load_registries(options, [])
+        assert sorted((registry.name, registry.path) for registry in registries) == [
+            ('daemon', other_path),
+            ('renamed', path),
+        ]
+
+
+class TestBind:
+
+    def test_stale_socket(self, tmp_path):
+        socket_path = tmp_path / 'sockets' / 'test.sock'
+        socket_path.parent.mkdir()
+        socket_path.touch()
+        server = daemon._bind(socket_path)
+        server.close()
+        assert oct(socket_path.stat().st_mode & 0o777) == oct(0o600)
+
+    def test_live_socket(self, tmp_path):
+        socket_path = tmp_path / 'test.sock'
+        server = daemon._bind(socket_path)
+        with server:
+            with pytest.raises(DaemonError, match='already listening'):
+                daemon._bind(socket_path)
+
+
+def _python(code, *args):
+    return [sys.executable, '-c', code, *args]
+
+
+def _environment():
+    """ `begin` may not be installed in the environment running the tests. """
+    env = dict(os.environ)
+    source_root = str(Path(begin.__file__).parent.parent)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, (source_root, env.get('PYTHONPATH'))))
+    return env
+
+
+@pytest.fixture
+def running_daemon(tmp_path, options):
+    _write_targets(tmp_path / 'targets.py')
+    process = subprocess.Popen(
+        _python('from begin.cli.cli import main; main()', '--daemon', '--global-dir', options.global_dir),
+        cwd=str(tmp_path),
+        env=_environment(),
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.PIPE,
+    )
+    socket_path = client.get_socket_path(tmp_path.resolve())
+    deadline = time.monotonic() + 30
+    while not socket_path.exists():
+        if process.poll() is not None or time.monotonic() > deadline:
+            process.kill()
+            pytest.fail(f'The daemon did not start: {process.communicate()[1].decode()}')
+        time.sleep(0.05)
+
+    yield process, socket_path
+    if process.poll() is None:
+        process.kill()
+        process.wait()
+
+
+def _run_client(cwd, *args):
+    return subprocess.run(
+        _python('from begin.cli.client import main; main()', *args, '--global-dir', str(cwd / 'global')),
+        cwd=str(cwd),
+        env=_environment(),
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        timeout=30,
+    )
+
+
+@pytest.mark.skipif(not hasattr(os, 'fork'), reason='The daemon needs fork')
+def test_daemon(tmp_path, running_daemon):
+    process, socket_path = running_daemon
+
+    result = _run_client(tmp_path, 'first@daemon')
+    assert result.returncode == 0
+    assert result.stdout.decode() == 'first@daemon\n'
+
+    _write_targets(tmp_path / 'targets.py', target_name='second')
+    result = _run_client(tmp_path, 'second@daemon')
+    assert result.returncode == 0
+    assert result.stdout.decode() == 'second@daemon\n'
+
+    assert _run_client(tmp_path, 'fails@daemon').returncode == 3
+    assert _run_client(tmp_path, 'unknown@daemon').returncode == 5
+
+    # A collision fails every request, as it would without the daemon, until it is resolved
+    colliding_path = _write_registry(tmp_path / 'other_targets.py', 'daemon')
+    result = _run_client(tmp_path, 'second@daemon')
+    assert result.returncode == ExitCodeEnum.REGISTRY_NAME_COLLISION.value
+    assert 'Found multiple registries with name `daemon`' in result.stderr.decode()
+    colliding_path.unlink()
+    assert _run_client(tmp_path, 'second@daemon').returncode == 0
+
+    process.send_signal(signal.SIGTERM)
+    assert process.wait(timeout=30) == 0
+    assert not socket_path.exists()
+
+    # Without the daemon, commands run in the client
+    result = _run_client(tmp_path, 'second@daemon')
+    assert result.returncode == 0
+    assert result.stdout.decode() == 'second@daemon\n'
+
+
+def test_serve_refuses_second_daemon(tmp_path, monkeypatch, running_daemon, options):
+    monkeypatch.chdir(tmp_path.resolve())
+    with pytest.raises(DaemonError, match='already listening'):
+        daemon.serve(options)
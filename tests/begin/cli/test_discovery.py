@@ -0,0 +1,298 @@
+import os
+import threading
+from unittest import mock
+
+import pytest
+
+from begin.cli import discovery
+
+
+def _touch(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+    return path
+
+
+@pytest.mark.parametrize('pattern, path, is_dir, matches', (
+    ('build', 'build', True, True),
+    ('build', 'nested/build', True, True),
+    ('build', 'build.py', False, False),
+    ('build/', 'build', True, True),
+    ('build/', 'build', False, False),
+    ('/build', 'build', True, True),
+    ('/build', 'nested/build', True, False),
+    ('nested/*.py', 'nested/targets.py', False, True),
+    ('nested/*.py', 'nested/deeper/targets.py', False, False),
+    ('nested/**/*.py', 'nested/deeper/targets.py', False, True),
+    ('**/gen_*', 'a/b/gen_targets.py', False, True),
+    ('targets?.py', 'targets1.py', False, True),
+    ('targets[!0-9].py', 'targets1.py', False, False),
+))
+def test_ignore_rule_matches(tmp_path, pattern, path, is_dir, matches):
+    rule = discovery.IgnoreRule(pattern, str(tmp_path))
+    assert rule.matches(os.path.join(str(tmp_path), path), is_dir) is matches
+
+
+def test_ignore_rule_outside_base_dir(tmp_path):
+    # Rules only apply below the directory holding the ignore file
+    rule = discovery.IgnoreRule('*', str(tmp_path / 'sub_dir'))
+    assert not rule.matches(str(tmp_path / 'other_dir' / 'targets.py'), is_dir=False)
+
+
+def test_parse_ignore_file(tmp_path):
+    ignore_file = tmp_path / '.gitignore'
+    ignore_file.write_text('# a comment\n\nbuild/\n!keep_targets.py\n')
+    rules = discovery.parse_ignore_file(str(ignore_file))
+    assert len(rules) == 2
+    assert rules[0].directory_only
+    assert rules[1].negated
+    # .gitignore patterns only prune directories
+    assert not any(rule.applies_to_files for rule in rules)
+
+
+def test_parse_beginignore_file(tmp_path):
+    ignore_file = tmp_path / '.beginignore'
+    ignore_file.write_text('scratch_*\n')
+    rule, = discovery.parse_ignore_file(str(ignore_file))
+    assert rule.applies_to_files
+    assert rule.matches(str(tmp_path / 'scratch_targets.py'), is_dir=False)
+
+
+def test_ignore_rule_directories_only(tmp_path):
+    rule = discovery.IgnoreRule('*targets*', str(tmp_path), applies_to_files=False)
+    assert rule.matches(str(tmp_path / 'targets_dir'), is_dir=True)
+    assert not rule.matches(str(tmp_path / 'targets.py'), is_dir=False)
+
+
+def test_parse_ignore_file_missing(tmp_path):
+    assert discovery.parse_ignore_file(str(tmp_path / '.gitignore')) == []
+
+
+def test_is_ignored_last_match_wins(tmp_path):
+    base_dir = str(tmp_path)
+    rules = [
+        discovery.IgnoreRule('*targets.py', base_dir),
+        discovery.IgnoreRule('!keep_targets.py', base_dir),
+    ]
+    assert discovery.is_ignored(rules, str(tmp_path / 'targets.py'), is_dir=False)
+    assert not discovery.is_ignored(rules, str(tmp_path / 'keep_targets.py'), is_dir=False)
+
+
+@pytest.mark.parametrize('name, excluded', (
+    ('.git', True),
+    ('node_modules', True),
+    ('begin_cli.egg-info', True),
+    ('.begin', False),
+    ('sub_dir', False),
+))
+def test_is_excluded_dir(name, excluded):
+    assert discovery.is_excluded_dir(name) is excluded
+
+
+def test_scan_directory(tmp_path):
+    _touch(tmp_path / 'targets.py')
+    _touch(tmp_path / 'app.py')
+    _touch(tmp_path / 'sub_dir' / 'targets.py')
+    _touch(tmp_path / '.git' / 'targets.py')
+    (tmp_path / '.beginignore').write_text('ignored_dir/\n')
+    _touch(tmp_path / 'ignored_dir' / 'targets.py')
+
+    scan = discovery.scan_directory(str(tmp_path))
+
+    assert scan.target_files == [str(tmp_path / 'targets.py')]
+    assert scan.sub_dirs == [str(tmp_path / 'sub_dir')]
+    assert len(scan.rules) == 1
+
+
+def test_scan_directory_missing(tmp_path):
+    assert discovery.scan_directory(str(tmp_path / 'missing')) is None
+
+
+def test_find_target_files(target_file_tmp_tree):
+    target_files = list(discovery.find_target_files(target_file_tmp_tree.cwd_dir))
+    assert target_files == [
+        target_file_tmp_tree.cwd_dir / 'targets.py',
+        target_file_tmp_tree.cwd_dir / 'sub_dir' / 'sub_dir_targets.py',
+    ]
+
+
+def test_find_target_files_extension(target_file_tmp_tree):
+    root = target_file_tmp_tree.home_dir / '.begin'
+    target_files = list(discovery.find_target_files(root, extension='targets.js'))
+    assert target_files == [root / 'sub_dir' / 'targets.js']
+
+
+def test_find_target_files_prunes_excluded_and_ignored_dirs(tmp_path):
+    expected = _touch(tmp_path / 'src' / 'targets.py')
+    _touch(tmp_path / 'node_modules' / 'pkg' / 'targets.py')
+    _touch(tmp_path / '.venv' / 'lib' / 'targets.py')
+    _touch(tmp_path / 'generated' / 'targets.py')
+    _touch(tmp_path / 'src' / 'scratch_targets.py')
+    (tmp_path / '.gitignore').write_text('generated/\n')
+    (tmp_path / 'src' / '.beginignore').write_text('scratch_*\n')
+
+    assert list(discovery.find_target_files(tmp_path)) == [expected]
+
+
+def test_find_target_files_git_ignored_targets_file(tmp_path):
+    # A git-ignored targets file is a personal one, and should still be loaded
+    (tmp_path / '.gitignore').write_text('local_targets.py\n')
+    expected = _touch(tmp_path / 'local_targets.py')
+    assert list(discovery.find_target_files(tmp_path)) == [expected]
+
+
+def test_find_target_files_nested_negation(tmp_path):
+    (tmp_path / '.beginignore').write_text('*targets.py\n')
+    _touch(tmp_path / 'targets.py')
+    expected = _touch(tmp_path / 'sub_dir' / 'targets.py')
+    (tmp_path / 'sub_dir' / '.beginignore').write_text('!targets.py\n')
+
+    assert list(discovery.find_target_files(tmp_path)) == [expected]
+
+
+def test_find_target_files_symlink_loop(tmp_path):
+    expected = _touch(tmp_path / 'sub_dir' / 'targets.py')
+    try:
+        os.symlink(str(tmp_path), str(tmp_path / 'sub_dir' / 'loop'), target_is_directory=True)
+    except (OSError, NotImplementedError):
+        pytest.skip('symlinks are not supported on this platform')
+
+    # The loop should not be followed, so each file is found exactly once
+    assert list(discovery.find_target_files(tmp_path)) == [expected]
+
+
+@pytest.mark.parametrize('max_depth, expected_subpaths', (
+    (0, ['targets.py']),
+    (1, ['targets.py', 'a/targets.py']),
+    (None, ['targets.py', 'a/targets.py', 'a/b/targets.py']),
+))
+def test_find_target_files_max_depth(tmp_path, max_depth, expected_subpaths):
+    for subpath in ('targets.py', 'a/targets.py', 'a/b/targets.py'):
+        _touch(tmp_path / subpath)
+    target_files = list(discovery.find_target_files(tmp_path, max_depth=max_depth))
+    assert target_files == [tmp_path / subpath for subpath in expected_subpaths]
+
+
+@pytest.mark.parametrize('marker', ('.git', 'pyproject.toml'))
+def test_find_project_root(tmp_path, marker):
+    project_root = tmp_path / 'project'
+    start = project_root / 'a' / 'b'
+    start.mkdir(parents=True)
+    _touch(project_root / marker)
+    assert discovery.find_project_root(start) == project_root
+
+
+def test_find_project_root_not_in_project(tmp_path):
+    assert discovery.find_project_root(tmp_path, markers=('no_such_marker',)) is None
+
+
+def test_find_nearest_scope(tmp_path):
+    project_root = tmp_path / 'project'
+    _touch(project_root / 'pyproject.toml')
+    _touch(project_root / 'targets.py')
+    _touch(project_root / 'a' / 'targets.py')
+    start = project_root / 'a' / 'b'
+    start.mkdir()
+
+    # The closest directory holding targets files wins
+    assert discovery.find_nearest_scope(start) == project_root / 'a'
+    assert discovery.find_nearest_scope(project_root) == project_root
+
+
+def test_find_nearest_scope_stops_at_project_root(tmp_path):
+    # targets files above the project root should not be found
+    _touch(tmp_path / 'targets.py')
+    project_root = tmp_path / 'project'
+    _touch(project_root / '.git' / 'HEAD')
+    assert discovery.find_nearest_scope(project_root) is None
+
+
+def test_discovery_options_local_max_depth():
+    assert discovery.DiscoveryOptions().local_max_depth is None
+    assert discovery.DiscoveryOptions(nearest=True).local_max_depth == 0
+    assert discovery.DiscoveryOptions(nearest=True, max_depth=2).local_max_depth == 2
+    assert discovery.DiscoveryOptions(max_depth=2).local_max_depth == 2
+
+
+@pytest.fixture
+def wide_tree(tmp_path):
+    """ Two roots, each with targets files at the top level and in several
+    nested sub-directories. """
+    roots = [tmp_path / 'root_1', tmp_path / 'root_2']
+    for root in roots:
+        _touch(root / 'targets.py')
+        for sub_dir in ('a', 'b', 'c', 'd'):
+            _touch(root / sub_dir / 'targets.py')
+            _touch(root / sub_dir / 'nested' / 'nested_targets.py')
+    return roots
+
+
+def test_walker_subclass_must_implement_visit(tmp_path):
+    class RootOnlyWalker(discovery.Walker):
+        def _root_item(self):
+            return str(self.root), (), 0
+
+    with pytest.raises(TypeError):
+        RootOnlyWalker(tmp_path)
+
+
+@pytest.mark.parametrize('max_workers', (1, 2, 8))
+def test_find_target_files_concurrently_matches_serial_order(wide_tree, max_workers):
+    serial = [path for root in wide_tree for path in discovery.find_target_files(root)]
+    walkers = [discovery.TargetFileWalker(root) for root in wide_tree]
+    assert list(discovery.find_target_files_concurrently(walkers, max_workers)) == serial
+
+
+def test_find_target_files_concurrently_uses_threads(wide_tree):
+    thread_names = set()
+    real_scan_directory = discovery.scan_directory
+
+    def recording_scan_directory(*args, **kwargs):
+        thread_names.add(threading.current_thread().name)
+        return real_scan_directory(*args, **kwargs)
+
+    walkers = [discovery.TargetFileWalker(root) for root in wide_tree]
+    with mock.patch.object(discovery, 'scan_directory', side_effect=recording_scan_directory):
+        list(discovery.find_target_files_concurrently(walkers, max_workers=4))
+
+    # No work should happen on the calling thread
+    assert threading.current_thread().name not in thread_names
+
+
+def test_find_target_files_concurrently_calls_finish(wide_tree):
+    walkers = [discovery.TargetFileWalker(root) for root in wide_tree]
+    with mock.patch.object(discovery.TargetFileWalker, 'finish') as mock_finish:
+        list(discovery.find_target_files_concurrently(walkers, max_workers=2))
+    assert mock_finish.call_count == len(walkers)
+
+
+def test_find_target_files_concurrently_stops_early(wide_tree):
+    walkers = [discovery.TargetFileWalker(root) for root in wide_tree]
+    paths = discovery.find_target_files_concurrently(walkers, max_workers=2)
+    assert next(paths) == wide_tree[0] / 'targets.py'
+    # Closing the generator should not raise, or walk to completion first
+    paths.close()
+
+
+def test_find_target_files_concurrently_symlink_loop(tmp_path):
+    expected = _touch(tmp_path / 'sub_dir' / 'targets.py')
+    try:
+        os.symlink(str(tmp_path), str(tmp_path / 'sub_dir' / 'loop'), target_is_directory=True)
+    except (OSError, NotImplementedError):
+        pytest.skip('symlinks are not supported on this platform')
+
+    walkers = [discovery.TargetFileWalker(tmp_path)]
+    assert list(discovery.find_target_files_concurrently(walkers, max_workers=2)) == [expected]
+
+
+def test_find_target_files_concurrently_symlinked_sibling(tmp_path):
+    _touch(tmp_path / 'b' / 'nested' / 'targets.py')
+    try:
+        os.symlink(str(tmp_path / 'b'), str(tmp_path / 'a'), target_is_directory=True)
+    except (OSError, NotImplementedError):
+        pytest.skip('symlinks are not supported on this platform')
+
+    serial = list(discovery.find_target_files(tmp_path))
+    walkers = [discovery.TargetFileWalker(tmp_path)]
+    assert list(discovery.find_target_files_concurrently(walkers, max_workers=4)) == serial
+    assert serial == [tmp_path / 'a' / 'nested' / 'targets.py']
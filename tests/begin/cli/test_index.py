@@ -0,0 +1,184 @@
+import os
+from unittest import mock
+
+import pytest
+
+from begin.cli import index
+from begin.cli.discovery import (
+    find_target_files,
+    find_target_files_concurrently,
+)
+from begin.cli.index import DiscoveryIndex
+
+
+def _touch(path):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.touch()
+    return path
+
+
+def _age(path, seconds=60):
+    """ Push the mtime of `path` outside of the racy window, so the index trusts it. """
+    stat_result = os.stat(str(path))
+    os.utime(str(path), ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns - seconds * 10**9))
+
+
+def _age_tree(root):
+    for dir_path, dir_names, file_names in os.walk(str(root)):
+        for name in file_names:
+            _age(os.path.join(dir_path, name))
+        _age(dir_path)
+
+
+@pytest.fixture
+def tree(tmp_path):
+    root = tmp_path / 'tree'
+    _touch(root / 'targets.py')
+    _touch(root / 'a' / 'targets.py')
+    _touch(root / 'b' / 'c' / 'targets.py')
+    (root / '.gitignore').write_text('ignored/\n')
+    _touch(root / 'ignored' / 'targets.py')
+    _age_tree(root)
+    return root
+
+
+def _find(root, **kwargs):
+    return list(DiscoveryIndex.load(root, **kwargs).find_target_files())
+
+
+def test_load_cold(tree, isolated_cache_dir):
+    discovery_index = DiscoveryIndex.load(tree)
+    assert discovery_index._entries == {}
+    assert isolated_cache_dir in discovery_index.path.parents
+
+
+def test_load_keyed_on_configuration(tree):
+    index_1 = DiscoveryIndex.load(tree)
+    index_2 = DiscoveryIndex.load(tree, extension='*.js')
+    assert index_1.path != index_2.path
+
+
+def test_find_target_files_matches_walker(tree):
+    assert _find(tree) == list(find_target_files(tree))
+
+
+def test_find_target_files_saves_index(tree):
+    discovery_index = DiscoveryIndex.load(tree)
+    list(discovery_index.find_target_files())
+    assert discovery_index.path.exists()
+
+    reloaded = DiscoveryIndex.load(tree)
+    assert set(reloaded._entries) == {str(tree), str(tree / 'a'), str(tree / 'b'), str(tree / 'b' / 'c')}
+
+
+def test_warm_run_does_not_save(tree):
+    _find(tree)
+    discovery_index = DiscoveryIndex.load(tree)
+    with mock.patch.object(DiscoveryIndex, 'save') as mock_save:
+        list(discovery_index.find_target_files())
+    assert mock_save.call_count == 0
+
+
+@pytest.mark.parametrize('change', ('add', 'remove'))
+def test_changed_tree_saves(tree, change):
+    _find(tree)
+    if change == 'add':
+        _touch(tree / 'd' / 'targets.py')
+    else:
+        (tree / 'a' / 'targets.py').unlink()
+        (tree / 'a').rmdir()
+
+    discovery_index = DiscoveryIndex.load(tree)
+    with mock.patch.object(DiscoveryIndex, 'save') as mock_save:
+        list(discovery_index.find_target_files())
+    assert mock_save.call_count == 1
+
+
+def test_load_rebuild(tree):
+    _find(tree)
+    assert DiscoveryIndex.load(tree, rebuild=True)._entries == {}
+
+
+def test_load_corrupt_index(tree):
+    discovery_index = DiscoveryIndex.load(tree)
+    discovery_index.path.parent.mkdir(parents=True, exist_ok=True)
+    discovery_index.path.write_text('{not json')
+    assert DiscoveryIndex.load(tree)._entries == {}
+
+
+def test_warm_run_does_not_list_unchanged_directories(tree):
+    cold_paths = _find(tree)
+    with mock.patch.object(index, 'scan_directory') as mock_scan_directory:
+        warm_paths = _find(tree)
+    assert mock_scan_directory.call_count == 0
+    assert warm_paths == cold_paths
+
+
+def test_warm_run_lists_changed_directories_only(tree):
+    _find(tree)
+    new_file = _touch(tree / 'b' / 'c' / 'new_targets.py')
+    _age(tree / 'b' / 'c')
+
+    with mock.patch.object(index, 'scan_directory', wraps=index.scan_directory) as mock_scan_directory:
+        paths = _find(tree)
+
+    assert [c.args[0] for c in mock_scan_directory.call_args_list] == [str(tree / 'b' / 'c')]
+    assert new_file in paths
+
+
+@pytest.mark.parametrize('change', ('remove', 'rename'))
+def test_warm_run_sees_removed_and_renamed_files(tree, change):
+    _find(tree)
+    old_path = tree / 'a' / 'targets.py'
+    new_path = tree / 'a' / 'renamed_targets.py'
+    if change == 'remove':
+        old_path.unlink()
+    else:
+        old_path.rename(new_path)
+    _age(tree / 'a')
+
+    paths = _find(tree)
+    assert old_path not in paths
+    assert (new_path in paths) is (change == 'rename')
+
+
+def test_warm_run_sees_removed_directory(tree):
+    _find(tree)
+    os.remove(str(tree / 'b' / 'c' / 'targets.py'))
+    os.rmdir(str(tree / 'b' / 'c'))
+    _age(tree / 'b')
+
+    assert _find(tree) == list(find_target_files(tree))
+    assert str(tree / 'b' / 'c') not in DiscoveryIndex.load(tree)._entries
+
+
+def test_warm_run_reapplies_changed_ignore_file(tree):
+    _find(tree)
+    (tree / '.gitignore').write_text('a/\n')
+    _age(tree / '.gitignore')
+
+    paths = _find(tree)
+    assert tree / 'a' / 'targets.py' not in paths
+    assert tree / 'ignored' / 'targets.py' in paths
+
+
+def test_racy_directory_is_always_listed_again(tmp_path):
+    # tmp_path was modified a moment ago, so its mtime is inside the racy window
+    _touch(tmp_path / 'targets.py')
+    _find(tmp_path)
+    with mock.patch.object(index, 'scan_directory', wraps=index.scan_directory) as mock_scan_directory:
+        _find(tmp_path)
+    assert mock_scan_directory.call_count == 1
+
+
+def test_concurrent_walk_matches_serial_walk(tree):
+    serial_paths = _find(tree)
+    cold_concurrent_paths = list(find_target_files_concurrently([DiscoveryIndex.load(tree, rebuild=True)], 4))
+    warm_concurrent_paths = list(find_target_files_concurrently([DiscoveryIndex.load(tree)], 4))
+    assert cold_concurrent_paths == warm_concurrent_paths == serial_paths
+    assert set(DiscoveryIndex.load(tree)._entries) == {
+        str(tree),
+        str(tree / 'a'),
+        str(tree / 'b'),
+        str(tree / 'b' / 'c'),
+    }
@@ -0,0 +1,445 @@
+import json
+import os
+import textwrap
+from unittest import mock
+
+import pytest
+
+from begin.cli import manifest
+from begin.constants import DEFAULT_REGISTRY_NAME
+from begin.converters import (
+    OptionSchema,
+    Parameter,
+)
+
+
+def _write_targets_file(tmp_path, source, name='targets.py'):
+    path = tmp_path / name
+    path.write_text(textwrap.dedent(source))
+    return path
+
+
+def test_analyse_targets_file(tmp_path):
+    path = _write_targets_file(tmp_path, """
+        import begin
+        from begin import Registry, recipes
+
+
+        local_registry = Registry()
+        ci_registry = begin.Registry(name='ci')
+        other_registry: Registry = Registry('other')
+
+
+        @local_registry.register_target
+        @ci_registry.register_target
+        def check_style():
+            recipes.flake8()
+
+
+        @local_registry.register_target(name_override='tests')
+        async def tests_with_coverage(xml_coverage_report=False):
+            pass
+
+
+        def helper():
+            pass
+    """)
+    module_manifest = manifest.analyse_targets_file(path)
+
+    assert module_manifest.conclusive
+    assert module_manifest.path == path
+    assert module_manifest.namespaces == {DEFAULT_REGISTRY_NAME, 'ci', 'other'}
+    assert module_manifest.identifiers == {
+        ('check_style', DEFAULT_REGISTRY_NAME),
+        ('check_style', 'ci'),
+        ('tests', DEFAULT_REGISTRY_NAME),
+    }
+
+    tests_target = next(t for t in module_manifest.targets if t.name == 'tests')
+    assert tests_target.qualname == 'tests_with_coverage'
+    assert 'xml_coverage_report' in tests_target.signature
+
+
+def test_analyse_targets_file_registry_alias(tmp_path):
+    path = _write_targets_file(tmp_path, """
+        from begin.registry import Registry as R
+
+        registry = R(name='aliased')
+
+        @registry.register_target
+        def foo():
+            pass
+    """)
+    module_manifest = manifest.analyse_targets_file(path)
+    assert module_manifest.conclusive
+    assert module_manifest.identifiers == {('foo', 'aliased')}
+
+
+@pytest.mark.parametrize('source', (
+    # Registry built outside a module-level assignment
+    """
+    registries = [Registry(name) for name in ('a', 'b')]
+    """,
+    # Registry name which is not a string literal
+    """
+    NAME = 'ci'
+    registry = Registry(name=NAME)
+    """,
+    # Registry assigned to more than one name
+    """
+    a = b = Registry()
+    """,
+    # Dynamic name_override
+    """
+    registry = Registry()
+
+    @registry.register_target(name_override=NAME)
+    def foo():
+        pass
+    """,
+    # register_target applied by hand
+    """
+    registry = Registry()
+
+    def foo():
+        pass
+
+    registry.register_target(foo)
+    """,
+    # register_target on a registry defined elsewhere
+    """
+    from shared_targets import registry
+
+    @registry.register_target
+    def foo():
+        pass
+    """,
+    # Dynamic depends_on
+    """
+    registry = Registry()
+
+    @registry.register_target(depends_on=DEPENDENCIES)
+    def foo():
+        pass
+    """,
+    # depends_on holding something other than string literals
+    """
+    registry = Registry()
+
+    @registry.register_target(depends_on=['bar', BAZ])
+    def foo():
+        pass
+    """,
+    # Syntax error
+    """
+    def foo(:
+    """,
+))
+def test_analyse_targets_file_inconclusive(tmp_path, source):
+    path = _write_targets_file(tmp_path, source)
+    module_manifest = manifest.analyse_targets_file(path)
+    assert module_manifest.conclusive is False
+
+
+def test_analyse_targets_file_depends_on(tmp_path):
+    path = _write_targets_file(tmp_path, """
+        registry = Registry(name='ci')
+
+        @registry.register_target(depends_on=['setup', 'install@default'])
+        def install_ci():
+            pass
+
+        @registry.register_target(depends_on='setup')
+        def build():
+            pass
+
+        @registry.register_target(name_override='setup', depends_on=())
+        def setup_ci():
+            pass
+    """)
+    module_manifest = manifest.analyse_targets_file(path)
+    assert module_manifest.conclusive
+
+    depends_on = {target.name: target.depends_on for target in module_manifest.targets}
+    # Unqualified dependencies belong to the namespace of the dependent target
+    assert depends_on == {
+        'install_ci': [('setup', 'ci'), ('install', DEFAULT_REGISTRY_NAME)],
+        'build': [('setup', 'ci')],
+        'setup': [],
+    }
+
+
+SCHEMA_TARGETS = """
+    import pathlib
+    from pathlib import Path
+    from typing import Optional
+
+    from begin import Registry
+
+    DEFAULT_SHARDS = 2
+    registry = Registry()
+
+
+    @registry.register_target
+    def typed(version: int, ratio: 'float' = 0.5, *args, out: Optional[pathlib.Path] = None, **kwargs):
+        pass
+
+
+    @registry.register_target
+    def untyped(name, verbose=False, shards=DEFAULT_SHARDS, root=Path('.'), label=None):
+        pass
+"""
+
+
+def test_analyse_targets_file_schema(tmp_path):
+    path = _write_targets_file(tmp_path, SCHEMA_TARGETS)
+    module_manifest = manifest.analyse_targets_file(path)
+    schemas = {target.name: target.schema for target in module_manifest.targets}
+
+    assert schemas['typed'] == OptionSchema(
+        parameters=[Parameter('version', 'int', required=True), Parameter('ratio', 'float'), Parameter('out', 'path')],
+        accepts_any=True,
+    )
+    # Defaults which are not literals convert nothing, unlike when the target runs
+    assert schemas['untyped'] == OptionSchema(parameters=[
+        Parameter('name', 'str', required=True),
+        Parameter('verbose', 'bool'),
+        Parameter('shards', 'str'),
+        Parameter('root', 'str'),
+        Parameter('label', 'str'),
+    ])
+
+
+def test_analyse_targets_file_schema_other_decorators(tmp_path):
+    path = _write_targets_file(tmp_path, """
+        import functools
+
+        from begin import Registry
+
+        registry = Registry()
+
+
+        @registry.register_target
+        @functools.lru_cache()
+        def cached(count: int):
+            pass
+    """)
+    target, = manifest.analyse_targets_file(path).targets
+    assert target.schema is None
+
+
+def test_analyse_targets_file_missing(tmp_path):
+    assert manifest.analyse_targets_file(tmp_path / 'targets.py').conclusive is False
+
+
+def _manifest_target(name, namespace, depends_on=()):
+    return manifest.ManifestTarget(
+        name=name,
+        namespace=namespace,
+        qualname=name,
+        signature='()',
+        depends_on=list(depends_on),
+    )
+
+
+def test_module_manifest_round_trip(tmp_path):
+    module_manifest = manifest.ModuleManifest(
+        path=tmp_path / 'targets.py',
+        namespaces={'default', 'ci'},
+        targets=[
+            _manifest_target('tests', 'ci', depends_on=[('install', 'default')]),
+            manifest.ManifestTarget(
+                name='build',
+                namespace='ci',
+                qualname='build',
+                signature='(version: int)',
+                schema=OptionSchema(parameters=[Parameter('version', 'int', required=True)]),
+            ),
+        ],
+    )
+    data = module_manifest.to_dict()
+    # Cache entries pass through JSON, which turns identifiers into lists
+    data = json.loads(json.dumps(data))
+    assert manifest.ModuleManifest.from_dict(module_manifest.path, data) == module_manifest
+
+
+class TestManifestCache:
+
+    SOURCE = """
+        registry = Registry()
+
+        @registry.register_target
+        def foo(bar, baz=1):
+            pass
+    """
+
+    @pytest.fixture
+    def targets_file(self, tmp_path):
+        path = _write_targets_file(tmp_path, self.SOURCE)
+        # Push the mtime outside of the racy window, so the cache trusts it
+        stat_result = os.stat(str(path))
+        os.utime(str(path), ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns - 60 * 10**9))
+        return path
+
+    def _get(self, tmp_path, path):
+        cache = manifest.ManifestCache.load(tmp_path)
+        module_manifest = cache.get(path)
+        cache.save()
+        return module_manifest
+
+    def test_cold_and_warm(self, tmp_path, targets_file):
+        cold_manifest = self._get(tmp_path, targets_file)
+        assert cold_manifest.identifiers == {('foo', 'default')}
+
+        # Neither reading nor parsing should happen on a warm run
+        with mock.patch.object(manifest, 'analyse_source') as mock_analyse_source:
+            with mock.patch.object(manifest.Path, 'read_bytes') as mock_read_bytes:
+                warm_manifest = self._get(tmp_path, targets_file)
+        assert mock_analyse_source.call_count == 0
+        assert mock_read_bytes.call_count == 0
+        assert warm_manifest == cold_manifest
+
+    def test_touched_file_is_hashed_not_parsed(self, tmp_path, targets_file):
+        self._get(tmp_path, targets_file)
+        os.utime(str(targets_file), ns=(0, 10**9))
+        with mock.patch.object(manifest, 'analyse_source') as mock_analyse_source:
+            module_manifest = self._get(tmp_path, targets_file)
+        assert mock_analyse_source.call_count == 0
+        assert module_manifest.identifiers == {('foo', 'default')}
+
+    def test_edited_file_is_parsed(self, tmp_path, targets_file):
+        self._get(tmp_path, targets_file)
+        targets_file.write_text(textwrap.dedent(self.SOURCE).replace('foo', 'qux'))
+        module_manifest = self._get(tmp_path, targets_file)
+        assert module_manifest.identifiers == {('qux', 'default')}
+
+    def test_missing_file(self, tmp_path):
+        cache = manifest.ManifestCache.load(tmp_path)
+        assert cache.get(tmp_path / 'targets.py').conclusive is False
+
+    def test_save_only_when_changed(self, tmp_path, targets_file):
+        self._get(tmp_path, targets_file)
+        cache = manifest.ManifestCache.load(tmp_path)
+        cache.get(targets_file)
+        with mock.patch.object(manifest, 'write_json') as mock_write_json:
+            cache.save()
+        assert mock_write_json.call_count == 0
+
+    def test_keyed_on_cwd(self, tmp_path):
+        assert manifest.ManifestCache.load(tmp_path).path != manifest.ManifestCache.load(tmp_path / 'a').path
+
+
+class TestTargetManifest:
+
+    @pytest.fixture
+    def target_manifest(self, tmp_path):
+        return manifest.TargetManifest([
+            manifest.ModuleManifest(
+                path=tmp_path / 'a_targets.py',
+                namespaces={'default'},
+                targets=[_manifest_target('tests', 'default')],
+            ),
+            manifest.ModuleManifest(
+                path=tmp_path / 'b_targets.py',
+                namespaces={'ci'},
+                targets=[_manifest_target('tests', 'ci'), _manifest_target('build', 'ci')],
+            ),
+            manifest.ModuleManifest(
+                path=tmp_path / 'c_targets.py',
+                namespaces={'ci'},
+            ),
+        ])
+
+    def test_create(self, tmp_path):
+        path = _write_targets_file(tmp_path, 'registry = Registry()\n')
+        target_manifest = manifest.TargetManifest.create([path])
+        assert [m.path for m in target_manifest._modules] == [path]
+
+    def test_load(self, tmp_path):
+        path = _write_targets_file(tmp_path, 'registry = Registry()\n')
+        target_manifest = manifest.TargetManifest.load([path], tmp_path)
+        assert [m.path for m in target_manifest._modules] == [path]
+        assert manifest.ManifestCache.load(tmp_path).path.exists()
+
+    def test_select_paths(self, target_manifest, tmp_path):
+        assert target_manifest.select_paths([('tests', 'default')]) == [tmp_path / 'a_targets.py']
+
+    def test_select_paths_includes_colliding_namespaces(self, target_manifest, tmp_path):
+        # c_targets.py defines no requested target, but executing it is required
+        # for the collision of the `ci` namespace to be reported
+        assert target_manifest.select_paths([('build', 'ci')]) == [
+            tmp_path / 'b_targets.py',
+            tmp_path / 'c_targets.py',
+        ]
+
+    def test_select_paths_multiple_requests(self, target_manifest, tmp_path):
+        assert target_manifest.select_paths([('build', 'ci'), ('tests', 'default')]) == [
+            tmp_path / 'a_targets.py',
+            tmp_path / 'b_targets.py',
+            tmp_path / 'c_targets.py',
+        ]
+
+    def test_select_paths_includes_inconclusive_modules(self, target_manifest, tmp_path):
+        inconclusive_path = tmp_path / 'd_targets.py'
+        target_manifest._modules.append(manifest.ModuleManifest(path=inconclusive_path, conclusive=False))
+        assert target_manifest.select_paths([('tests', 'default')]) == [
+            tmp_path / 'a_targets.py',
+            inconclusive_path,
+        ]
+
+    def test_select_paths_missing_target(self, target_manifest):
+        assert target_manifest.select_paths([('missing', 'default')]) is None
+
+    def test_select_paths_includes_dependencies(self, tmp_path):
+        target_manifest = manifest.TargetManifest([
+            manifest.ModuleManifest(
+                path=tmp_path / 'a_targets.py',
+                namespaces={'ci'},
+                targets=[_manifest_target('install_ci', 'ci', depends_on=[('install', 'default')])],
+            ),
+            manifest.ModuleManifest(
+                path=tmp_path / 'b_targets.py',
+                namespaces={'default'},
+                targets=[_manifest_target('install', 'default', depends_on=[('setup', 'tools')])],
+            ),
+            manifest.ModuleManifest(
+                path=tmp_path / 'c_targets.py',
+                namespaces={'tools'},
+                targets=[_manifest_target('setup', 'tools')],
+            ),
+            manifest.ModuleManifest(
+                path=tmp_path / 'd_targets.py',
+                namespaces={'other'},
+                targets=[_manifest_target('unrelated', 'other')],
+            ),
+        ])
+        # Dependencies are followed transitively, across files and namespaces
+        assert target_manifest.select_paths([('install_ci', 'ci')]) == [
+            tmp_path / 'a_targets.py',
+            tmp_path / 'b_targets.py',
+            tmp_path / 'c_targets.py',
+        ]
+
+    def test_select_paths_missing_dependency(self, tmp_path):
+        target_manifest = manifest.TargetManifest([
+            manifest.ModuleManifest(
+                path=tmp_path / 'a_targets.py',
+                namespaces={'ci'},
+                targets=[_manifest_target('build', 'ci', depends_on=[('missing', 'ci')])],
+            ),
+        ])
+        assert target_manifest.select_paths([('build', 'ci')]) is None
+
+    def test_select_paths_dependency_cycle(self, tmp_path):
+        # A cycle is reported when the registries are loaded, not here
+        target_manifest = manifest.TargetManifest([
+            manifest.ModuleManifest(
+                path=tmp_path / 'a_targets.py',
+                namespaces={'ci'},
+                targets=[
+                    _manifest_target('a', 'ci', depends_on=[('b', 'ci')]),
+                    _manifest_target('b', 'ci', depends_on=[('a', 'ci')]),
+                ],
+            ),
+        ])
+        assert target_manifest.select_paths([('a', 'ci')]) == [tmp_path / 'a_targets.py']
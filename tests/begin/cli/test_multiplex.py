@@ -0,0 +1,198 @@
+import os
+import subprocess
+import sys
+from io import BytesIO
+from pathlib import Path
+
+import pytest
+
+import begin
+from begin.cli import multiplex
+
+
+pytestmark = pytest.mark.skipif(not multiplex.is_supported(), reason='Named pipes are not supported')
+
+
+JOBS_TARGETS = """
+import subprocess
+import sys
+import time
+
+from begin.registry import Registry
+
+registry = Registry()
+
+
+@registry.register_target
+def first():
+    print('first starts', flush=True)
+    time.sleep(0.5)
+    print('first ends')
+
+
+@registry.register_target
+def second():
+    print('second prints', flush=True)
+    subprocess.run([sys.executable, '-c', 'import sys; sys.stderr.write("from a subprocess")'])
+    raise SystemExit(3)
+"""
+
+RELEASE_TARGETS = """
+import time
+from pathlib import Path
+
+from begin.registry import Registry
+
+registry = Registry()
+
+
+@registry.register_target
+def fast():
+    print('fast', end='')
+
+
+@registry.register_target
+def slow():
+    release = Path('release')
+    deadline = time.monotonic() + 10
+    while not release.exists() and time.monotonic() < deadline:
+        time.sleep(0.05)
+    print('released' if release.exists() else 'timed out')
+"""
+
+
+def _write(path, *chunks):
+    with open(path, 'wb') as pipe:
+        for chunk in chunks:
+            pipe.write(chunk)
+            pipe.flush()
+
+
+def _begin_command(tmp_path, *args):
+    env = dict(os.environ)
+    source_root = str(Path(begin.__file__).parent.parent)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, (source_root, env.get('PYTHONPATH'))))
+    command = [
+        sys.executable, '-c', 'from begin.cli.cli import main; main()', '--global-dir', str(tmp_path / 'global'), *args,
+    ]
+    return command, env
+
+
+def _lines(output, prefix):
+    return [line for line in output.getvalue().splitlines() if line.startswith(prefix)]
+
+
+def test_live():
+    output = BytesIO()
+    with multiplex.OutputMultiplexer('live', output) as multiplexer:
+        first, second = multiplexer.add('first@default'), multiplexer.add('second@ci')
+        _write(first, b'one\ntw', b'o\nthree')
+        _write(second, b'\n\nlast\n')
+        multiplexer.finish('first@default')
+        # Finishing writes out the last line, however it ends
+        assert _lines(output, b'first@default')[-1] == b'first@default | three'
+        multiplexer.finish('second@ci')
+
+    assert _lines(output, b'first@default') == [
+        b'first@default | one',
+        b'first@default | two',
+        b'first@default | three',
+    ]
+    assert _lines(output, b'second@ci') == [b'second@ci | ', b'second@ci | ', b'second@ci | last']
+    assert len(output.getvalue().splitlines()) == 6
+
+
+def test_live_splits_long_lines():
+    output = BytesIO()
+    line = b'x' * (3 * multiplex._CHUNK_SIZE)
+    with multiplex.OutputMultiplexer('live', output) as multiplexer:
+        _write(multiplexer.add('long'), line + b'\n')
+
+    lines = output.getvalue().splitlines()
+    assert b''.join(line[len(b'long | '):] for line in lines) == line
+    assert max(map(len, lines)) <= multiplex._CHUNK_SIZE + len(b'long | ')
+
+
+@pytest.mark.parametrize('spill_size', (16, 1024 * 1024))
+def test_grouped(spill_size):
+    output = BytesIO()
+    with multiplex.OutputMultiplexer('grouped', output, spill_size=spill_size) as multiplexer:
+        first, second = multiplexer.add('first'), multiplexer.add('second')
+        with open(first, 'wb') as first_pipe, open(second, 'wb') as second_pipe:
+            for index in range(100):
+                first_pipe.write(f'{index}\n'.encode())
+                second_pipe.write(f'{index}\n'.encode())
+        multiplexer.finish('first')
+        multiplexer.finish('second')
+
+    lines = output.getvalue().splitlines()
+    expected = [[f'{name} | {index}'.encode() for index in range(100)] for name in ('first', 'second')]
+    assert lines in (expected[0] + expected[1], expected[1] + expected[0])
+
+
+def test_child_never_blocks():
+    """ A child writing far more than a pipe holds finishes, since the pipe is drained as it goes. """
+    output = BytesIO()
+    with multiplex.OutputMultiplexer('grouped', output, spill_size=1024) as multiplexer:
+        path = multiplexer.add('child')
+        with open(path, 'wb') as pipe:
+            subprocess.run(
+                [sys.executable, '-c', 'import sys\nfor _ in range(20000): sys.stdout.write("y" * 99 + "\\n")'],
+                stdout=pipe,
+                check=True,
+                timeout=30,
+            )
+    assert output.getvalue().splitlines() == [b'child | ' + b'y' * 99] * 20000
+
+
+def test_unknown_mode():
+    with pytest.raises(ValueError, match='Unknown output mode `quiet`'):
+        multiplex.OutputMultiplexer('quiet')
+
+
+@pytest.mark.parametrize('output_mode', ('live', 'grouped'))
+def test_jobs(tmp_path, output_mode):
+    tmp_path.joinpath('targets.py').write_text(JOBS_TARGETS)
+    command, env = _begin_command(tmp_path, '-j', '2', '--output', output_mode, 'first', 'second')
+    completed = subprocess.run(
+        command,
+        cwd=str(tmp_path),
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        timeout=60,
+    )
+
+    assert completed.returncode == 4
+    lines = completed.stdout.decode().splitlines()
+    assert [line for line in lines if line.startswith('first@default')] == [
+        'first@default | first starts',
+        'first@default | first ends',
+    ]
+    assert [line for line in lines if line.startswith('second@default')] == [
+        'second@default | second prints',
+        'second@default | from a subprocess',
+    ]
+    if output_mode == 'live':
+        # The second target finishes while the first is still running
+        assert lines.index('second@default | second prints') < lines.index('first@default | first ends')
+    else:
+        assert lines.index('second@default | from a subprocess') < lines.index('first@default | first starts')
+    assert 'second@default' in completed.stderr.decode()
+
+
+@pytest.mark.parametrize('output_mode', ('live', 'grouped'))
+def test_jobs_output_is_written_once_a_target_finishes(tmp_path, output_mode):
+    """ The output of `fast` (which has no final newline) must be shown while `slow` is still
+    running, since `slow` only finishes once it has been, even though the pool's workers
+    were all forked while `fast`'s pipe was open. """
+    tmp_path.joinpath('targets.py').write_text(RELEASE_TARGETS)
+    command, env = _begin_command(tmp_path, '-j', '2', '--output', output_mode, 'fast', 'slow')
+    process = subprocess.Popen(command, cwd=str(tmp_path), env=env, stdout=subprocess.PIPE)
+    lines = []
+    for line in process.stdout:
+        lines.append(line.decode().rstrip('\n'))
+        if lines[-1] == 'fast@default | fast':
+            tmp_path.joinpath('release').touch()
+    assert process.wait(timeout=60) == 0
+    assert lines == ['fast@default | fast', 'slow@default | released']
@@ -18,6 +18,7 @@ class TestRequest:
         request = parser.Request(target_identifier)
         assert request._target_name == target_name
         assert request._registry_namespace == registry_namespace
+        assert request.identifier == f'{target_name}@{registry_namespace}'
 
     @pytest.mark.parametrize('param_identifier, options', (
         ('foo:bar', {'foo': 'bar'}),
@@ -49,7 +50,7 @@ class TestRequest:
 @mock.patch.object(parser, 'ArgumentParser')
 def test_parse_command(MockArgumentParser, mock_parse_requests):
     mock_parser = MockArgumentParser.return_value
-    stub_optional_args = mock.Mock()
+    stub_optional_args = mock.Mock(no_cache=False)
     stub_request_args = ['arg1', 'arg2']
     mock_parser.parse_known_args.return_value = stub_optional_args, stub_request_args
     result = parser.parse_command()
@@ -64,6 +65,148 @@ def test_parse_command(MockArgumentParser, mock_parse_requests):
     assert result.extension == stub_optional_args.extension
     assert result.global_dir == stub_optional_args.global_dir
     assert result.requests == mock_parse_requests.return_value
+    assert result.use_cache is True
+    assert result.rebuild_index == stub_optional_args.rebuild_index
+
+
+def test_parse_command_cache_flags():
+    with mock.patch('sys.argv', ['begin', '--no-cache', '--rebuild-index', 'tests']):
+        result = parser.parse_command()
+    assert result.use_cache is False
+    assert result.rebuild_index is True
+    assert result.discovery_options.use_cache is False
+    assert result.discovery_options.rebuild_index is True
+
+
+def test_parse_command_scope_flags():
+    with mock.patch('sys.argv', ['begin', '--nearest', '--max-depth', '2', '--discovery-workers', '1', 'tests']):
+        result = parser.parse_command()
+    assert result.nearest is True
+    assert result.max_depth == 2
+    assert result.discovery_options.workers == 1
+    assert result.discovery_options.local_max_depth == 2
+    assert [r.target_name for r in result.requests] == ['tests']
+
+
+def test_parse_requests_no_requests():
+    assert parser._parse_requests([]) == []
+
+
+@pytest.mark.parametrize('argv, list_pattern', (
+    (['begin'], None),
+    (['begin', '--list'], ''),
+    (['begin', '--list', 'te@ci'], 'te@ci'),
+    (['begin', '-l', '@ci'], '@ci'),
+))
+def test_parse_command_list(argv, list_pattern):
+    with mock.patch('sys.argv', argv):
+        result = parser.parse_command()
+    assert result.list_pattern == list_pattern
+    assert result.requests == []
+
+
+def test_parse_command_completion():
+    with mock.patch('sys.argv', ['begin', '--complete', 'te', '--completion', 'zsh']):
+        result = parser.parse_command()
+    assert result.complete == 'te'
+    assert result.completion_shell == 'zsh'
+
+
+@pytest.mark.parametrize('max_depth', ('-1', 'deep'))
+def test_parse_command_max_depth_invalid(max_depth):
+    with mock.patch('sys.argv', ['begin', '--max-depth', max_depth, 'tests']):
+        with pytest.raises(SystemExit):
+            parser.parse_command()
+
+
+def test_parse_command_max_depth_zero():
+    with mock.patch('sys.argv', ['begin', '--max-depth', '0', 'tests']):
+        assert parser.parse_command().max_depth == 0
+
+
+@pytest.mark.parametrize('workers', ('0', '-2'))
+def test_parse_command_discovery_workers_invalid(workers):
+    with mock.patch('sys.argv', ['begin', '--discovery-workers', workers, 'tests']):
+        with pytest.raises(SystemExit):
+            parser.parse_command()
+
+
+@pytest.mark.parametrize('argv, jobs', (
+    (['begin', 'tests'], None),
+    (['begin', '-j', '4', 'tests'], 4),
+    (['begin', 'tests', '--jobs', '2'], 2),
+))
+def test_parse_command_jobs(argv, jobs):
+    with mock.patch('sys.argv', argv):
+        result = parser.parse_command()
+    assert result.jobs == jobs
+    assert [request.target_name for request in result.requests] == ['tests']
+
+
+@pytest.mark.parametrize('argv, force', (
+    (['begin', 'tests'], False),
+    (['begin', '-B', 'tests'], True),
+    (['begin', '--force', 'tests'], True),
+))
+def test_parse_command_force(argv, force):
+    with mock.patch('sys.argv', argv):
+        result = parser.parse_command()
+    assert result.force is force
+
+
+@pytest.mark.parametrize('argv, cache_action', (
+    (['begin', 'tests'], None),
+    (['begin', '--cache', 'stats'], 'stats'),
+    (['begin', '--cache', 'prune'], 'prune'),
+))
+def test_parse_command_cache_action(argv, cache_action):
+    with mock.patch('sys.argv', argv):
+        result = parser.parse_command()
+    assert result.cache_action == cache_action
+
+
+@pytest.mark.parametrize('argv, watch', (
+    (['begin', 'tests'], False),
+    (['begin', '-w', 'tests'], True),
+    (['begin', '--watch', 'tests', 'check_style'], True),
+))
+def test_parse_command_watch(argv, watch):
+    with mock.patch('sys.argv', argv):
+        result = parser.parse_command()
+    assert result.watch is watch
+
+
+@pytest.mark.parametrize('argv, daemon', (
+    (['begin'], False),
+    (['begin', '--daemon'], True),
+))
+def test_parse_command_daemon(argv, daemon):
+    with mock.patch('sys.argv', argv):
+        result = parser.parse_command()
+    assert result.daemon is daemon
+
+
+@pytest.mark.parametrize('argv, output_mode', (
+    (['begin', '-j', '2'], 'live'),
+    (['begin', '-j', '2', '--output', 'grouped'], 'grouped'),
+))
+def test_parse_command_output_mode(argv, output_mode):
+    with mock.patch('sys.argv', argv):
+        result = parser.parse_command()
+    assert result.output_mode == output_mode
+
+
+def test_parse_command_output_mode_invalid():
+    with mock.patch('sys.argv', ['begin', '--output', 'quiet']):
+        with pytest.raises(SystemExit):
+            parser.parse_command()
+
+
+@pytest.mark.parametrize('jobs', ('0', '-1', 'many'))
+def test_parse_command_jobs_invalid(jobs):
+    with mock.patch('sys.argv', ['begin', '--jobs', jobs, 'tests']):
+        with pytest.raises(SystemExit):
+            parser.parse_command()
 
 
 def test_parse_requests_one_request_no_namespace_no_args():
@@ -0,0 +1,112 @@
+import sys
+import types
+from unittest import mock
+
+import pytest
+
+from begin.cli import watch
+
+
+def _make_tree(root):
+    root.joinpath('src').mkdir()
+    root.joinpath('src', 'module.py').write_text('x = 1\n')
+    root.joinpath('node_modules').mkdir()
+    root.joinpath('node_modules', 'ignored.js').write_text('')
+    return root
+
+
+@pytest.fixture(params=('polling', 'inotify'))
+def make_watcher(request):
+    watchers = []
+
+    def make_watcher(root):
+        if request.param == 'polling':
+            watcher = watch.PollingWatcher([root], debounce=0.05, interval=0.01)
+        else:
+            try:
+                watcher = watch.InotifyWatcher([root], debounce=0.05)
+            except OSError:
+                pytest.skip('inotify is not available')
+        watchers.append(watcher)
+        return watcher
+
+    yield make_watcher
+    for watcher in watchers:
+        watcher.close()
+
+
+def test_watcher_reports_changes(tmp_path, make_watcher):
+    root = _make_tree(tmp_path)
+    watcher = make_watcher(root)
+    root.joinpath('src', 'module.py').write_text('x = 2\n')
+    root.joinpath('src', 'new.py').write_text('')
+    assert {root / 'src' / 'module.py', root / 'src' / 'new.py'} <= watcher.wait_for_changes()
+
+
+def test_watcher_reports_deletions(tmp_path, make_watcher):
+    root = _make_tree(tmp_path)
+    watcher = make_watcher(root)
+    root.joinpath('src', 'module.py').unlink()
+    assert root / 'src' / 'module.py' in watcher.wait_for_changes()
+
+
+def test_watcher_watches_new_directories(tmp_path, make_watcher):
+    root = _make_tree(tmp_path)
+    watcher = make_watcher(root)
+    root.joinpath('pkg').mkdir()
+    watcher.wait_for_changes()
+    root.joinpath('pkg', 'module.py').write_text('')
+    assert root / 'pkg' / 'module.py' in watcher.wait_for_changes()
+
+
+def test_watcher_ignores_excluded_dirs(tmp_path, make_watcher):
+    root = _make_tree(tmp_path)
+    watcher = make_watcher(root)
+    root.joinpath('node_modules', 'ignored.js').write_text('changed')
+    root.joinpath('src', 'module.py').write_text('x = 2\n')
+    changes = watcher.wait_for_changes()
+    assert root / 'src' / 'module.py' in changes
+    assert not any('node_modules' in str(path) for path in changes)
+
+
+def test_watcher_discard_changes(tmp_path, make_watcher):
+    root = _make_tree(tmp_path)
+    watcher = make_watcher(root)
+    root.joinpath('src', 'module.py').write_text('x = 2\n')
+    watcher.discard_changes()
+    root.joinpath('src', 'other.py').write_text('')
+    assert root / 'src' / 'module.py' not in watcher.wait_for_changes()
+
+
+def test_watcher_subclass_must_implement_read_changes(tmp_path):
+    class IncompleteWatcher(watch.Watcher):
+        pass
+
+    with pytest.raises(TypeError):
+        IncompleteWatcher([tmp_path])
+
+
+def test_create_watcher_falls_back_to_polling(tmp_path):
+    with mock.patch.object(watch, 'InotifyWatcher', side_effect=OSError('unavailable')):
+        watcher = watch.create_watcher([tmp_path])
+    assert isinstance(watcher, watch.PollingWatcher)
+
+
+def _fake_module(name, path):
+    module = types.ModuleType(name)
+    module.__file__ = str(path)
+    return module
+
+
+def test_purge_project_modules(tmp_path, monkeypatch):
+    monkeypatch.setitem(sys.modules, 'project_tests', _fake_module('project_tests', tmp_path / 'tests.py'))
+    monkeypatch.setitem(sys.modules, 'begin_like', _fake_module('begin_like', tmp_path / 'begin_like.py'))
+    monkeypatch.setitem(sys.modules, 'elsewhere', _fake_module('elsewhere', '/somewhere/else.py'))
+    monkeypatch.setattr(sys, 'prefix', str(tmp_path / '.venv'))
+    monkeypatch.setitem(sys.modules, 'installed', _fake_module('installed', tmp_path / '.venv' / 'installed.py'))
+
+    removed = watch.purge_project_modules([tmp_path], keep=('begin_like',))
+    assert removed == ['project_tests']
+    assert 'project_tests' not in sys.modules
+    for name in ('begin_like', 'elsewhere', 'installed'):
+        assert name in sys.modules
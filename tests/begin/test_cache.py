@@ -0,0 +1,42 @@
+from pathlib import Path
+
+from begin import cache
+
+
+def test_get_cache_dir_from_env(monkeypatch, tmp_path):
+    monkeypatch.setenv(cache.CACHE_DIR_ENV_VAR, str(tmp_path))
+    assert cache.get_cache_dir() == tmp_path
+
+
+def test_get_cache_dir_from_xdg(monkeypatch, tmp_path):
+    monkeypatch.delenv(cache.CACHE_DIR_ENV_VAR)
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    assert cache.get_cache_dir() == tmp_path / 'begin'
+
+
+def test_get_cache_dir_default(monkeypatch, tmp_path):
+    monkeypatch.delenv(cache.CACHE_DIR_ENV_VAR)
+    monkeypatch.delenv('XDG_CACHE_HOME', raising=False)
+    monkeypatch.setattr(Path, 'home', lambda: tmp_path)
+    assert cache.get_cache_dir() == tmp_path / '.cache' / 'begin'
+
+
+def test_make_cache_key():
+    assert cache.make_cache_key('a', 1) == cache.make_cache_key('a', 1)
+    assert cache.make_cache_key('a', 1) != cache.make_cache_key('a', 2)
+
+
+def test_write_and_read_json(tmp_path):
+    path = tmp_path / 'nested' / 'data.json'
+    cache.write_json(path, {'key': ['value']})
+    assert cache.read_json(path) == {'key': ['value']}
+
+    # No temporary files should be left behind
+    assert list(path.parent.iterdir()) == [path]
+
+
+def test_read_json_missing_or_corrupt(tmp_path):
+    path = tmp_path / 'data.json'
+    assert cache.read_json(path) is None
+    path.write_text('{not json')
+    assert cache.read_json(path) is None
@@ -0,0 +1,121 @@
+from dataclasses import asdict
+from pathlib import Path
+from typing import (
+    List,
+    Optional,
+)
+
+import pytest
+
+from begin import converters
+from begin.converters import (
+    OptionSchema,
+    Parameter,
+)
+
+
+@pytest.mark.parametrize('arg, result', (
+    ('yes', True),
+    ('True', True),
+    ('1', True),
+    ('ON', True),
+    ('no', False),
+    ('F', False),
+    ('0', False),
+    ('off', False),
+))
+def test_parse_bool(arg, result):
+    assert converters.parse_bool(arg) is result
+
+
+@pytest.mark.parametrize('arg', ('', 'maybe', 'flase', '2'))
+def test_parse_bool_invalid(arg):
+    with pytest.raises(ValueError):
+        converters.parse_bool(arg)
+
+
+@pytest.mark.parametrize('annotation, default, converter', (
+    ('int', None, 'int'),
+    ('float', 1, 'float'),
+    ('bool', None, 'bool'),
+    ('str', 1, 'str'),
+    ('Path', None, 'path'),
+    ('pathlib.Path', None, 'path'),
+    ('Optional[int]', None, 'int'),
+    ('typing.Optional[pathlib.Path]', None, 'path'),
+    ('int | None', None, 'int'),
+    ('int | str', None, 'str'),
+    ('List[int]', None, 'str'),
+    ('CustomType', None, 'str'),
+    (None, False, 'bool'),
+    (None, 3, 'int'),
+    (None, 0.5, 'float'),
+    (None, Path('.'), 'path'),
+    (None, 'text', 'str'),
+    (None, None, 'str'),
+))
+def test_converter_for(annotation, default, converter):
+    assert converters.converter_for(annotation, default) == converter
+
+
+def _target(a, b: int, c=False, *args, d: Optional[Path] = None, e: 'float' = 1, f: List[int] = None, **kwargs):
+    pass
+
+
+def test_from_function():
+    assert OptionSchema.from_function(_target) == OptionSchema(
+        parameters=[
+            Parameter('a', 'str', required=True),
+            Parameter('b', 'int', required=True),
+            Parameter('c', 'bool'),
+            Parameter('d', 'path'),
+            Parameter('e', 'float'),
+            Parameter('f', 'str'),
+        ],
+        accepts_any=True,
+    )
+
+
+def test_from_function_without_kwargs():
+    def target(limit=10):
+        pass
+
+    assert OptionSchema.from_function(target) == OptionSchema(parameters=[Parameter('limit', 'int')])
+
+
+class TestOptionSchema:
+
+    SCHEMA = OptionSchema(parameters=[
+        Parameter('name', required=True),
+        Parameter('count', 'int'),
+        Parameter('dry_run', 'bool'),
+    ])
+
+    def test_problems(self):
+        assert self.SCHEMA.problems({'name': 'x', 'count': '3', 'dry_run': 'no'}) == []
+        assert self.SCHEMA.problems({'count': 'three', 'dry_run': 'perhaps', 'colour': 'red'}) == [
+            'missing required option `name`',
+            'option `count` expects int, got `three`',
+            'option `dry_run` expects bool, got `perhaps`',
+            'unknown option `colour` (expected: name, count, dry_run)',
+        ]
+
+    def test_problems_values_which_are_not_strings(self):
+        assert self.SCHEMA.problems({'name': None, 'count': [1]}) == []
+
+    def test_problems_accepts_any(self):
+        schema = OptionSchema(accepts_any=True)
+        assert schema.problems({'anything': 'goes'}) == []
+        assert OptionSchema().problems({'anything': 'goes'}) == ['unknown option `anything` (expected: none)']
+
+    def test_convert(self):
+        assert self.SCHEMA.convert({'name': 'x', 'count': '3', 'dry_run': 'no'}) == {
+            'name': 'x',
+            'count': 3,
+            'dry_run': False,
+        }
+        assert self.SCHEMA.convert({'name': 'x', 'count': 3}) == {'name': 'x', 'count': 3}
+        assert OptionSchema(accepts_any=True).convert({'extra': '1'}) == {'extra': '1'}
+
+    def test_from_dict(self):
+        assert OptionSchema.from_dict(asdict(self.SCHEMA)) == self.SCHEMA
@@ -0,0 +1,83 @@
+import os
+import sys
+from unittest import mock
+
+import pytest
+
+from begin import entrypoints
+
+
+def _locator(script):
+    return [script.parent.parent / 'lib']
+
+
+@pytest.fixture
+def tool_script(tmp_path):
+    script = tmp_path.joinpath('bin', 'tool')
+    script.parent.mkdir()
+    script.write_text('#!/bin/sh\n')
+    tmp_path.joinpath('lib').mkdir()
+    return script
+
+
+@pytest.fixture
+def mock_which(tool_script):
+    with mock.patch('begin.entrypoints.shutil.which', return_value=str(tool_script)) as mock_which:
+        yield mock_which
+
+
+def test_locate_global_install(tool_script, mock_which):
+    expected = [str(tool_script.parent.parent.resolve() / 'lib')]
+    assert entrypoints.locate_global_install('tool', _locator) == expected
+    assert mock_which.call_args_list == [mock.call('tool')]
+
+    # Served from memory
+    assert entrypoints.locate_global_install('tool', _locator) == expected
+    assert mock_which.call_count == 1
+
+
+def test_locate_global_install_is_persisted(tool_script, mock_which, monkeypatch):
+    expected = entrypoints.locate_global_install('tool', _locator)
+
+    # A new process starts with nothing in memory, but reuses the record
+    monkeypatch.setattr(entrypoints, '_locations', {})
+    assert entrypoints.locate_global_install('tool', _locator) == expected
+    assert mock_which.call_count == 1
+
+
+@pytest.mark.parametrize('change', ('script', 'sys_path'))
+def test_locate_global_install_revalidates(tool_script, mock_which, monkeypatch, change):
+    entrypoints.locate_global_install('tool', _locator)
+    monkeypatch.setattr(entrypoints, '_locations', {})
+
+    if change == 'script':
+        # e.g. the tool was reinstalled
+        tool_script.write_text('#!/bin/sh\n# reinstalled\n')
+    else:
+        tool_script.parent.parent.joinpath('lib').rmdir()
+
+    entrypoints.locate_global_install('tool', _locator)
+    assert mock_which.call_count == 2
+
+
+def test_locate_global_install_depends_on_path(tool_script, mock_which, monkeypatch):
+    entrypoints.locate_global_install('tool', _locator)
+    monkeypatch.setenv('PATH', os.pathsep.join(('/somewhere/else', os.environ.get('PATH', ''))))
+    entrypoints.locate_global_install('tool', _locator)
+    assert mock_which.call_count == 2
+
+
+@mock.patch('begin.entrypoints.shutil.which', return_value=None)
+def test_locate_global_install_missing_tool(mock_which, tool_script):
+    assert entrypoints.locate_global_install('tool', _locator) is None
+
+    # Failures are not remembered, so that installing the tool is noticed
+    mock_which.return_value = str(tool_script)
+    assert entrypoints.locate_global_install('tool', _locator) is not None
+
+
+def test_extend_sys_path(monkeypatch):
+    monkeypatch.setattr(sys, 'path', ['/first'])
+    entrypoints.extend_sys_path(['/second', '/first', '/third'])
+    entrypoints.extend_sys_path(['/second'])
+    assert sys.path == ['/first', '/second', '/third']
@@ -56,6 +56,46 @@ class TestExceptions:
         # Error message has the correct number of lines
         assert len(err.message.splitlines()) == len(stub_namespaces) + len(stub_paths)
 
+    def test_target_failure_error_properties(self):
+        failures = [('tests@ci', 2), ('build@default', 1)]
+        err = exceptions.TargetFailureError(failures)
+
+        assert err.exit_code == ExitCodeEnum.TARGET_FAILURE.value
+        assert len(err.message.splitlines()) == len(failures) + 1
+        assert '\ttests@ci (exit code 2)' in err.message
+        assert '\tbuild@default (exit code 1)' in err.message
+
+    def test_unknown_target_error_properties(self):
+        err = exceptions.UnknownTargetError('tests@ci')
+        assert err.exit_code == ExitCodeEnum.UNKNOWN_TARGET.value
+        assert err.message == 'Could not find target `tests@ci`'
+
+        err = exceptions.UnknownTargetError('install@default', required_by='install_ci@ci')
+        assert err.message == 'Could not find target `install@default`, which is a dependency of `install_ci@ci`'
+
+    def test_dependency_cycle_error_properties(self):
+        err = exceptions.DependencyCycleError(['a@ci', 'b@default', 'a@ci'])
+        assert err.exit_code == ExitCodeEnum.DEPENDENCY_CYCLE.value
+        assert err.message == 'Found a dependency cycle: a@ci -> b@default -> a@ci'
+
+    def test_daemon_error_properties(self):
+        err = exceptions.DaemonError('A daemon is already running')
+        assert err.exit_code == ExitCodeEnum.DAEMON_ERROR.value
+        assert err.message == 'A daemon is already running'
+
+    def test_invalid_options_error_properties(self):
+        problems = [
+            ('tests@ci', 'unknown option `shard` (expected: shards)'),
+            ('build@default', 'missing required option `version`'),
+        ]
+        err = exceptions.InvalidOptionsError(problems)
+        assert err.exit_code == ExitCodeEnum.INVALID_OPTIONS.value
+        assert err.message.splitlines() == [
+            'Found invalid options:',
+            '\ttests@ci: unknown option `shard` (expected: shards)',
+            '\tbuild@default: missing required option `version`',
+        ]
+
     def test_child_classes_raise_correctly(self):
         # Because metaclasses and inheritance from Exception doesn't play
         # well together (see docstring for exceptions.ExitCodeMeta), we should
@@ -66,6 +106,26 @@ class TestExceptions:
             tested_subclasses += 1
             raise exceptions.RegistryNameCollisionError({})
 
+        with pytest.raises(exceptions.TargetFailureError):
+            tested_subclasses += 1
+            raise exceptions.TargetFailureError([])
+
+        with pytest.raises(exceptions.UnknownTargetError):
+            tested_subclasses += 1
+            raise exceptions.UnknownTargetError('target@namespace')
+
+        with pytest.raises(exceptions.DependencyCycleError):
+            tested_subclasses += 1
+            raise exceptions.DependencyCycleError(['a@ci', 'a@ci'])
+
+        with pytest.raises(exceptions.DaemonError):
+            tested_subclasses += 1
+            raise exceptions.DaemonError('A daemon is already running')
+
+        with pytest.raises(exceptions.InvalidOptionsError):
+            tested_subclasses += 1
+            raise exceptions.InvalidOptionsError([])
+
         # Make the test fail if a new exception is added without an explicit
         # `with pytest.raises ...` check. Note: we can't just look use
         # exceptions.ExitCodeMeta.__sublcasses__ to count the subclasses, because
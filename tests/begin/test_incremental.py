@@ -0,0 +1,169 @@
+import os
+import subprocess
+from unittest import mock
+
+import pytest
+
+from begin import (
+    incremental,
+    recipes,
+)
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    tmp_path.joinpath('pkg', 'sub').mkdir(parents=True)
+    tmp_path.joinpath('.venv').mkdir()
+    for path in ('setup.py', 'pkg/__init__.py', 'pkg/sub/module.py', 'pkg/data.txt', '.venv/site.py'):
+        tmp_path.joinpath(path).write_text('x = 1\n')
+    return tmp_path
+
+
+def _files(*paths):
+    return [os.path.join(*path.split('/')) for path in paths]
+
+
+def test_find_candidates(project):
+    assert incremental.find_candidates(root=project) == _files('pkg/__init__.py', 'pkg/sub/module.py', 'setup.py')
+    assert incremental.find_candidates(['pkg/*.py'], project) == _files('pkg/__init__.py', 'pkg/sub/module.py')
+    assert incremental.find_candidates(['*.txt'], project, excluded_dirs=['pkg']) == []
+
+
+def test_find_candidates_skips_ignored_paths(project):
+    project.joinpath('.gitignore').write_text('generated.py\nbuild_output/\n')
+    project.joinpath('pkg', '.beginignore').write_text('sub/\n')
+    project.joinpath('build_output').mkdir()
+    for path in ('generated.py', 'pkg/generated.py', 'build_output/module.py'):
+        project.joinpath(path).write_text('x = 1\n')
+    assert incremental.find_candidates(root=project) == _files('pkg/__init__.py', 'setup.py')
+
+
+class TestSuccessRecord:
+
+    def test_changed(self, project):
+        candidates = incremental.find_candidates(root=project)
+        record = incremental.SuccessRecord('tool', ['--opt'], ['**/*.py'], project)
+        assert record.changed(candidates) == candidates
+
+        record.record(candidates)
+        assert record.changed(candidates) == []
+
+        project.joinpath('pkg', 'sub', 'module.py').write_text('x = 2\n')
+        project.joinpath('new.py').touch()
+        candidates = incremental.find_candidates(root=project)
+        assert record.changed(candidates) == _files('new.py', 'pkg/sub/module.py')
+
+    def test_keyed_by_arguments_and_version(self, project):
+        candidates = incremental.find_candidates(root=project)
+        incremental.SuccessRecord('tool', ['--opt'], ['**/*.py'], project, '1.0').record(candidates)
+
+        assert incremental.SuccessRecord('tool', ['--opt'], ['**/*.py'], project, '1.0').changed(candidates) == []
+        assert incremental.SuccessRecord('tool', ['--opt'], ['**/*.py'], project, '2.0').changed(candidates)
+        assert incremental.SuccessRecord('tool', ['--other'], ['**/*.py'], project, '1.0').changed(candidates)
+        assert incremental.SuccessRecord('other', ['--opt'], ['**/*.py'], project, '1.0').changed(candidates)
+
+    def test_forgotten_when_configuration_changes(self, project):
+        candidates = incremental.find_candidates(root=project)
+        incremental.SuccessRecord('tool', [], ['**/*.py'], project).record(candidates)
+
+        project.joinpath('setup.cfg').write_text('[flake8]\nmax-line-length = 80\n')
+        assert incremental.SuccessRecord('tool', [], ['**/*.py'], project).changed(candidates) == candidates
+
+
+class TestRunOnChangedFiles:
+
+    def test_runs_on_changed_files_only(self, project):
+        run = mock.Mock(return_value=0)
+        assert incremental.run_on_changed_files('tool', run, ['--opt']) == 0
+        assert run.call_args_list == [mock.call(_files('pkg/__init__.py', 'pkg/sub/module.py', 'setup.py'))]
+
+        run.reset_mock()
+        assert incremental.run_on_changed_files('tool', run, ['--opt']) == 0
+        assert run.call_args_list == []
+
+        project.joinpath('setup.py').write_text('x = 2\n')
+        assert incremental.run_on_changed_files('tool', run, ['--opt']) == 0
+        assert run.call_args_list == [mock.call(['setup.py'])]
+
+    @pytest.mark.parametrize('side_effect, exit_code', ((None, 1), (SystemExit(2), 2), (SystemExit('error'), 1)))
+    def test_failures_are_not_recorded(self, project, side_effect, exit_code):
+        run = mock.Mock(return_value=1, side_effect=side_effect)
+        assert incremental.run_on_changed_files('tool', run, []) == exit_code
+        assert incremental.run_on_changed_files('tool', run, []) == exit_code
+        assert len(run.call_args_list) == 2
+
+    def test_exiting_successfully_is_recorded(self, project):
+        run = mock.Mock(side_effect=SystemExit(None))
+        assert incremental.run_on_changed_files('tool', run, []) == 0
+        assert incremental.run_on_changed_files('tool', run, []) == 0
+        assert len(run.call_args_list) == 1
+
+
+def _git(root, *args):
+    subprocess.run(
+        ['git', '-c', 'user.name=test', '-c', 'user.email=test@example.com', *args],
+        cwd=str(root),
+        check=True,
+        stdout=subprocess.PIPE,
+    )
+
+
+class TestSince:
+
+    @pytest.fixture
+    def repo(self, project):
+        _git(project, 'init', '-q')
+        project.joinpath('.gitignore').write_text('ignored.py\n')
+        _git(project, 'add', '.')
+        _git(project, 'commit', '-q', '-m', 'initial')
+        return project
+
+    def test_changed_since_ref(self, repo):
+        candidates = incremental.find_candidates(root=repo)
+        assert incremental.changed_since_ref('HEAD', candidates, repo) == []
+
+        repo.joinpath('setup.py').write_text('x = 2\n')
+        repo.joinpath('pkg', 'new.py').touch()
+        repo.joinpath('ignored.py').touch()
+        candidates = incremental.find_candidates(root=repo)
+        assert incremental.changed_since_ref('HEAD', candidates, repo) == _files('pkg/new.py', 'setup.py')
+
+    def test_relative_to_working_directory(self, repo, monkeypatch):
+        repo.joinpath('pkg', 'sub', 'module.py').write_text('x = 2\n')
+        monkeypatch.chdir(repo / 'pkg')
+        run = mock.Mock(return_value=0)
+        assert incremental.run_on_changed_files('tool', run, [], since='HEAD') == 0
+        assert run.call_args_list == [mock.call(_files('sub/module.py'))]
+
+    def test_success_is_not_recorded(self, repo):
+        repo.joinpath('setup.py').write_text('x = 2\n')
+        run = mock.Mock(return_value=0)
+        assert incremental.run_on_changed_files('tool', run, [], since='HEAD') == 0
+        assert incremental.run_on_changed_files('tool', run, [], since='HEAD') == 0
+        assert len(run.call_args_list) == 2
+
+    def test_unknown_ref(self, repo, caplog):
+        run = mock.Mock()
+        assert incremental.run_on_changed_files('tool', run, [], since='no-such-ref') == 1
+        assert run.call_args_list == []
+        assert 'Could not list the files changed since no-such-ref' in caplog.text
+
+
+def test_flake8_changed_only(project, capsys):
+    project.joinpath('pkg', 'sub', 'module.py').write_text('import os\n')
+
+    result = recipes.run(recipes.flake8, '--select=F', changed_only=True)
+    assert result.exit_code == 1
+    assert 'F401' in capsys.readouterr().out
+
+    project.joinpath('pkg', 'sub', 'module.py').write_text('import os\n\nos.getcwd()\n')
+    with mock.patch('flake8.main.cli.main', return_value=0) as mock_flake8_main:
+        assert recipes.run(recipes.flake8, '--select=F', changed_only=True).succeeded
+    assert mock_flake8_main.call_args_list == [
+        mock.call(['--select=F', *_files('pkg/__init__.py', 'pkg/sub/module.py', 'setup.py')]),
+    ]
+
+    with mock.patch('flake8.main.cli.main') as mock_flake8_main:
+        assert recipes.run(recipes.flake8, '--select=F', changed_only=True).succeeded
+    assert mock_flake8_main.call_args_list == []
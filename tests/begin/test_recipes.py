@@ -1,10 +1,14 @@
 import sys
+from concurrent.futures import Future
 from random import randint
 from unittest import mock
 
 import pytest
 
-from begin import recipes
+from begin import (
+    recipes,
+    utils,
+)
 
 
 @mock.patch('begin.recipes.patched_argv_context')
@@ -105,45 +109,53 @@ class TestPoetry:
 
         assert recipes._get_local_poetry_entrypoint() is mock_poetry.main
 
-    @mock.patch('begin.recipes.subprocess')
-    def test_get_global_poetry_entrypoint_module_not_found(self, mock_subprocess):
-        """ If the call to `which poetry` returns a non-zero exit code, `None`
-        should be returned. """
-        mock_subprocess.run.return_value.returncode = 1
+    @mock.patch('begin.entrypoints.shutil.which', return_value=None)
+    def test_get_global_poetry_entrypoint_module_not_found(self, mock_which):
+        """ If `poetry` is not on the `PATH`, `None` should be returned. """
         assert recipes._get_global_poetry_entrypoint() is None
-        assert mock_subprocess.run.call_args_list == [mock.call(['which', 'poetry'], capture_output=True)]
+        assert mock_which.call_args_list == [mock.call('poetry')]
 
-    @mock.patch('begin.recipes.subprocess')
+    @mock.patch('begin.entrypoints.shutil.which')
     def test_get_global_poetry_entrypoint_module_is_found(
         self,
-        mock_subprocess,
+        mock_which,
         mock_missing_injected_dependency,
         tmp_path,
     ):
-        """ If the call to `which poetry` returns an exit code of zero, mock the
-        `poetry` path with a `tmp_path` and make sure its derivatives are added
-        to the `sys.path` and the module can be imported. """
+        """ If `poetry` is on the `PATH`, mock the `poetry` path with a `tmp_path`
+        and make sure its derivatives are added to the `sys.path` and the module
+        can be imported. The lookup should only happen once. """
         mock_poetry = mock_missing_injected_dependency(
             module_name='poetry.console',
         )
-        mock_which_poetry = mock_subprocess.run.return_value
-
-        # `which poetry` was successful: exit code should be 0 and a (`bytes`) path
-        # to the `poetry` entrypoint should be returned.
-        mock_which_poetry.returncode = 0
-        mock_which_poetry.stdout = bytes(tmp_path)
-        expected_lib = tmp_path.joinpath('../../lib').resolve()
+        poetry_script = tmp_path.joinpath('bin', 'poetry')
+        poetry_script.parent.mkdir()
+        poetry_script.touch()
+        mock_which.return_value = str(poetry_script)
+        expected_lib = poetry_script.joinpath('../../lib').resolve()
         expected_current_vendors = expected_lib.joinpath(
             'poetry/_vendor/py{0[0]}.{0[1]}'.format(sys.version_info),
         )
 
         # `poetry.console.main` should be returned
         assert recipes._get_global_poetry_entrypoint() == mock_poetry.main
+        assert recipes._get_global_poetry_entrypoint() == mock_poetry.main
+        assert mock_which.call_count == 1
 
         # A couple of derivates of the `tmp_path` should have been added to the
-        # `sys.path`
-        assert str(expected_current_vendors) in sys.path
-        assert str(expected_lib) in sys.path
+        # `sys.path`, once each
+        assert sys.path.count(str(expected_current_vendors)) == 1
+        assert sys.path.count(str(expected_lib)) == 1
+
+    @mock.patch('begin.recipes.extend_sys_path')
+    @mock.patch('begin.recipes.locate_global_install', return_value=['/not/poetry'])
+    def test_get_global_poetry_entrypoint_not_importable(self, mock_locate, mock_extend_sys_path, caplog):
+        """ If the `poetry` script is found, but the package cannot be imported
+        from beside it, `None` should be returned. """
+        with mock.patch.dict(sys.modules, {'poetry.console': None}):
+            assert recipes._get_global_poetry_entrypoint() is None
+        assert mock_extend_sys_path.call_args_list == [mock.call(['/not/poetry'])]
+        assert 'could not import poetry' in caplog.text
 
     @mock.patch('begin.recipes.patched_argv_context')
     @mock.patch('begin.recipes._get_global_poetry_entrypoint')
@@ -233,3 +245,147 @@ def test_pytest(mock_pytest_main):
 
     assert mock_pytest_main.call_args_list == [mock.call(stub_args)]
     assert err_info.value.code == exit_code
+
+
+class TestRun:
+
+    @mock.patch('flake8.main.cli.main', return_value=0)
+    def test_recipe_which_returns(self, mock_flake8_main):
+        result = recipes.run(recipes.flake8, '--some', 'args')
+        assert mock_flake8_main.call_args_list == [mock.call(['--some', 'args'])]
+        assert result.name == 'flake8'
+        assert result.args == ('--some', 'args')
+        assert result.exit_code == 0
+        assert result.succeeded
+        assert result.duration >= 0
+        assert result.stdout is None
+        assert result.stderr is None
+        result.check()
+
+    @pytest.mark.parametrize('code, exit_code', ((None, 0), (0, 0), (2, 2), ('Failed', 1)))
+    def test_recipe_which_exits(self, code, exit_code):
+        @utils.with_exit
+        def tool(*args):
+            sys.exit(code)
+
+        result = recipes.run(tool)
+        assert result.exit_code == exit_code
+        assert result.succeeded is (exit_code == 0)
+
+    def test_plain_callable(self):
+        result = recipes.run(lambda *args: len(args), 'a', 'b')
+        assert result.exit_code == 2
+
+    def test_capture_output(self, capsys):
+        def tool(*args):
+            print('out', *args)
+            print('err', file=sys.stderr)
+            return 1
+
+        result = recipes.run(tool, 'arg', capture_output=True)
+        assert result.stdout == 'out arg\n'
+        assert result.stderr == 'err\n'
+        assert capsys.readouterr() == ('', '')
+        with pytest.raises(SystemExit) as err_info:
+            result.check()
+        assert err_info.value.code == 1
+
+    def test_capture_binary_output(self):
+        def tool():
+            print('text')
+            sys.stdout.buffer.write('bytes\n'.encode())
+
+        assert recipes.run(tool, capture_output=True).stdout == 'text\nbytes\n'
+
+    def test_other_exceptions_are_raised(self):
+        def tool():
+            raise ModuleNotFoundError("No module named 'tool'")
+
+        with pytest.raises(ModuleNotFoundError):
+            recipes.run(tool)
+
+
+def test_check_results(caplog):
+    results = [
+        recipes.RecipeResult(name='black', args=(), exit_code=0, duration=0.5),
+        recipes.RecipeResult(name='flake8', args=(), exit_code=3, duration=1.0),
+        recipes.RecipeResult(name='isort', args=(), exit_code=2, duration=0.25),
+    ]
+    recipes.check_results(results[:1])
+
+    with pytest.raises(SystemExit) as err_info:
+        recipes.check_results(results)
+    assert err_info.value.code == 3
+    assert 'flake8 failed with exit code 3 after 1.00s' in caplog.text
+    assert 'isort failed with exit code 2 after 0.25s' in caplog.text
+    assert 'black failed' not in caplog.text
+
+
+class TestLint:
+
+    @pytest.fixture
+    def mock_pool(self):
+        """ Runs the recipes in the test's process, finishing in the reverse order. """
+        results = {
+            'flake8': recipes.RecipeResult('flake8', (), 1, 0.5, stdout='flake8 out\n', stderr=''),
+            'black': recipes.RecipeResult('black', (), 0, 0.25, stdout='', stderr='black err\n'),
+            'isort': recipes.RecipeResult('isort', (), 2, 0.1, stdout='isort out\n', stderr=''),
+        }
+
+        def submit(recipe, *args, **kwargs):
+            future = Future()
+            future.set_result(results[recipe.__name__])
+            return future
+
+        with mock.patch('begin.workers.RecipePool') as mock_pool_class:
+            pool = mock_pool_class.return_value.__enter__.return_value
+            pool.submit.side_effect = submit
+            with mock.patch('begin.recipes.as_completed', side_effect=lambda futures: reversed(list(futures))):
+                yield pool
+
+    def test_lint(self, mock_pool, capsys):
+        with pytest.raises(SystemExit) as err_info:
+            recipes.lint('src')
+        assert err_info.value.code == 1
+        assert mock_pool.submit.call_args_list == [
+            mock.call(recipes.flake8, 'src', capture_output=True),
+            mock.call(recipes.black, '--check', 'src', capture_output=True),
+            mock.call(recipes.isort, '--check-only', 'src', capture_output=True),
+        ]
+        captured = capsys.readouterr()
+        assert captured.out == (
+            '==== isort failed with exit code 2 in 0.10s ====\n'
+            'isort out\n'
+            '==== black passed in 0.25s ====\n'
+            '==== flake8 failed with exit code 1 in 0.50s ====\n'
+            'flake8 out\n'
+        )
+        assert captured.err == 'black err\n'
+
+    def test_lint_tools(self, mock_pool):
+        with pytest.raises(SystemExit) as err_info:
+            recipes.lint(tools=['black'])
+        assert err_info.value.code == 0
+        assert mock_pool.submit.call_args_list == [mock.call(recipes.black, '--check', '.', capture_output=True)]
+
+    def test_lint_changed_only(self, mock_pool):
+        with pytest.raises(SystemExit):
+            recipes.lint(tools=['flake8'], changed_only=True)
+        assert mock_pool.submit.call_args_list == [
+            mock.call(recipes.flake8, capture_output=True, changed_only=True, since=None),
+        ]
+
+    @pytest.mark.parametrize('args, kwargs', (((), {'tools': ['pylint']}), (('src',), {'since': 'main'})))
+    def test_lint_invalid_arguments(self, mock_pool, args, kwargs):
+        with pytest.raises(ValueError):
+            recipes.lint(*args, **kwargs)
+        assert mock_pool.submit.call_args_list == []
+
+    def test_lint_runs_flake8(self, tmp_path, monkeypatch, capsys):
+        monkeypatch.chdir(tmp_path)
+        tmp_path.joinpath('module.py').write_text('import os\n')
+
+        assert recipes.run(recipes.lint, tools=['flake8']).exit_code == 1
+        output = capsys.readouterr().out
+        assert output.startswith('==== flake8 failed with exit code 1 in ')
+        assert "module.py:1:1: F401 'os' imported but unused" in output
@@ -1,18 +1,64 @@
+import asyncio
 from pathlib import Path
 from unittest import mock
 
 import pytest
 
-from begin.exceptions import RegistryNameCollisionError
+from begin.constants import DEFAULT_REGISTRY_NAME
+from begin.exceptions import (
+    DependencyCycleError,
+    RegistryNameCollisionError,
+    UnknownTargetError,
+)
 from begin.registry import (
     Registry,
     RegistryManager,
     Target,
     TargetMap,
     TargetOptions,
+    split_target_identifier,
 )
 
 
+@pytest.mark.parametrize('identifier, default_namespace, expected', (
+    ('foo', DEFAULT_REGISTRY_NAME, ('foo', DEFAULT_REGISTRY_NAME)),
+    ('foo@', 'ci', ('foo', 'ci')),
+    ('foo', 'ci', ('foo', 'ci')),
+    ('foo@bar', 'ci', ('foo', 'bar')),
+))
+def test_split_target_identifier(identifier, default_namespace, expected):
+    assert split_target_identifier(identifier, default_namespace) == expected
+
+
+class TestTargetOptions:
+
+    def test_defaults(self):
+        options = TargetOptions()
+        assert options.name_override is None
+        assert options.depends_on == ()
+        assert options.inputs == ()
+        assert options.outputs == ()
+
+    @pytest.mark.parametrize('depends_on, expected', (
+        (['a', 'b@ci'], ('a', 'b@ci')),
+        (('a',), ('a',)),
+        ('a', ('a',)),
+    ))
+    def test_depends_on(self, depends_on, expected):
+        assert TargetOptions(depends_on=depends_on).depends_on == expected
+
+    def test_inputs_and_outputs(self):
+        options = TargetOptions(inputs=['begin/**/*.py', 'pyproject.toml'], outputs='dist/*')
+        assert options.inputs == ('begin/**/*.py', 'pyproject.toml')
+        assert options.outputs == ('dist/*',)
+
+    def test_cache(self):
+        assert TargetOptions(inputs='*.py', cache=True).cache is True
+        # There would be nothing to key the cache on
+        with pytest.raises(ValueError):
+            TargetOptions(cache=True)
+
+
 class TestTarget:
 
     def test_initialisation(self):
@@ -86,6 +132,35 @@ class TestTarget:
         # Target.execute should defer to Target._function
         assert mock_function.call_args_list == [mock.call(), mock.call(**options)]
 
+    def test_execute_coroutine(self):
+        calls = []
+
+        async def upload(artifact):
+            await asyncio.sleep(0)
+            calls.append(artifact)
+
+        target = Target(function=upload, registry_namespace='namespace')
+        assert target.is_coroutine is True
+        # The coroutine should be awaited, rather than returned
+        assert target.execute(artifact='wheel') is None
+        assert calls == ['wheel']
+
+    def test_execute_async(self):
+        calls = []
+
+        async def upload():
+            calls.append('upload')
+
+        def check():
+            calls.append('check')
+
+        async def run_both():
+            await Target(function=upload, registry_namespace='namespace').execute_async()
+            await Target(function=check, registry_namespace='namespace').execute_async()
+
+        asyncio.run(run_both())
+        assert calls == ['upload', 'check']
+
     def test_repr(self):
         def stub_function():
             pass
@@ -100,15 +175,72 @@ class TestTarget:
 
         stub_namespace = 'stub_namespace'
         target_1 = Target(function=stub_function, registry_namespace=stub_namespace)
-        target_1_repr = '<begin.registry.Target(registry_namespace=stub_namespace,function_name=stub_function)>'
 
-        # target.__hash__ should defer to the hash of its on repr
-        assert hash(target_1) == hash(target_1_repr)
+        # target.__hash__ should be the hash of its namespace and name
+        assert hash(target_1) == hash((stub_namespace, 'stub_function'))
 
         # different target instances with the same function name and namespace should have the same hash
         target_2 = Target(function=stub_function, registry_namespace=stub_namespace)
         assert hash(target_1) == hash(target_2)
 
+    def test_hash_is_precomputed(self):
+        target = Target(function=lambda: ..., registry_namespace='namespace')
+        with mock.patch.object(Target, 'function_name', new_callable=mock.PropertyMock) as mock_function_name:
+            hash(target)
+        assert mock_function_name.call_count == 0
+
+    def test_eq(self):
+        def stub_function():
+            pass
+
+        def other_function():
+            pass
+
+        target = Target(function=stub_function, registry_namespace='namespace')
+
+        # Equality is defined on the namespace and name, not the function
+        assert target == Target(function=other_function, registry_namespace='namespace', name_override='stub_function')
+        assert target != Target(function=stub_function, registry_namespace='other_namespace')
+        assert target != Target(function=other_function, registry_namespace='namespace')
+        assert target != 'stub_function'
+
+    def test_signature(self):
+        def stub_function(arg, kwarg=1):
+            pass
+
+        target = Target(function=stub_function, registry_namespace='namespace')
+        assert target.signature == '(arg, kwarg=1)'
+
+    def test_slots(self):
+        target = Target(function=lambda: ..., registry_namespace='namespace')
+        assert not hasattr(target, '__dict__')
+        assert not hasattr(target._options, '__dict__')
+
+    def test_unknown_option(self):
+        with pytest.raises(TypeError):
+            Target(function=lambda: ..., registry_namespace='namespace', unknown_option='value')
+
+    def test_identifier(self):
+        target = Target(function=lambda: ..., registry_namespace='namespace', name_override='name')
+        assert target.identifier == 'name@namespace'
+
+    def test_dependencies(self):
+        target = Target(
+            function=lambda: ...,
+            registry_namespace='ci',
+            depends_on=['setup', 'install@default'],
+        )
+        # Unqualified dependencies belong to the registry of the dependent target
+        assert target.dependencies == (('setup', 'ci'), ('install', DEFAULT_REGISTRY_NAME))
+
+    def test_inputs_and_outputs(self):
+        target = Target(function=lambda: ..., registry_namespace='ci', inputs='*.py', outputs=['dist/*'])
+        assert target.inputs == ('*.py',)
+        assert target.outputs == ('dist/*',)
+
+    def test_no_dependencies(self):
+        assert Target(function=lambda: ..., registry_namespace='ci').dependencies == ()
+
 
 class TestTargetMap:
 
@@ -199,6 +331,86 @@ class TestTargetMap:
         # TargetMap.compile should defer to TargetMap.unpack_registry once for each registry
         assert mock_unpack_registry.call_args_list == [mock.call(r) for r in registry_list]
 
+    def test_iter(self, resource_factory):
+        registries = resource_factory.registry.create_multi()
+        target_map = TargetMap.create(registries)
+        expected = {target for registry in registries for target in registry.targets}
+        assert set(target_map) == expected
+
+    def test_add_registry(self, resource_factory):
+        registry_list = resource_factory.registry.create_multi()
+        target_map = TargetMap.create(registry_list[:-1])
+        target_map.add_registry(registry_list[-1])
+
+        assert set(target_map) == set(TargetMap.create(registry_list))
+        assert target_map._registries == registry_list
+
+    def test_remove_registry(self, resource_factory):
+        registry_list = resource_factory.registry.create_multi(registry_count=3)
+        target_map = TargetMap.create(registry_list)
+        target_map.remove_registry(registry_list[1].name)
+
+        assert set(target_map) == registry_list[0].targets | registry_list[2].targets
+        assert target_map._registries == [registry_list[0], registry_list[2]]
+        # The caller's list should not be mutated
+        assert len(registry_list) == 3
+
+    def test_remove_registry_drops_empty_names(self, resource_factory):
+        registry = resource_factory.registry.create()
+        target_map = TargetMap.create([registry])
+        target_map.remove_registry(registry.name)
+        assert target_map._map == {}
+
+    def test_remove_registry_keeps_other_namespaces(self, resource_factory):
+        # Targets with the same name in other namespaces should survive
+        def shared():
+            pass
+
+        registry_1 = resource_factory.registry.create(target_functions=[shared])
+        registry_2 = resource_factory.registry.create(target_functions=[shared])
+        target_map = TargetMap.create([registry_1, registry_2])
+        target_map.remove_registry(registry_1.name)
+
+        assert list(target_map._map['shared']) == [registry_2.name]
+
+    def test_replace_registry(self, resource_factory):
+        def kept():
+            pass
+
+        def deleted():
+            pass
+
+        def added():
+            pass
+
+        path = Path('/path/to/targets.py')
+        original = resource_factory.registry.create(
+            name='ns',
+            target_functions=[kept, deleted],
+            calling_context_path=path,
+        )
+        reloaded = resource_factory.registry.create(
+            name='ns',
+            target_functions=[kept, added],
+            calling_context_path=path,
+        )
+        other = resource_factory.registry.create()
+
+        target_map = TargetMap.create([original, other])
+        target_map.replace_registry(reloaded)
+
+        assert set(target_map) == reloaded.targets | other.targets
+        assert target_map.get('kept', 'ns')._function is kept
+        assert target_map._registries == [other, reloaded]
+
+    def test_replace_registry_is_local(self, resource_factory):
+        # Replacing a registry should only touch the targets in that registry
+        registry_list = resource_factory.registry.create_multi(registry_count=5)
+        target_map = TargetMap.create(registry_list)
+        with mock.patch.object(target_map, 'add', wraps=target_map.add) as mock_add:
+            target_map.replace_registry(registry_list[2])
+        assert mock_add.call_count == len(registry_list[2].targets)
+
 
 class TestRegistry:
 
@@ -216,6 +428,11 @@ class TestRegistry:
         calling_path = Registry._get_calling_context_path()
         assert calling_path == Path(__file__)
 
+    def test_path(self):
+        # Frames inside begin/registry.py (e.g. Registry.__init__) should be skipped
+        registry = Registry()
+        assert registry.path == Path(__file__)
+
     def test_public_register_target_no_kwargs(self):
         registry = Registry()
 
@@ -266,6 +483,21 @@ class TestRegistry:
         assert target._function == foo
         assert target.function_name == 'foo'
 
+    def test_private_register_target_same_name_twice(self):
+        # The most recent registration of a name wins
+        registry = Registry()
+
+        @registry.register_target(name_override='foo')
+        def foo_1():
+            pass
+
+        @registry.register_target(name_override='foo')
+        def foo_2():
+            pass
+
+        assert len(registry.targets) == 1
+        assert registry.targets.pop()._function is foo_2
+
     def test_private_register_target_with_kwargs(self):
         registry = Registry()
         stub_name_override = 'name_override'
@@ -341,3 +573,132 @@ class TestRegistryManager:
             manager.get_target(stub_target_name, stub_namespace)
 
         assert mock_target_map.get.call_args_list == [mock.call(stub_target_name, stub_namespace)]
+
+    def test_targets(self, resource_factory):
+        registries = resource_factory.registry.create_multi()
+        manager = RegistryManager.create(registries)
+        assert set(manager.targets()) == {target for registry in registries for target in registry.targets}
+
+    def test_add_registry(self, resource_factory):
+        registries = resource_factory.registry.create_multi()
+        manager = RegistryManager.create(registries[:-1])
+        manager.add_registry(registries[-1])
+        assert set(manager.targets()) == {target for registry in registries for target in registry.targets}
+        assert manager.registries == registries
+
+    def test_add_registry_collision(self, resource_factory):
+        registry = resource_factory.registry.create()
+        colliding_registry = resource_factory.registry.create(name=registry.name)
+        manager = RegistryManager.create([registry])
+
+        with pytest.raises(RegistryNameCollisionError) as e_info:
+            manager.add_registry(colliding_registry)
+
+        assert str(registry.path) in e_info.value.message
+        assert str(colliding_registry.path) in e_info.value.message
+        # The manager should be left unchanged
+        assert manager.registries == [registry]
+        assert set(manager.targets()) == registry.targets
+
+    def test_replace_registry(self, resource_factory):
+        registry = resource_factory.registry.create()
+        reloaded = resource_factory.registry.create(name=registry.name, calling_context_path=registry.path)
+        manager = RegistryManager.create([registry])
+        manager.replace_registry(reloaded)
+        assert manager.registries == [reloaded]
+        assert set(manager.targets()) == reloaded.targets
+
+    def test_replace_registry_adds_new_namespace(self, resource_factory):
+        registry_1, registry_2 = resource_factory.registry.create_multi(registry_count=2)
+        manager = RegistryManager.create([registry_1])
+        manager.replace_registry(registry_2)
+        assert manager.registries == [registry_1, registry_2]
+
+    def test_replace_registry_from_other_file(self, resource_factory):
+        registry = resource_factory.registry.create()
+        colliding_registry = resource_factory.registry.create(name=registry.name)
+        manager = RegistryManager.create([registry])
+
+        with pytest.raises(RegistryNameCollisionError):
+            manager.replace_registry(colliding_registry)
+        assert manager.registries == [registry]
+
+    def test_remove_registry(self, resource_factory):
+        registry_1, registry_2 = resource_factory.registry.create_multi(registry_count=2)
+        manager = RegistryManager.create([registry_1, registry_2])
+        assert manager.remove_registry(registry_1.name) is registry_1
+        assert manager.registries == [registry_2]
+        assert set(manager.targets()) == registry_2.targets
+
+    def test_remove_registry_missing(self):
+        manager = RegistryManager.create([])
+        with pytest.raises(KeyError):
+            manager.remove_registry('missing')
+
+
+def _registry(name, *targets):
+    """ A registry holding a target for each `(target_name, depends_on)` in `targets`. """
+    registry = Registry(name)
+    for target_name, depends_on in targets:
+        registry.register_target(name_override=target_name, depends_on=depends_on)(lambda: None)
+    return registry
+
+
+def _identifiers(graph):
+    return {
+        target.identifier: [dependency.identifier for dependency in dependencies]
+        for target, dependencies in graph.items()
+    }
+
+
+class TestDependencyGraph:
+
+    def test_no_dependencies(self):
+        manager = RegistryManager.create([_registry('ci', ('a', []), ('b', []))])
+        targets = [manager.get_target('b', 'ci'), manager.get_target('a', 'ci')]
+        graph = manager.dependency_graph(targets)
+        assert list(graph) == targets
+        assert _identifiers(graph) == {'b@ci': [], 'a@ci': []}
+
+    def test_across_registries(self):
+        manager = RegistryManager.create([
+            _registry('ci', ('install_ci', ['setup', 'install@default']), ('setup', [])),
+            _registry(DEFAULT_REGISTRY_NAME, ('install', [])),
+        ])
+        graph = manager.dependency_graph([manager.get_target('install_ci', 'ci')])
+
+        # Every target follows its dependencies
+        assert [target.identifier for target in graph] == ['setup@ci', 'install@default', 'install_ci@ci']
+        assert _identifiers(graph)['install_ci@ci'] == ['setup@ci', 'install@default']
+
+    def test_shared_dependency_appears_once(self):
+        manager = RegistryManager.create([
+            _registry('ci', ('a', ['c']), ('b', ['c']), ('c', [])),
+        ])
+        graph = manager.dependency_graph([manager.get_target('a', 'ci'), manager.get_target('b', 'ci')])
+        assert [target.identifier for target in graph] == ['c@ci', 'a@ci', 'b@ci']
+
+    def test_unknown_dependency(self):
+        manager = RegistryManager.create([_registry('ci', ('a', ['missing']))])
+        with pytest.raises(UnknownTargetError) as e_info:
+            manager.dependency_graph([manager.get_target('a', 'ci')])
+        assert e_info.value.message == 'Could not find target `missing@ci`, which is a dependency of `a@ci`'
+
+    @pytest.mark.parametrize('targets, cycle', (
+        ([('a', ['a'])], 'a@ci -> a@ci'),
+        ([('a', ['b']), ('b', ['c']), ('c', ['a'])], 'a@ci -> b@ci -> c@ci -> a@ci'),
+        ([('a', ['b']), ('b', ['c']), ('c', ['b'])], 'b@ci -> c@ci -> b@ci'),
+    ))
+    def test_cycle(self, targets, cycle):
+        manager = RegistryManager.create([_registry('ci', *targets)])
+        with pytest.raises(DependencyCycleError) as e_info:
+            manager.dependency_graph([manager.get_target('a', 'ci')])
+        assert e_info.value.message == f'Found a dependency cycle: {cycle}'
+
+    def test_long_chain(self):
+        # Deeper than the recursion limit, which a recursive search would exhaust
+        length = 5000
+        targets = [(f't{i}', [f't{i + 1}']) for i in range(length)] + [(f't{length}', [])]
+        manager = RegistryManager.create([_registry('ci', *targets)])
+        graph = manager.dependency_graph([manager.get_target('t0', 'ci')])
+        assert [target.function_name for target in graph] == [f't{i}' for i in reversed(range(length + 1))]
@@ -0,0 +1,257 @@
+import os
+import sys
+
+import pytest
+
+from begin.exceptions import InvalidOptionsError
+from begin.registry import Target
+from begin.results import (
+    DEFAULT_RESULT_CACHE_SIZE,
+    RESULT_CACHE_SIZE_ENV_VAR,
+    CachedResult,
+    ResultCache,
+    _Tee,
+    execute_cached,
+    get_result_cache_size,
+)
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    project_dir = tmp_path / 'project'
+    project_dir.joinpath('src').mkdir(parents=True)
+    project_dir.joinpath('src', 'module.py').write_text('x = 1\n')
+    monkeypatch.chdir(project_dir)
+    return project_dir
+
+
+def _build_target(calls, exit_code=None, name='build'):
+    def build(flavour='wheel'):
+        calls.append(flavour)
+        print(f'building {flavour}')
+        print('warning', file=sys.stderr)
+        dist = os.path.join('dist')
+        os.makedirs(dist, exist_ok=True)
+        with open(os.path.join(dist, f'package.{flavour}'), 'w') as artifact:
+            artifact.write(f'{flavour} artifact')
+        if exit_code is not None:
+            sys.exit(exit_code)
+    return Target(
+        function=build,
+        registry_namespace='default',
+        name_override=name,
+        inputs=['src/**/*.py'],
+        outputs=['dist/*'],
+        cache=True,
+    )
+
+
+@pytest.mark.parametrize('value, expected', (
+    (None, DEFAULT_RESULT_CACHE_SIZE),
+    ('1024', 1024),
+    ('-1', 0),
+    ('lots', DEFAULT_RESULT_CACHE_SIZE),
+))
+def test_get_result_cache_size(monkeypatch, value, expected):
+    if value is None:
+        monkeypatch.delenv(RESULT_CACHE_SIZE_ENV_VAR, raising=False)
+    else:
+        monkeypatch.setenv(RESULT_CACHE_SIZE_ENV_VAR, value)
+    assert get_result_cache_size() == expected
+
+
+def test_target_cache_requires_inputs():
+    with pytest.raises(ValueError):
+        Target(function=lambda: None, registry_namespace='default', cache=True)
+
+
+class TestKey:
+
+    def test_stable(self, project):
+        target = _build_target([])
+        assert ResultCache().key(target, {}, project) == ResultCache().key(target, {}, project)
+
+    def test_defaults_are_resolved(self, project):
+        target = _build_target([])
+        assert ResultCache().key(target, {}, project) == ResultCache().key(target, {'flavour': 'wheel'}, project)
+        assert ResultCache().key(target, {}, project) != ResultCache().key(target, {'flavour': 'sdist'}, project)
+
+    def test_unknown_option(self, project):
+        assert ResultCache().key(_build_target([]), {'colour': 'red'}, project) is None
+
+    def test_inputs(self, project):
+        target = _build_target([])
+        key = ResultCache().key(target, {}, project)
+        project.joinpath('src', 'module.py').write_text('x = 2\n')
+        assert ResultCache().key(target, {}, project) != key
+
+    def test_function(self, project):
+        assert ResultCache().key(_build_target([]), {}, project) != ResultCache().key(
+            Target(function=lambda: None, registry_namespace='default', name_override='build', inputs=['src/*.py']),
+            {},
+            project,
+        )
+
+    def test_identity(self, project):
+        assert ResultCache().key(_build_target([]), {}, project) != ResultCache().key(
+            _build_target([], name='other'), {}, project,
+        )
+
+
+class TestExecuteCached:
+
+    def test_replays_output_and_restores_artifacts(self, project, capsys):
+        calls = []
+        target = _build_target(calls)
+        execute_cached(target, {})
+        first = capsys.readouterr()
+        assert first.out == 'building wheel\n'
+        assert first.err == 'warning\n'
+
+        project.joinpath('dist', 'package.wheel').unlink()
+        execute_cached(target, {})
+        assert calls == ['wheel']
+        assert capsys.readouterr() == first
+        assert project.joinpath('dist', 'package.wheel').read_text() == 'wheel artifact'
+
+    def test_replays_binary_output(self, project, capsys):
+        calls = []
+
+        def lint():
+            calls.append(None)
+            sys.stdout.write('text ')
+            sys.stdout.flush()
+            sys.stdout.buffer.write(b'and bytes\n')
+
+        target = Target(function=lint, registry_namespace='default', inputs=['src/*.py'], cache=True)
+        execute_cached(target, {})
+        assert capsys.readouterr().out == 'text and bytes\n'
+        execute_cached(target, {})
+        assert capsys.readouterr().out == 'text and bytes\n'
+        assert len(calls) == 1
+
+    def test_replays_exit(self, project):
+        calls = []
+        target = _build_target(calls, exit_code=0)
+        for _ in range(2):
+            with pytest.raises(SystemExit) as e_info:
+                execute_cached(target, {})
+            assert e_info.value.code == 0
+        assert calls == ['wheel']
+
+    @pytest.mark.parametrize('exit_code', (3, 'failed'))
+    def test_failures_are_not_cached(self, project, exit_code):
+        calls = []
+        target = _build_target(calls, exit_code=exit_code)
+        for _ in range(2):
+            with pytest.raises(SystemExit) as e_info:
+                execute_cached(target, {})
+            assert e_info.value.code == exit_code
+        assert calls == ['wheel', 'wheel']
+
+    def test_refresh(self, project):
+        calls = []
+        target = _build_target(calls)
+        execute_cached(target, {})
+        execute_cached(target, {}, refresh=True)
+        execute_cached(target, {})
+        assert calls == ['wheel', 'wheel']
+
+    def test_changed_inputs(self, project):
+        calls = []
+        target = _build_target(calls)
+        execute_cached(target, {})
+        project.joinpath('src', 'module.py').write_text('x = 2\n')
+        execute_cached(target, {})
+        # Going back to the first state is served from the cache
+        project.joinpath('src', 'module.py').write_text('x = 1\n')
+        execute_cached(target, {})
+        assert calls == ['wheel', 'wheel']
+
+    def test_exceptions_are_not_cached(self, project):
+        calls = []
+
+        def fails():
+            calls.append(None)
+            raise RuntimeError('failed')
+
+        target = Target(function=fails, registry_namespace='default', inputs=['src/*.py'], cache=True)
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                execute_cached(target, {})
+        assert len(calls) == 2
+        # The output streams are restored
+        assert not isinstance(sys.stdout, _Tee)
+        assert not isinstance(sys.stderr, _Tee)
+
+    def test_unknown_option_is_rejected(self, project):
+        with pytest.raises(InvalidOptionsError):
+            execute_cached(_build_target([]), {'colour': 'red'})
+
+
+def _put(cache, key, mtime_ns, outputs=None):
+    cache.put(key, CachedResult(False, None, 'out', '', {}), outputs or {})
+    os.utime(str(cache._entry_path(key)), ns=(mtime_ns, mtime_ns))
+
+
+class TestResultCache:
+
+    def test_get_missing(self, tmp_path):
+        assert ResultCache(tmp_path).get('missing') is None
+
+    def test_get_missing_object(self, tmp_path):
+        cache = ResultCache(tmp_path)
+        artifact = tmp_path / 'artifact'
+        artifact.write_text('content')
+        _put(cache, 'key', 1, {'artifact': str(artifact)})
+        for object_path in tmp_path.joinpath('objects').glob('*/*'):
+            object_path.unlink()
+        assert cache.get('key') is None
+
+    def test_identical_artifacts_are_stored_once(self, tmp_path):
+        cache = ResultCache(tmp_path)
+        artifact = tmp_path / 'artifact'
+        artifact.write_text('content')
+        _put(cache, 'first', 1, {'artifact': str(artifact)})
+        _put(cache, 'second', 2, {'copy': str(artifact)})
+        stats = cache.stats()
+        assert (stats.entries, stats.objects) == (2, 1)
+
+    def test_prune_evicts_least_recently_used(self, tmp_path):
+        cache = ResultCache(tmp_path)
+        for index, key in enumerate(('old', 'used', 'new')):
+            _put(cache, key, (index + 1) * 10**9)
+        # Using an entry makes it the most recently used
+        assert cache.get('old') is not None
+
+        entry_size = cache._entry_path('new').stat().st_size
+        assert cache.prune(max_size=2 * entry_size) == 1
+        assert cache.get('used') is None
+        assert cache.get('old') is not None
+        assert cache.get('new') is not None
+
+    def test_prune_deletes_unreferenced_objects(self, tmp_path):
+        cache = ResultCache(tmp_path)
+        shared, own = tmp_path / 'shared', tmp_path / 'own'
+        shared.write_text('shared')
+        own.write_text('own')
+        _put(cache, 'old', 1, {'shared': str(shared), 'own': str(own)})
+        _put(cache, 'new', 2, {'shared': str(shared)})
+
+        entry_size = cache._entry_path('new').stat().st_size
+        assert cache.prune(max_size=entry_size + len('shared')) == 1
+        stats = cache.stats()
+        assert (stats.entries, stats.objects) == (1, 1)
+        assert cache.get('new') is not None
+
+    def test_put_prunes_to_size_limit(self, tmp_path):
+        cache = ResultCache(tmp_path, max_size=0)
+        cache.put('key', CachedResult(False, None, 'out', '', {}), {})
+        assert cache.stats().entries == 0
+
+    def test_clear(self, tmp_path):
+        cache = ResultCache(tmp_path)
+        _put(cache, 'first', 1)
+        _put(cache, 'second', 2)
+        assert cache.clear() == 2
+        assert cache.stats().size == 0
@@ -0,0 +1,159 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from begin.scheduler import Scheduler
+
+
+def test_execution_order():
+    graph = {
+        'install_ci': ['setup', 'install'],
+        'install': ['setup'],
+        'setup': [],
+        'build': [],
+    }
+    assert Scheduler(graph).execution_order() == ['setup', 'install', 'install_ci', 'build']
+
+
+def test_execution_order_cycle():
+    with pytest.raises(ValueError):
+        Scheduler({'a': ['b'], 'b': ['a']}).execution_order()
+
+
+class Recorder:
+    """ Runs nodes on a thread pool, recording the order they started and finished in.
+    Nodes in `failing` exit with status 1. """
+
+    def __init__(self, failing=()):
+        self.failing = set(failing)
+        self.started = []
+        self.finished = []
+        self._lock = threading.Lock()
+
+    def run(self, node):
+        with self._lock:
+            self.started.append(node)
+        status = 1 if node in self.failing else 0
+        with self._lock:
+            self.finished.append(node)
+        return status
+
+    def run_concurrently(self, graph, max_workers=4):
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return Scheduler(graph).run_concurrently(lambda node: executor.submit(self.run, node))
+
+
+def test_run_concurrently_respects_dependencies():
+    graph = {
+        'install_ci': ['setup', 'install'],
+        'install': ['setup'],
+        'setup': [],
+        'lint': [],
+    }
+    recorder = Recorder()
+    statuses = recorder.run_concurrently(graph)
+
+    assert statuses == dict.fromkeys(graph, 0)
+    # Each node runs exactly once, after every one of its dependencies finished
+    assert sorted(recorder.started) == sorted(graph)
+    for node, dependencies in graph.items():
+        for dependency in dependencies:
+            assert recorder.finished.index(dependency) < recorder.started.index(node)
+
+
+def test_run_concurrently_runs_shared_dependency_once():
+    graph = {'a': ['shared', 'shared'], 'b': ['shared'], 'shared': []}
+    recorder = Recorder()
+    recorder.run_concurrently(graph)
+    assert recorder.started.count('shared') == 1
+
+
+def test_run_concurrently_overlaps_independent_nodes():
+    # Both nodes wait on a barrier, which can only be passed if they run at the same time
+    barrier = threading.Barrier(2, timeout=5)
+
+    def run(node):
+        barrier.wait()
+        return 0
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        statuses = Scheduler({'a': [], 'b': []}).run_concurrently(lambda node: executor.submit(run, node))
+    assert statuses == {'a': 0, 'b': 0}
+
+
+def test_run_concurrently_failure_skips_dependents():
+    graph = {
+        'deploy': ['build'],
+        'build': ['setup'],
+        'setup': [],
+        'lint': [],
+    }
+    recorder = Recorder(failing={'setup'})
+    statuses = recorder.run_concurrently(graph)
+
+    # Dependents of a failed node never run, but independent branches do
+    assert statuses == {'deploy': None, 'build': None, 'setup': 1, 'lint': 0}
+    assert sorted(recorder.started) == ['lint', 'setup']
+
+
+def test_run_concurrently_cycle():
+    with pytest.raises(ValueError):
+        Scheduler({'a': ['b'], 'b': ['a'], 'c': []}).run_concurrently(lambda node: None)
+
+
+def test_run_concurrently_empty_graph():
+    assert Scheduler({}).run_concurrently(lambda node: None) == {}
+
+
+class AsyncRecorder(Recorder):
+
+    async def run_async(self, node):
+        await asyncio.sleep(0)
+        return self.run(node)
+
+    def run_asynchronously(self, graph):
+        return asyncio.run(Scheduler(graph).run_asynchronously(self.run_async))
+
+
+def test_run_asynchronously_respects_dependencies():
+    graph = {
+        'install_ci': ['setup', 'install'],
+        'install': ['setup'],
+        'setup': [],
+        'lint': [],
+    }
+    recorder = AsyncRecorder()
+    assert recorder.run_asynchronously(graph) == dict.fromkeys(graph, 0)
+    assert sorted(recorder.started) == sorted(graph)
+    for node, dependencies in graph.items():
+        for dependency in dependencies:
+            assert recorder.finished.index(dependency) < recorder.started.index(node)
+
+
+def test_run_asynchronously_overlaps_independent_nodes():
+    # Each node waits for the other to start, so they can only finish if they overlap
+    async def run_both():
+        started = {'a': asyncio.Event(), 'b': asyncio.Event()}
+
+        async def run(node):
+            started[node].set()
+            other = 'b' if node == 'a' else 'a'
+            await asyncio.wait_for(started[other].wait(), timeout=5)
+            return 0
+
+        return await Scheduler({'a': [], 'b': []}).run_asynchronously(run)
+
+    assert asyncio.run(run_both()) == {'a': 0, 'b': 0}
+
+
+def test_run_asynchronously_failure_skips_dependents():
+    graph = {'deploy': ['build'], 'build': [], 'lint': []}
+    recorder = AsyncRecorder(failing={'build'})
+    assert recorder.run_asynchronously(graph) == {'deploy': None, 'build': 1, 'lint': 0}
+
+
+def test_run_asynchronously_cycle():
+    with pytest.raises(ValueError):
+        AsyncRecorder().run_asynchronously({'a': ['b'], 'b': ['a']})
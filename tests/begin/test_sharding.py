@@ -0,0 +1,177 @@
+from pathlib import Path
+from unittest import mock
+
+import pytest
+
+from begin import (
+    recipes,
+    sharding,
+)
+
+
+SAMPLE_TESTS = """
+import pytest
+
+
+@pytest.mark.parametrize('value', range(6))
+def test_passes(value):
+    assert value >= 0
+
+
+def test_fails():
+    assert {fail} is False
+
+
+@pytest.mark.skip
+def test_skipped():
+    pass
+"""
+
+
+@pytest.mark.parametrize('shards', (1, 2, 3))
+def test_balance_without_durations(shards):
+    node_ids = [f'test_{index}' for index in range(7)]
+    groups = sharding.balance(node_ids, {}, shards)
+    assert len(groups) == shards
+    assert sorted(node_id for group in groups for node_id in group) == sorted(node_ids)
+    assert max(map(len, groups)) - min(map(len, groups)) <= 1
+    # Collection order is kept within each shard
+    for group in groups:
+        assert group == sorted(group, key=node_ids.index)
+
+
+def test_balance_with_durations():
+    durations = {'slow': 6.0, 'medium_a': 3.0, 'medium_b': 3.0, 'fast_a': 1.0, 'fast_b': 1.0}
+    groups = sharding.balance(list(durations), durations, 2)
+    assert sorted(groups) == [['medium_a', 'medium_b', 'fast_b'], ['slow', 'fast_a']]
+
+
+def test_balance_unknown_tests_take_the_average():
+    durations = {'known_a': 2.0, 'known_b': 4.0}
+    groups = sharding.balance(['known_a', 'known_b', 'unknown'], durations, 2)
+    # `unknown` is assumed to take 3s, so joins the 2s test
+    assert sorted(groups) == [['known_a', 'unknown'], ['known_b']]
+
+
+def test_balance_more_shards_than_tests():
+    assert sharding.balance(['only'], {}, 4) == [['only']]
+    assert sharding.balance([], {}, 4) == []
+
+
+@pytest.mark.parametrize('args, shard_args, options', (
+    (['-x', 'tests'], ['-x', 'tests'], None),
+    (
+        ['--cov', 'begin', '--cov-report', 'xml', 'tests'],
+        ['--cov', 'begin', 'tests', '--cov-report='],
+        sharding.CoverageOptions(reports=['xml']),
+    ),
+    (
+        ['--cov=begin', '--cov-report=term-missing', '--cov-report=html:out', '--cov-fail-under=90'],
+        ['--cov=begin', '--cov-report='],
+        sharding.CoverageOptions(reports=['term-missing', 'html:out'], fail_under=90.0),
+    ),
+    (
+        ['--cov', '--cov-config', 'setup.cfg'],
+        ['--cov', '--cov-config', 'setup.cfg', '--cov-report='],
+        sharding.CoverageOptions(config_file='setup.cfg'),
+    ),
+    (['--cov', 'begin', '--no-cov'], ['--cov', 'begin', '--no-cov'], None),
+))
+def test_split_coverage_args(args, shard_args, options):
+    assert sharding.split_coverage_args(args) == (shard_args, options)
+
+
+@pytest.mark.parametrize('exit_codes, exit_code', (
+    ([0, 0], 0),
+    ([0, 1], 1),
+    ([1, 2, 0], 2),
+    ([5, 0], 0),
+    ([5, 1], 1),
+    ([5, 5], 5),
+))
+def test_merge_exit_codes(exit_codes, exit_code):
+    assert sharding.merge_exit_codes(exit_codes) == exit_code
+
+
+class TestMergeCoverage:
+
+    @pytest.fixture
+    def mock_coverage(self, mock_missing_injected_dependency):
+        mock_coverage = mock_missing_injected_dependency(module_name='coverage')
+        cov = mock_coverage.Coverage.return_value
+        cov.report.return_value = 80.0
+        cov.xml_report.return_value = 80.0
+        return cov
+
+    def test_reports(self, mock_coverage, tmp_path):
+        coverage_files = [tmp_path / 'shard0.coverage', tmp_path / 'shard1.coverage']
+        coverage_files[0].touch()
+        options = sharding.CoverageOptions(reports=['term-missing:skip-covered', 'xml:out.xml', 'html'])
+
+        assert sharding.merge_coverage(coverage_files, options)
+        assert mock_coverage.combine.call_args_list == [mock.call([str(coverage_files[0])])]
+        assert mock_coverage.report.call_args_list == [mock.call(show_missing=True, skip_covered=True)]
+        assert mock_coverage.xml_report.call_args_list == [mock.call(outfile='out.xml')]
+        assert mock_coverage.html_report.call_args_list == [mock.call(directory=None)]
+
+    def test_default_report(self, mock_coverage):
+        assert sharding.merge_coverage([], sharding.CoverageOptions())
+        assert mock_coverage.report.call_args_list == [mock.call(show_missing=False, skip_covered=False)]
+
+    @pytest.mark.parametrize('fail_under, met', ((79.0, True), (80.0, True), (81.0, False)))
+    def test_fail_under(self, mock_coverage, capsys, fail_under, met):
+        options = sharding.CoverageOptions(reports=['xml'], fail_under=fail_under)
+        assert sharding.merge_coverage([], options) is met
+        assert ('Required test coverage' in capsys.readouterr().out) is not met
+
+
+def _write_sample_tests(root, fail=True):
+    root.joinpath('test_sample.py').write_text(SAMPLE_TESTS.format(fail=fail))
+
+
+@pytest.fixture
+def sample_project(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    _write_sample_tests(tmp_path)
+    return tmp_path
+
+
+def test_run_sharded(sample_project, capsys):
+    args = ['-p', 'no:cacheprovider', 'test_sample.py']
+    assert sharding.run_sharded(args, 2) == 1
+
+    output = capsys.readouterr().out
+    assert '==== Shard 1/2' in output
+    assert '==== Shard 2/2' in output
+    assert 'test_sample.py::test_fails' in output
+    assert '1 failed, 6 passed, 1 skipped in' in output
+
+    durations = sharding.load_durations(Path.cwd())
+    assert len(durations) == 8
+    assert 'test_sample.py::test_passes[0]' in durations
+
+    _write_sample_tests(sample_project, fail=False)
+    assert sharding.run_sharded(args, 3) == 0
+    assert '7 passed, 1 skipped in' in capsys.readouterr().out
+
+
+def test_run_sharded_honours_selection(sample_project, capsys):
+    assert sharding.run_sharded(['-p', 'no:cacheprovider', '-k', 'passes', 'test_sample.py'], 2) == 0
+    assert '6 passed in' in capsys.readouterr().out
+
+
+def test_run_sharded_no_tests(sample_project):
+    assert sharding.run_sharded(['-p', 'no:cacheprovider', '-k', 'nothing_matches'], 2) == 5
+
+
+def test_run_sharded_usage_error(sample_project, capsys):
+    assert sharding.run_sharded(['--not-an-option'], 2) == 4
+    assert 'not-an-option' in capsys.readouterr().out
+
+
+@mock.patch('begin.sharding.run_sharded', return_value=3)
+def test_recipe(mock_run_sharded):
+    with pytest.raises(SystemExit) as err_info:
+        recipes.pytest_sharded('--some', 'args', shards=4)
+    assert err_info.value.code == 3
+    assert mock_run_sharded.call_args_list == [mock.call(('--some', 'args'), 4)]
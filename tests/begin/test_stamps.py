@@ -0,0 +1,125 @@
+import os
+
+import pytest
+
+from begin.registry import Target
+from begin.stamps import (
+    TargetStamp,
+    expand_patterns,
+    fingerprint,
+)
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    tmp_path.joinpath('src', 'pkg').mkdir(parents=True)
+    tmp_path.joinpath('src', 'a.py').write_text('a = 1\n')
+    tmp_path.joinpath('src', 'pkg', 'b.py').write_text('b = 2\n')
+    tmp_path.joinpath('pyproject.toml').write_text('[tool]\n')
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
+
+
+def _build_target(**options):
+    return Target(function=lambda: None, registry_namespace='default', name_override='build', **options)
+
+
+def _stamp(target, options=None):
+    return TargetStamp.for_target(target, options or {})
+
+
+def _make_old(path):
+    """ Back-dates `path`, so that its mtime is old enough to be trusted. """
+    os.utime(path, ns=(0, 0))
+
+
+def test_expand_patterns(project):
+    paths = expand_patterns(['src/**/*.py', 'pyproject.toml', 'missing/*'], project)
+    assert paths == sorted(str(project / path) for path in ('src/a.py', 'src/pkg/b.py', 'pyproject.toml'))
+
+
+def test_fingerprint_reuses_hash_of_unchanged_file(project):
+    path = project / 'src' / 'a.py'
+    _make_old(path)
+    previous = fingerprint([str(path)])
+    previous[str(path)]['sha256'] = 'recorded'
+    # Neither the size nor the mtime changed, so the file is not read again
+    assert fingerprint([str(path)], previous)[str(path)]['sha256'] == 'recorded'
+
+
+def test_fingerprint_rehashes_changed_file(project):
+    path = project / 'src' / 'a.py'
+    previous = fingerprint([str(path)])
+    path.write_text('a = 10\n')
+    assert fingerprint([str(path)], previous)[str(path)]['sha256'] != previous[str(path)]['sha256']
+
+
+def test_fingerprint_skips_missing_file(project):
+    assert fingerprint([str(project / 'missing.py')]) == {}
+
+
+def test_no_stamp_without_inputs(project):
+    assert _stamp(_build_target(outputs=['dist/*'])) is None
+
+
+def test_up_to_date_after_record(project):
+    target = _build_target(inputs=['src/**/*.py'])
+    assert _stamp(target).is_up_to_date() is False
+    _stamp(target).record()
+    assert _stamp(target).is_up_to_date() is True
+
+
+@pytest.mark.parametrize('change', (
+    lambda project: project.joinpath('src', 'a.py').write_text('a = 10\n'),
+    lambda project: project.joinpath('src', 'pkg', 'c.py').write_text('c = 3\n'),
+    lambda project: project.joinpath('src', 'pkg', 'b.py').unlink(),
+))
+def test_stale_when_inputs_change(project, change):
+    target = _build_target(inputs=['src/**/*.py'])
+    _stamp(target).record()
+    change(project)
+    assert _stamp(target).is_up_to_date() is False
+
+
+def test_touched_input_is_still_up_to_date(project):
+    target = _build_target(inputs=['src/**/*.py'])
+    _stamp(target).record()
+    # Only the content counts, not the mtime
+    os.utime(project / 'src' / 'a.py')
+    assert _stamp(target).is_up_to_date() is True
+
+
+def test_stale_when_options_change(project):
+    target = _build_target(inputs=['src/**/*.py'])
+    _stamp(target, {'verbose': 'true'}).record()
+    assert _stamp(target, {'verbose': 'true'}).is_up_to_date() is True
+    assert _stamp(target, {'verbose': 'false'}).is_up_to_date() is False
+
+
+def test_stale_when_outputs_change(project):
+    target = _build_target(inputs=['src/**/*.py'], outputs=['dist/*'])
+    dist = project / 'dist'
+    dist.mkdir()
+    dist.joinpath('pkg.whl').write_text('wheel')
+    _stamp(target).record()
+    assert _stamp(target).is_up_to_date() is True
+
+    dist.joinpath('pkg.whl').write_text('tampered')
+    assert _stamp(target).is_up_to_date() is False
+
+
+def test_stale_when_outputs_are_missing(project):
+    target = _build_target(inputs=['src/**/*.py'], outputs=['dist/*'])
+    # The target did not produce any of its outputs
+    _stamp(target).record()
+    assert _stamp(target).is_up_to_date() is False
+
+
+def test_stamps_are_per_target_and_directory(project, tmp_path_factory, monkeypatch):
+    build = _build_target(inputs=['src/**/*.py'])
+    _stamp(build).record()
+    other = Target(function=lambda: None, registry_namespace='ci', name_override='build', inputs=['src/**/*.py'])
+    assert _stamp(other).is_up_to_date() is False
+
+    monkeypatch.chdir(tmp_path_factory.mktemp('elsewhere'))
+    assert _stamp(build).is_up_to_date() is False
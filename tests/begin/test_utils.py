@@ -47,6 +47,29 @@ def test_with_exit(exit_code):
     assert err_info.value.code == exit_code
 
 
+def test_with_exit_without_exit():
+    def foo(value):
+        """ Returns `value`. """
+        return value
+
+    wrapped = utils.with_exit(foo)
+    assert wrapped.without_exit is foo
+    assert wrapped.without_exit(3) == 3
+    assert wrapped.__name__ == 'foo'
+    assert wrapped.__doc__ == foo.__doc__
+
+
+@pytest.mark.parametrize('code, status', (
+    (None, 0),
+    (0, 0),
+    (3, 3),
+    ('Something went wrong', 1),
+))
+def test_exit_status(code, status, capsys):
+    assert utils.exit_status(code) == status
+    assert capsys.readouterr().err == ('Something went wrong\n' if isinstance(code, str) else '')
+
+
 @pytest.mark.parametrize('arg, result', (
     ('yes', True),
     ('Yes', True),
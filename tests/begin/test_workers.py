@@ -0,0 +1,96 @@
+import os
+import sys
+
+import pytest
+
+from begin import (
+    recipes,
+    workers,
+)
+from begin.utils import with_exit
+
+
+@with_exit
+def report_state(*args):
+    """ Leaks state into the process it runs in, which later calls must not see. """
+    print(os.getpid(), 'leaked' in sys.modules, sys.argv == ['leaked'])
+    sys.argv = ['leaked']
+    sys.modules['leaked'] = sys.modules[__name__]
+    return len(args)
+
+
+def raises_error():
+    raise ModuleNotFoundError("No module named 'tool'")
+
+
+def raises_unpicklable_error():
+    class LocalError(Exception):
+        pass
+    raise LocalError('Cannot be pickled')
+
+
+def kills_worker():
+    os._exit(9)
+
+
+@pytest.fixture(scope='module')
+def pool():
+    with workers.RecipePool(preload=['begin.recipes'], max_workers=2) as pool:
+        yield pool
+
+
+def test_run(pool):
+    result = pool.run(report_state, 'a', 'b', capture_output=True)
+    assert isinstance(result, recipes.RecipeResult)
+    assert result.name == 'report_state'
+    assert result.args == ('a', 'b')
+    assert result.exit_code == 2
+    assert result.duration >= 0
+    assert result.stderr == ''
+
+    pid, leaked_module, leaked_argv = result.stdout.split()
+    assert int(pid) != os.getpid()
+    assert (leaked_module, leaked_argv) == ('False', 'False')
+
+
+def test_workers_are_isolated(pool):
+    argv, modules = list(sys.argv), set(sys.modules)
+    first = pool.run(report_state, capture_output=True)
+    second = pool.run(report_state, capture_output=True)
+
+    assert first.stdout.split()[0] != second.stdout.split()[0]
+    assert second.stdout.split()[1:] == ['False', 'False']
+    assert sys.argv == argv
+    assert 'leaked' not in set(sys.modules) - modules
+
+
+def test_submit(pool):
+    futures = [pool.submit(report_state, *['arg'] * count, capture_output=True) for count in range(4)]
+    assert [future.result().exit_code for future in futures] == [0, 1, 2, 3]
+
+
+def test_recipe(pool):
+    result = pool.run(recipes.flake8, '--version', capture_output=True)
+    assert result.succeeded
+    assert result.stdout
+
+
+def test_exception(pool):
+    with pytest.raises(ModuleNotFoundError, match="No module named 'tool'"):
+        pool.run(raises_error)
+
+
+def test_unpicklable_exception(pool):
+    with pytest.raises(workers.RecipeWorkerError, match='LocalError: Cannot be pickled'):
+        pool.run(raises_unpicklable_error)
+
+
+def test_lost_worker(pool, caplog):
+    result = pool.run(kills_worker)
+    assert result.exit_code == 9
+    assert 'exited with 9 before reporting a result' in caplog.text
+
+
+@pytest.mark.parametrize('process_exit_code, exit_code', ((None, 1), (0, 1), (3, 3), (-9, 137)))
+def test_exit_code_of_lost_worker(process_exit_code, exit_code):
+    assert workers._exit_code_of_lost_worker(process_exit_code) == exit_code
@@ -7,9 +7,21 @@ from unittest import mock
 
 import pytest
 
+from begin import entrypoints
+from begin.cache import CACHE_DIR_ENV_VAR
 from tests.resources import factory
 
 
+@pytest.fixture(autouse=True)
+def isolated_cache_dir(tmp_path_factory, monkeypatch):
+    """ Ensure no test reads from, or writes to, the user's real `begin` cache. """
+    cache_dir = tmp_path_factory.mktemp('begin_cache')
+    monkeypatch.setenv(CACHE_DIR_ENV_VAR, str(cache_dir))
+    # Entry points resolved in memory would otherwise outlive the cache they came from
+    monkeypatch.setattr(entrypoints, '_locations', {})
+    return cache_dir
+
+
 @pytest.fixture(scope='function')
 def make_random_string():
     return factory.make_random_string